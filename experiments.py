@@ -3,10 +3,7 @@ import quackdb
 import matplotlib.pyplot as plt
 from collections import defaultdict
 import duckdb
-
-
-SMA_FOLDER = os.path.expanduser('~/Desktop/theses/data/sma')
-STATS_JSON = os.path.join(SMA_FOLDER, 'stats.json')
+from quackdb.stats import stats_manager
 
 # workload
 FILES = sorted(glob.glob("/Users/umutozdemir/Desktop/theses/data/yellow_tripdata_202*-*.parquet"))
@@ -63,8 +60,7 @@ outlier_retrieved_counts = []
 budgets_over_time = defaultdict(list)  # predicate_key -> [budget]
 
 def load_stats():
-    with open(STATS_JSON) as f:
-        return json.load(f)
+    return stats_manager.snapshot()
 
 def run_and_record(q):
     # measure exec time
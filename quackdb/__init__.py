@@ -1,2 +1,6 @@
-from .wrapper import sql, query
-__all__ = ['sql', 'query']
\ No newline at end of file
+from .wrapper import sql, query, sql_many, asql, index_usage, index_evictions, set_index_quota
+from .session import Session, connect
+from .trace import QueryTrace, JsonlExporter, add_trace_hook, remove_trace_hook
+__all__ = ['sql', 'query', 'sql_many', 'asql', 'index_usage', 'index_evictions', 'set_index_quota',
+           'Session', 'connect',
+           'QueryTrace', 'JsonlExporter', 'add_trace_hook', 'remove_trace_hook']
@@ -0,0 +1,176 @@
+"""
+Index maintenance outside of queries, also available as
+
+    quackdb index build 'data/**/*.parquet' --columns total_amount,trip_id --workers 8
+    quackdb index status ['data/*.parquet'] [--json]
+    quackdb index drop 'data/*.parquet' [--columns total_amount]
+"""
+import os, sys, json, time, argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from . import core
+from .core import index_key, build_sma, get_sma, disk_quota, _full_path, _matches_source
+from .paths import expand_paths
+from .stats import stats_manager
+from .storage import list_indexes, index_sizes, read_header
+
+
+def _build(path: str, column: str) -> Dict[str, Any]:
+    # runs in a worker process, the result is registered by the parent
+    start = time.perf_counter()
+    try:
+        header = build_sma(path, column)
+    except Exception as e:
+        return {"path": path, "column": column, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+    status = "built" if header is not None else "skipped"
+    return {
+        "path": path,
+        "column": column,
+        "status": status,
+        "outliers": None if header is None else header["outlier_count"],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def build_indexes(
+    patterns: List[str],
+    columns: List[str],
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Build the indexes of `columns` in the files matching `patterns` on a pool
+    of `workers` processes (default: one per CPU), so builds do not compete
+    for the GIL. Up-to-date indexes are kept unless `force`. Every new index is
+    registered with the stats as if a query had just used it, so online
+    queries use it at once and the reaper does not drop it before it is tried.
+    Status per build: built, current, skipped (no values or no room under the
+    quota) or failed.
+    """
+    paths = expand_paths(patterns)
+    if not paths:
+        raise ValueError(f"No Parquet files match {patterns}")
+    todo, results = [], []
+    for p in paths:
+        for col in columns:
+            if not force and get_sma(p, col) is not None:
+                results.append({"path": p, "column": col, "status": "current"})
+            else:
+                todo.append((p, col))
+    if todo:
+        # spawned, not forked: a forked worker would inherit the stats backend's SQLite connection
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            for res in pool.map(_build, *zip(*todo)):
+                if res["status"] == "built":
+                    stats_manager.record_prebuilt(index_key(res["path"], res["column"]))
+                    core._build_done(res["path"], res["column"])
+                results.append(res)
+        stats_manager.save()
+    return results
+
+
+def _column_of(key: str, path: str) -> str:
+    # index keys are <file name>_<12 hex digits of the path hash>_<column>
+    return key[len(os.path.basename(path)) + 14:]
+
+
+def index_status(patterns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """The indexes in the store (of the files matching `patterns`), with their size and usage."""
+    wanted = None if patterns is None else {_full_path(p) for p in expand_paths(patterns)}
+    sizes = index_sizes()
+    rows = []
+    for key in sorted(list_indexes()):
+        header = read_header(key)
+        if header is None:
+            continue
+        path = (header.get("fingerprint") or {}).get("path")
+        if path is None or (wanted is not None and path not in wanted):
+            continue
+        fm = stats_manager.get_file_stats(key) or {}
+        rows.append({
+            "key": key,
+            "path": path,
+            "column": _column_of(key, path),
+            "bytes": sizes.get(key, 0),
+            "row_groups": len(header["row_groups"]),
+            "outliers": header["outlier_count"],
+            "stale": not os.path.exists(path) or not _matches_source(header, path),
+            "budget": stats_manager.get_budget(key),
+            "scans": fm.get("scan_count", 0),
+            "skipped": fm.get("skipped_count", 0),
+            "outlier_retrieved": fm.get("outlier_retrieved_count", 0),
+            "partial_scans": fm.get("partial_scan_count", 0),
+            "constructions": fm.get("construction_count", 0),
+            "last_used_query_id": fm.get("last_sma_used_query_id", 0),
+        })
+    return rows
+
+
+def drop_indexes(patterns: List[str], columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Drop the indexes of the files matching `patterns` (of `columns` only, if
+    given). Drops are logged like quota evictions, so other processes sharing
+    the store forget them on their next sync.
+    """
+    dropped = []
+    for row in index_status(patterns):
+        if columns is not None and row["column"] not in columns:
+            continue
+        freed = disk_quota.evict(row["key"], reason='drop')
+        if freed:
+            dropped.append({"key": row["key"], "path": row["path"], "column": row["column"], "bytes": freed})
+    stats_manager.save()
+    return dropped
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='quackdb index', description="Manage the SMA indexes.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build indexes ahead of the queries")
+    build.add_argument('patterns', nargs='+', help="Parquet files, globs or directories")
+    build.add_argument('--columns', required=True, help="comma separated")
+    build.add_argument('--workers', type=int, help="build processes (default: one per CPU)")
+    build.add_argument('--force', action='store_true', help="rebuild indexes that are up to date")
+    status = commands.add_parser('status', help="list the indexes")
+    status.add_argument('patterns', nargs='*')
+    status.add_argument('--json', action='store_true')
+    drop = commands.add_parser('drop', help="drop indexes")
+    drop.add_argument('patterns', nargs='+')
+    drop.add_argument('--columns', help="comma separated (default: all)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        results = build_indexes(args.patterns, args.columns.split(','), args.workers, args.force)
+        for r in results:
+            detail = r.get("error") or ("" if r.get("seconds") is None else f"{r['seconds']:.2f}s, {r['outliers']} outliers")
+            print(f"{r['status']:<8} {r['path']} {r['column']} {detail}".rstrip())
+        counts = {}
+        for r in results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        print(", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+        return 1 if counts.get("failed") else 0
+
+    if args.command == 'status':
+        rows = index_status(args.patterns or None)
+        if args.json:
+            json.dump(rows, sys.stdout, indent=2)
+            print()
+            return 0
+        for r in rows:
+            state = "stale" if r["stale"] else "ok"
+            print(f"{state:<6} {r['path']} {r['column']}  {r['bytes']} bytes, {r['outliers']} outliers, "
+                  f"{r['scans']} scans, {r['skipped']} skipped, {r['outlier_retrieved']} outlier, "
+                  f"budget {r['budget']:.4f}")
+        usage = disk_quota.usage()
+        quota = "no quota" if usage["quota"] is None else f"quota {usage['quota']}"
+        print(f"{len(rows)} indexes, {usage['bytes']} bytes in the store ({quota})")
+        return 0
+
+    dropped = drop_indexes(args.patterns, None if args.columns is None else args.columns.split(','))
+    for d in dropped:
+        print(f"dropped  {d['path']} {d['column']} {d['bytes']} bytes")
+    print(f"{len(dropped)} indexes dropped")
+    return 0
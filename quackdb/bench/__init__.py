@@ -0,0 +1,14 @@
+"""
+Reproducible benchmarks for quackdb.
+
+    python -m quackdb.bench --kind taxi --rows 200000 --repeats 10 --out bench.json
+    python -m quackdb.bench.build_sma [rows] [row_group_size]
+
+See data (synthetic Parquet files), workloads (skip, outlier and full-scan
+regimes) and runner (isolated runs against quackdb and DuckDB, JSON report).
+"""
+from .data import generate
+from .workloads import workload
+from .runner import run_suite, run_workload
+
+__all__ = ['generate', 'workload', 'run_suite', 'run_workload']
@@ -0,0 +1,48 @@
+import argparse, json, sys, tempfile
+
+from .data import KINDS
+from .runner import run_suite
+from .workloads import REGIMES
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m quackdb.bench', description="Benchmark quackdb against DuckDB.")
+    parser.add_argument('--kind', choices=KINDS, default='taxi')
+    parser.add_argument('--regimes', default=','.join(REGIMES), help="comma separated, of " + ', '.join(REGIMES))
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=200_000, help="rows per file")
+    parser.add_argument('--row-group-size', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skew', type=float, default=0.6, help="sigma of the lognormal value distribution")
+    parser.add_argument('--outlier-rate', type=float, default=0.001)
+    parser.add_argument('--repeats', type=int, default=10, help="runs of each workload query")
+    parser.add_argument('--no-wait', action='store_true', help="do not wait for index builds between queries")
+    parser.add_argument('--result-cache', action='store_true', help="keep the query result cache enabled")
+    parser.add_argument('--data-dir', help="where to write the data (default: a temporary folder)")
+    parser.add_argument('--out', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    def run(data_dir: str):
+        return run_suite(
+            data_dir, kind=args.kind, regimes=args.regimes.split(','), files=args.files, rows=args.rows,
+            row_group_size=args.row_group_size, seed=args.seed, skew=args.skew,
+            outlier_rate=args.outlier_rate, repeats=args.repeats, wait=not args.no_wait,
+            result_cache=args.result_cache,
+        )
+
+    if args.data_dir:
+        report = run(args.data_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix='quackdb-data-') as tmp:
+            report = run(tmp)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
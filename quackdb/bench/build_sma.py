@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: vectorized `build_sma` vs. the previous row-by-row builder.
+
+Usage: python -m quackdb.bench.build_sma [rows] [row_group_size]
+"""
+import math, os, sys, tempfile, time, subprocess
+from typing import List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from quackdb.bench.data import make_taxi_like
+from quackdb.bench.runner import isolated_env
+
+
+def legacy_build_sma(path: str, column: str, op: str, threshold: float):
+    """The builder as it was before vectorization (without writing the .sma file)."""
+    tbl = pq.read_table(path)
+    arr: pa.ChunkedArray = tbl[column]
+
+    vals: List[float] = []
+    for chunk in arr.chunks:
+        for v in chunk.to_numpy():
+            if v is not None:
+                vals.append(v)
+    if not vals:
+        return None
+
+    vals.sort()
+    n = len(vals)
+
+    def quantile(p: float) -> float:
+        idx = p * (n - 1)
+        low, high = math.floor(idx), math.ceil(idx)
+        return vals[low] + (idx - low) * (vals[high] - vals[low])
+
+    q1, q3 = quantile(0.25), quantile(0.75)
+    iqr = q3 - q1
+    lower_bound = q1 - 1.5 * iqr
+    upper_bound = q3 + 1.5 * iqr
+
+    outlier_indices: List[int] = []
+    row = 0
+    for chunk in arr.chunks:
+        py = chunk.to_numpy()
+        for i, v in enumerate(py):
+            if v is not None and (v < lower_bound or v > upper_bound):
+                if op == '>' and v > threshold:
+                    outlier_indices.append(row + i)
+                elif op == '<' and v < threshold:
+                    outlier_indices.append(row + i)
+        row += len(py)
+
+    return {
+        "min": vals[0],
+        "max": vals[-1],
+        "lower_threshold": lower_bound,
+        "upper_threshold": upper_bound,
+        "outliers": tbl.take(pa.array(outlier_indices, type=pa.int64())),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - start
+
+
+def compare_builders(path: str):
+    """Time both builders on `path` and check that they agree."""
+    from quackdb import core, storage
+
+    old, old_time = timed(legacy_build_sma, path, "total_amount", ">", 500)
+    new, new_time = timed(core.build_sma, path, "total_amount")
+
+    print(f"rows: {pq.read_metadata(path).num_rows}, row groups: {pq.ParquetFile(path).num_row_groups}")
+    print(f"legacy builder:     {old_time:8.3f} s")
+    print(f"vectorized builder: {new_time:8.3f} s  ({old_time / new_time:.1f}x)")
+    for k in ("min", "max", "lower_threshold", "upper_threshold"):
+        assert math.isclose(old[k], new[k]), (k, old[k], new[k])
+    # the new index keeps every outlier, the predicate is applied at query time
+    outliers = storage.open_outliers(core.index_key(path, "total_amount"))
+    matching = outliers.filter(pc.greater(outliers["total_amount"], 500))
+    assert old["outliers"].num_rows == matching.num_rows
+    print(f"outliers: {outliers.num_rows} rows ({matching.num_rows} > 500), results match")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    row_group_size = int(sys.argv[2]) if len(sys.argv) > 2 else 128 * 1024
+
+    with tempfile.TemporaryDirectory(prefix='quackdb-bench-') as tmp:
+        path = os.path.join(tmp, "taxi.parquet")
+        make_taxi_like(path, rows, row_group_size)
+        # build in a child process with an index folder of its own, see runner.run_isolated()
+        subprocess.run(
+            [sys.executable, '-c', 'import sys; from quackdb.bench.build_sma import compare_builders; '
+                                   'compare_builders(sys.argv[1])', path],
+            env=isolated_env(os.path.join(tmp, 'sma')), check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
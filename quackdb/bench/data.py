@@ -0,0 +1,94 @@
+"""
+Synthetic Parquet data for the benchmarks.
+
+Values follow a lognormal distribution whose `skew` (sigma) controls the
+tail, and a fraction `outlier_rate` of rows is multiplied into extreme
+values, which is what the outlier part of an index stores. Files are
+deterministic for a given seed.
+"""
+import os
+import datetime
+from typing import List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# generators by name, see generate()
+KINDS = ('taxi', 'orders')
+
+
+def _skewed(rng: np.random.Generator, rows: int, mean: float, skew: float, outlier_rate: float) -> np.ndarray:
+    values = rng.lognormal(mean=mean, sigma=skew, size=rows)
+    spikes = rng.random(rows) < outlier_rate
+    values[spikes] *= rng.uniform(20, 200, size=spikes.sum())
+    return values
+
+
+def make_taxi_like(
+    path: str,
+    rows: int,
+    row_group_size: int,
+    seed: int = 42,
+    skew: float = 0.6,
+    outlier_rate: float = 0.001,
+    first_trip_id: int = 0,
+):
+    """A yellow-taxi-like file: trip_id is sequential, total_amount skewed with rare extreme fares."""
+    rng = np.random.default_rng(seed)
+    tbl = pa.table({
+        "trip_id": np.arange(first_trip_id, first_trip_id + rows),
+        "VendorID": rng.integers(1, 3, size=rows),
+        "passenger_count": rng.integers(1, 7, size=rows),
+        "trip_distance": rng.exponential(3.0, size=rows),
+        "payment_type": rng.integers(1, 5, size=rows),
+        "total_amount": _skewed(rng, rows, 3.0, skew, outlier_rate),
+    })
+    pq.write_table(tbl, path, row_group_size=row_group_size)
+
+
+def make_orders_like(
+    path: str,
+    rows: int,
+    row_group_size: int,
+    seed: int = 42,
+    skew: float = 0.6,
+    outlier_rate: float = 0.001,
+    first_orderkey: int = 0,
+):
+    """A TPC-H `orders`-like file: o_orderkey is sequential, o_totalprice skewed with rare huge orders."""
+    rng = np.random.default_rng(seed)
+    start = datetime.date(1992, 1, 1).toordinal() - datetime.date(1970, 1, 1).toordinal()
+    tbl = pa.table({
+        "o_orderkey": np.arange(first_orderkey, first_orderkey + rows),
+        "o_custkey": rng.integers(1, 150_000, size=rows),
+        "o_orderstatus": pa.array(rng.choice(['F', 'O', 'P'], size=rows, p=[0.49, 0.49, 0.02])),
+        "o_totalprice": np.round(_skewed(rng, rows, 11.5, skew, outlier_rate), 2),
+        "o_orderdate": pa.array(start + rng.integers(0, 2405, size=rows), pa.int32()).cast(pa.date32()),
+        "o_orderpriority": pa.array(rng.choice(['1-URGENT', '2-HIGH', '3-MEDIUM', '4-NOT SPECIFIED', '5-LOW'], size=rows)),
+        "o_shippriority": np.zeros(rows, dtype=np.int32),
+    })
+    pq.write_table(tbl, path, row_group_size=row_group_size)
+
+
+def generate(
+    folder: str,
+    kind: str = 'taxi',
+    files: int = 4,
+    rows: int = 200_000,
+    row_group_size: int = 20_000,
+    seed: int = 42,
+    skew: float = 0.6,
+    outlier_rate: float = 0.001,
+) -> List[str]:
+    """Write `files` files of `rows` rows each into `folder` and return their paths."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown data kind: {kind}")
+    make = make_taxi_like if kind == 'taxi' else make_orders_like
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = os.path.join(folder, f"{kind}_{i}.parquet")
+        make(path, rows, row_group_size, seed + i, skew, outlier_rate, i * rows)
+        paths.append(path)
+    return paths
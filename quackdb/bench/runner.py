@@ -0,0 +1,187 @@
+"""
+Runs benchmark workloads against quackdb and plain DuckDB.
+
+Every workload runs in a fresh Python process whose index store is an empty
+temporary folder (QUACKDB_SMA_FOLDER), so results do not depend on indexes,
+stats or caches left behind by earlier runs. The child prints its metrics as
+JSON on stdout.
+"""
+import os, sys, json, time, platform, subprocess, tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _bytes_read() -> Optional[int]:
+    """Bytes this process has read through system calls, including from the page cache (Linux only)."""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _summary(latencies: List[float], bytes_read: List[Optional[int]]) -> Dict[str, Any]:
+    lat = np.array(latencies)
+    known = [b for b in bytes_read if b is not None]
+    return {
+        "queries": len(latencies),
+        "first_s": latencies[0],
+        "mean_s": float(lat.mean()),
+        "p50_s": float(np.percentile(lat, 50)),
+        "p90_s": float(np.percentile(lat, 90)),
+        "p99_s": float(np.percentile(lat, 99)),
+        "max_s": float(lat.max()),
+        "latencies_s": latencies,
+        "bytes_read": sum(known) if known else None,
+        "bytes_read_per_query": sum(known) / len(known) if known else None,
+    }
+
+
+def _measure(run, query: str):
+    before = _bytes_read()
+    start = time.perf_counter()
+    tbl = run(query)
+    duration = time.perf_counter() - start
+    after = _bytes_read()
+    return tbl, duration, None if before is None else after - before
+
+
+def result_checksum(tbl) -> Tuple[int, int]:
+    """
+    (rows, checksum) of a result, independent of the row order. Python hashes
+    equal numbers alike whatever their type, so e.g. int64 and HUGEINT results
+    of the same values match.
+    """
+    total = 0
+    for row in zip(*(col.to_pylist() for col in tbl.columns)):
+        # NaN hashes by identity
+        total += hash(tuple('NaN' if isinstance(v, float) and v != v else v for v in row))
+    return tbl.num_rows, total & 0xFFFFFFFFFFFFFFFF
+
+
+def run_workload(query: str, repeats: int, wait: bool = True, result_cache: bool = False) -> Dict[str, Any]:
+    """
+    Run `query` `repeats` times through quackdb and then through DuckDB. With
+    `wait`, background index builds finish after each quackdb query, outside
+    the measured time, so runs are deterministic.
+    """
+    import duckdb
+    import quackdb
+    from quackdb import core
+    from quackdb.cache import result_cache as cache
+    from quackdb.stats import stats_manager
+
+    if not result_cache:
+        cache.lru.set_max_bytes(0)
+
+    quack_lat, quack_bytes, quack_results, build_wait = [], [], [], 0.0
+    for _ in range(repeats):
+        tbl, duration, nbytes = _measure(lambda q: quackdb.sql(q).fetch_arrow_table(), query)
+        quack_lat.append(duration)
+        quack_bytes.append(nbytes)
+        # every run, each may take another path through the indexes
+        quack_results.append(result_checksum(tbl))
+        if wait:
+            start = time.perf_counter()
+            core.build_scheduler.wait_for_builds()
+            build_wait += time.perf_counter() - start
+
+    con = duckdb.connect()
+    duck_lat, duck_bytes, duck_results = [], [], []
+    for _ in range(repeats):
+        tbl, duration, nbytes = _measure(lambda q: con.sql(q).fetch_arrow_table(), query)
+        duck_lat.append(duration)
+        duck_bytes.append(nbytes)
+        duck_results.append(result_checksum(tbl))
+
+    files = stats_manager.snapshot()['files'].values()
+    quack = _summary(quack_lat, quack_bytes)
+    duck = _summary(duck_lat, duck_bytes)
+    return {
+        "query": query,
+        "quackdb": quack,
+        "duckdb": duck,
+        "speedup_p50": duck["p50_s"] / quack["p50_s"] if quack["p50_s"] else None,
+        "rows": quack_results[-1][0],
+        # same rows with the same values, not just as many
+        "results_match": quack_results == duck_results,
+        "index": {
+            "builds": sum(f['construction_count'] for f in files),
+            "deconstructions": sum(f['deconstruction_count'] for f in files),
+            "build_wait_s": build_wait,
+            "bytes": core.disk_quota.usage()["bytes"],
+            "count": core.disk_quota.usage()["indexes"],
+        },
+    }
+
+
+def isolated_env(store: str) -> Dict[str, str]:
+    """Environment of a child process whose index store is `store`."""
+    # the child must import this quackdb, wherever the parent was started from
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    pythonpath = os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))
+    return dict(os.environ, QUACKDB_SMA_FOLDER=store, PYTHONPATH=pythonpath)
+
+
+def run_isolated(query: str, repeats: int, wait: bool = True, result_cache: bool = False) -> Dict[str, Any]:
+    """run_workload() in a child process with an empty index store."""
+    with tempfile.TemporaryDirectory(prefix='quackdb-bench-') as store:
+        spec = json.dumps({"query": query, "repeats": repeats, "wait": wait, "result_cache": result_cache})
+        out = subprocess.run(
+            [sys.executable, '-c', 'from quackdb.bench.runner import _child; _child()', spec],
+            env=isolated_env(store), check=True, stdout=subprocess.PIPE,
+        ).stdout
+    return json.loads(out)
+
+
+def run_suite(
+    data_dir: str,
+    kind: str = 'taxi',
+    regimes: List[str] = None,
+    files: int = 4,
+    rows: int = 200_000,
+    row_group_size: int = 20_000,
+    seed: int = 42,
+    skew: float = 0.6,
+    outlier_rate: float = 0.001,
+    repeats: int = 10,
+    wait: bool = True,
+    result_cache: bool = False,
+) -> Dict[str, Any]:
+    """Generate the data set and run every regime on it, returns the JSON report."""
+    import duckdb
+    import pyarrow
+    from .data import generate
+    from .workloads import REGIMES, workload
+
+    params = dict(kind=kind, files=files, rows=rows, row_group_size=row_group_size,
+                  seed=seed, skew=skew, outlier_rate=outlier_rate)
+    paths = generate(data_dir, **params)
+    report = {
+        "meta": dict(
+            params,
+            repeats=repeats,
+            wait_for_builds=wait,
+            result_cache=result_cache,
+            timestamp=time.time(),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            duckdb=duckdb.__version__,
+            pyarrow=pyarrow.__version__,
+            numpy=np.__version__,
+        ),
+        "workloads": {},
+    }
+    for regime in regimes or REGIMES:
+        report["workloads"][regime] = run_isolated(workload(paths, kind, regime), repeats, wait, result_cache)
+    return report
+
+
+def _child():
+    """Entry point of run_isolated(), the workload spec is the first argument."""
+    spec = json.loads(sys.argv[1])
+    json.dump(run_workload(**spec), sys.stdout)
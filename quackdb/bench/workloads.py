@@ -0,0 +1,40 @@
+"""
+Benchmark workloads, one per regime the index is meant to handle:
+
+  skip      the predicate lies outside every file's min/max, files are skipped
+  outlier   the predicate only matches outliers, files are served from the index
+  full      the predicate matches most rows, every file is scanned
+
+Thresholds are derived from the generated data so every regime behaves as
+intended for any size, skew or outlier rate.
+"""
+from typing import Dict, List
+
+import duckdb
+
+REGIMES = ('skip', 'outlier', 'full')
+
+# the skewed column and the columns a dashboard would read, per data kind
+COLUMNS = {
+    'taxi': ('total_amount', ['payment_type', 'total_amount']),
+    'orders': ('o_totalprice', ['o_orderkey', 'o_totalprice']),
+}
+
+
+def thresholds(paths: List[str], column: str) -> Dict[str, float]:
+    """Predicate constants of each regime for `column` in `paths`."""
+    max_val, p9999, median = duckdb.sql(
+        f'SELECT max("{column}"), quantile_cont("{column}", 0.9999), median("{column}") '
+        f'FROM read_parquet({paths})'
+    ).fetchone()
+    return {'skip': max_val * 2, 'outlier': p9999, 'full': median}
+
+
+def workload(paths: List[str], kind: str, regime: str) -> str:
+    """The query of a regime over `paths`."""
+    if regime not in REGIMES:
+        raise ValueError(f"Unknown regime: {regime}")
+    column, projection = COLUMNS[kind]
+    threshold = thresholds(paths, column)[regime]
+    fields = ', '.join(projection)
+    return f"SELECT {fields} FROM read_parquet({paths}) WHERE {column} > {threshold!r}"
@@ -0,0 +1,95 @@
+import math
+import hashlib
+from typing import Any, Optional
+
+import numpy as np
+
+# target false positive rate of the per-file bloom filters
+BLOOM_FPR = 0.01
+# columns with more distinct values than this get no bloom filter
+BLOOM_MAX_DISTINCT = 1_000_000
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash_numbers(values: np.ndarray) -> np.ndarray:
+    """
+    Stable 64-bit hashes of numeric values. Everything is hashed as float64, so
+    an integer literal probes the same bits as the equal float.
+    """
+    floats = np.asarray(values, dtype=np.float64) + 0.0  # folds -0.0 into 0.0
+    return _splitmix64(floats.view(np.uint64))
+
+
+def _hash_strings(values) -> np.ndarray:
+    """Stable 64-bit hashes of strings, from their UTF-8 bytes."""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(v.encode('utf-8'), digest_size=8).digest(), 'little') for v in values],
+        dtype=np.uint64,
+    )
+
+
+class BloomFilter:
+    """Bloom filter over numeric values, or over strings if `strings`, with double hashing."""
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[np.ndarray] = None, strings: bool = False):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.strings = strings
+        self.bits = bits if bits is not None else np.zeros((num_bits + 7) // 8, dtype=np.uint8)
+
+    @classmethod
+    def for_capacity(cls, n: int, fpr: float = BLOOM_FPR, strings: bool = False) -> 'BloomFilter':
+        n = max(n, 1)
+        num_bits = max(64, int(math.ceil(-n * math.log(fpr) / (math.log(2) ** 2))))
+        num_hashes = max(1, int(round(num_bits / n * math.log(2))))
+        return cls(num_bits, num_hashes, strings=strings)
+
+    def _positions(self, values: np.ndarray) -> np.ndarray:
+        h1 = _hash_strings(values) if self.strings else _hash_numbers(values)
+        h2 = _splitmix64(h1) | np.uint64(1)
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, values: np.ndarray):
+        pos = self._positions(values).ravel()
+        np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.int64),
+                         (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def might_contain(self, value: Any) -> bool:
+        """False only if the value was never added. Values of another type always return True."""
+        if self.strings:
+            if not isinstance(value, str):
+                return True
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return True
+        pos = self._positions(np.array([value], dtype=object if self.strings else None))[0]
+        byte = self.bits[(pos >> np.uint64(3)).astype(np.int64)]
+        return bool(np.all(byte & (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8))))
+
+    def to_bytes(self) -> bytes:
+        return self.bits.tobytes()
+
+    @classmethod
+    def from_buffer(cls, num_bits: int, num_hashes: int, buf, strings: bool = False) -> 'BloomFilter':
+        return cls(num_bits, num_hashes, np.frombuffer(buf, dtype=np.uint8), strings)
+
+
+def build_bloom(distinct: np.ndarray, fpr: float = BLOOM_FPR) -> Optional[BloomFilter]:
+    """
+    Bloom filter over the distinct values of a numeric or string column (an
+    object array of str), None if there are too many.
+    """
+    strings = distinct.dtype.kind == 'O'
+    if len(distinct) > BLOOM_MAX_DISTINCT or distinct.dtype.kind not in 'iufO':
+        return None
+    bloom = BloomFilter.for_capacity(len(distinct), fpr, strings)
+    bloom.add(distinct)
+    return bloom
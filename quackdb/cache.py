@@ -0,0 +1,211 @@
+import os
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import pyarrow as pa
+
+from .utils import Predicate, implies
+
+# default memory cap of the shared index cache
+INDEX_CACHE_BYTES = 64 * 1024 * 1024
+# default memory cap of the query result cache, 0 disables it
+RESULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by the total size in bytes
+    of its entries. Callers pass the size of each entry on `put`.
+    """
+    def __init__(self, max_bytes: int):
+        self.lock = RLock()
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value without counting a hit or touching its recency."""
+        with self.lock:
+            return self._entries.get(key, default)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value and mark it as most recently used."""
+        with self.lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        """Insert or replace an entry, evicting least recently used ones to stay under the cap."""
+        with self.lock:
+            self._pop(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = nbytes
+            self.nbytes += nbytes
+            self._evict()
+
+    def invalidate(self, key: Hashable):
+        with self.lock:
+            self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def set_max_bytes(self, max_bytes: int):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def info(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the current size."""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _pop(self, key: Hashable) -> Optional[Any]:
+        if key not in self._entries:
+            return None
+        self.nbytes -= self._sizes.pop(key)
+        return self._entries.pop(key)
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._pop(key)
+            self.evictions += 1
+
+
+def file_fingerprint(paths: List[str]) -> Tuple[Tuple[str, int, int], ...]:
+    """(path, mtime, size) of each file, changes whenever a file is rewritten."""
+    res = []
+    for p in paths:
+        st = os.stat(p)
+        res.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(res)
+
+
+class ResultCache:
+    """
+    Recent query results as Arrow tables, keyed by file set, projection and
+    predicate. A query is also answered from a cached result whose predicate
+    it implies (e.g. `x > 1000` from `x > 500`) by filtering the cached table,
+    as long as the table holds the columns the predicate needs.
+    Results are dropped when the size or mtime of any of their files changes.
+    """
+    def __init__(self, max_bytes: int):
+        self.lru = LRUCache(max_bytes)
+        self.lock = RLock()
+        # predicates cached per (files, projection), entries may have been evicted since
+        self._scans: Dict[Hashable, Set[str]] = {}
+        self.hits = 0
+        self.contained_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scan_key(paths: List[str], projection: Optional[List[str]]) -> Hashable:
+        return tuple(paths), None if projection is None else tuple(projection)
+
+    def get(
+        self,
+        paths: List[str],
+        projection: Optional[List[str]],
+        predicate: Predicate,
+        fingerprint: Tuple,
+    ) -> Optional[Tuple[pa.Table, Predicate]]:
+        """Return a cached table containing every matching row and the predicate it was cached for."""
+        if self.lru.max_bytes <= 0:
+            return None
+        scan_key = self._scan_key(paths, projection)
+        with self.lock:
+            candidates = self._scans.get(scan_key, set())
+            best = None
+            for pred_sql in list(candidates):
+                key = scan_key + (pred_sql,)
+                entry = self.lru.peek(key)
+                if entry is None:
+                    candidates.discard(pred_sql)
+                    continue
+                cached_fingerprint, cached_pred, tbl = entry
+                if cached_fingerprint != fingerprint:
+                    # a file changed since the result was cached
+                    self.lru.invalidate(key)
+                    candidates.discard(pred_sql)
+                    continue
+                if pred_sql == predicate.to_sql():
+                    best = key
+                    break
+                if (predicate.columns() <= set(tbl.column_names) and implies(predicate, cached_pred)
+                        and (best is None or tbl.num_rows < self.lru.peek(best)[2].num_rows)):
+                    # the smallest containing result is the cheapest to filter
+                    best = key
+            if best is None:
+                self.misses += 1
+                return None
+            _, cached_pred, tbl = self.lru.get(best)
+            if best[-1] == predicate.to_sql():
+                self.hits += 1
+            else:
+                self.contained_hits += 1
+            return tbl, cached_pred
+
+    def put(
+        self,
+        paths: List[str],
+        projection: Optional[List[str]],
+        predicate: Predicate,
+        fingerprint: Tuple,
+        tbl: pa.Table,
+    ):
+        scan_key = self._scan_key(paths, projection)
+        pred_sql = predicate.to_sql()
+        with self.lock:
+            self.lru.put(scan_key + (pred_sql,), (fingerprint, predicate, tbl), tbl.nbytes)
+            if (scan_key + (pred_sql,)) in self.lru:
+                self._scans.setdefault(scan_key, set()).add(pred_sql)
+
+    def clear(self):
+        with self.lock:
+            self.lru.clear()
+            self._scans.clear()
+
+    def info(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(
+                self.lru.info(),
+                hits=self.hits,
+                contained_hits=self.contained_hits,
+                misses=self.misses,
+            )
+
+
+# shared cache of loaded index headers, keyed by index key
+index_cache = LRUCache(INDEX_CACHE_BYTES)
+
+# shared cache of query results, see ResultCache
+result_cache = ResultCache(RESULT_CACHE_BYTES)
@@ -1,255 +1,1345 @@
-import os, pickle, math, time
+import os, time, hashlib
+import atexit
+import logging
 import threading
+import datetime, decimal
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import duckdb
 from duckdb import DuckDBPyRelation
-from typing import Optional, Dict, Any, List
+from functools import partial, lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Callable, Union
 
 from .stats import stats_manager
+from .storage import (read_header, write_index, open_outliers, open_bloom, drop_index, index_exists, list_indexes,
+                      store_version)
+from .cache import index_cache, result_cache, file_fingerprint
+from .bloom import BloomFilter, build_bloom
+from .scheduler import BuildScheduler
+from .reaper import IndexReaper
+from .quota import DiskQuota
+from .trace import QueryTrace
+from .paths import is_remote
+from .utils import Interval, Predicate, Aggregate, is_exact, prefix_end, quote_identifier
 
-# configure base folder for .sma files
-# BASE_FOLDER = os.environ.get('QUACKDB_SMA_FOLDER', os.path.expanduser('~/.quackdb/sma'))
-BASE_FOLDER = os.path.expanduser('~/Desktop/theses/data/sma')
-os.makedirs(BASE_FOLDER, exist_ok=True)
+logger = logging.getLogger(__name__)
 
 # SPA economic model constants
 DEPOSIT_FACTOR = 0.1   # fraction of scan time we deposit after a full scan
 REINVEST_FACTOR = 0.5  # fraction of time saved we reinvest after a skip
-LAST_N_SCANS_TO_KEEP = 5  # number of scans to keep a stale index
+LAST_N_SCANS_TO_KEEP = 5  # number of scans or queries to keep an index that brings no benefit
+
+# store a bloom filter with each index for equality and IN lookups
+BUILD_BLOOM = True
+
+# string zones keep their distinct prefixes of this many characters, if there are at most STRING_PREFIX_MAX
+STRING_PREFIX_LENGTH = 8
+STRING_PREFIX_MAX = 16
+
+# threads loading index headers and footers of many files, and the file count from which they are used
+IO_WORKERS = 16
+PARALLEL_LOOKUP_MIN_FILES = 8
+
+# rows per batch of streamed results
+STREAM_BATCH_ROWS = 1_000_000
+
+# row group number of each outlier row in the index
+RG_COLUMN = "__quackdb_row_group"
+
+# cached in place of a header for columns known to have no index
+_NO_INDEX = object()
+
+
+def _full_path(path: str) -> str:
+    return path if is_remote(path) else os.path.abspath(path)
+
+
+def index_key(path: str, column: str) -> str:
+    """
+    Key of the (file, column) index, shared by the .sma file and the stats.
+    Derived from the full path, files with the same name in different
+    directories (e.g. partitions) get their own index.
+    """
+    # cached by the full path, a relative path names another file after a chdir
+    return _index_key(_full_path(path), column)
+
+
+@lru_cache(maxsize=65536)
+def _index_key(full_path: str, column: str) -> str:
+    digest = hashlib.sha1(full_path.encode()).hexdigest()[:12]
+    return f"{os.path.basename(full_path)}_{digest}_{column}"
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    """(size, mtime) of a file, part of every cache key derived from its contents."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _footer_hash(path: str) -> str:
+    """Hash of the serialized Parquet footer, which includes the schema and every row group."""
+    with open(path, 'rb') as f:
+        f.seek(-8, os.SEEK_END)
+        footer_len = int.from_bytes(f.read(4), 'little')
+        f.seek(-8 - footer_len, os.SEEK_END)
+        return hashlib.sha1(f.read(footer_len)).hexdigest()
+
+
+def source_fingerprint(path: str) -> Dict[str, Any]:
+    """Identity of the Parquet file an index was built from, stored in the index header."""
+    size, mtime_ns = _file_signature(path)
+    return {"path": _full_path(path), "size": size, "mtime_ns": mtime_ns, "footer_hash": _footer_hash(path)}
+
+
+def _matches_source(header: Dict[str, Any], path: str) -> bool:
+    """
+    True if the index was built from the current contents of `path`. A file
+    that was only touched or copied keeps its index, as long as the footer is
+    unchanged.
+    """
+    fp = header.get('fingerprint') or {}
+    if fp.get('path') != _full_path(path):
+        return False
+    size, mtime_ns = _file_signature(path)
+    if (fp.get('size'), fp.get('mtime_ns')) == (size, mtime_ns):
+        return True
+    if fp.get('size') != size or fp.get('footer_hash') != _footer_hash(path):
+        return False
+    # same footer, remember the new mtime so the footer is not hashed again
+    fp['mtime_ns'] = mtime_ns
+    return True
+
+
+def _invalidate_index(key: str, ext: str = ".sma"):
+    index_cache.invalidate((key, ext))
+    index_cache.invalidate(('bloom', key, ext))
+
+
+def _header_size(header: Dict[str, Any]) -> int:
+    # rough in-memory size of a parsed header
+    return 512 + 256 * len(header['row_groups'])
 
 
 def get_sma(
     path: str,
     column: str,
-    op: str,
-    threshold: float,
     ext: str = ".sma"
 ) -> Optional[Dict[str, Any]]:
-    base = os.path.splitext(os.path.basename(path))[0]
-    sma_file = os.path.join(BASE_FOLDER, f"{base}.parquet_{column}_{op}_{threshold}{ext}")
-    # if sma file exists for given predicate, return it
-    if os.path.exists(sma_file):
-        with open(sma_file, 'rb') as f:
-            return pickle.load(f)
+    """
+    Return the header of the column index, without loading the outlier rows.
+    Headers, and columns known to have no index, are served from `index_cache`
+    with the store_version() they were seen at. Once the store changes, e.g.
+    because another process built or dropped an index, a cached header is
+    only served while its file still exists.
+    An index built from an older version of the file is discarded.
+    """
+    key = index_key(path, column)
+    cache_key = (key, ext)
+    version = store_version()
+    entry = index_cache.get(cache_key)
+    if entry is not None and entry[1] != version:
+        if entry[0] is not _NO_INDEX and index_exists(key, ext):
+            entry = (entry[0], version)
+            index_cache.put(cache_key, entry, _header_size(entry[0]))
+        else:
+            entry = None
+    if entry is None:
+        header = read_header(key, ext)
+        entry = (_NO_INDEX, version) if header is None else (header, version)
+        index_cache.put(cache_key, entry, 64 if header is None else _header_size(header))
+    header = entry[0]
+    if header is _NO_INDEX:
+        return None
+    if not _matches_source(header, path):
+        logger.debug("Discarding index %s, %s has changed", key, path)
+        if drop_index(key, ext):
+            stats_manager.record_deconstruction(key)
+        _forget_index(key)
+        index_cache.put(cache_key, (_NO_INDEX, store_version()), 64)
+        return None
+    return header
+
+
+def value_kind(typ: pa.DataType) -> Optional[str]:
+    """
+    How values of an Arrow type are indexed: 'number', 'timestamp', 'date',
+    'decimal' or 'string', None for types without an index.
+    """
+    if pa.types.is_integer(typ) or pa.types.is_floating(typ):
+        return 'number'
+    if pa.types.is_timestamp(typ):
+        return 'timestamp'
+    if pa.types.is_date(typ):
+        return 'date'
+    if pa.types.is_decimal(typ):
+        return 'decimal'
+    if pa.types.is_string(typ) or pa.types.is_large_string(typ):
+        return 'string'
+    return None
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def _timestamp_value(raw: int, typ: pa.TimestampType, round_up: bool = False) -> datetime.datetime:
+    """
+    The datetime of a raw timestamp of `typ`. Nanoseconds are rounded to
+    microseconds, down for lower bounds and up for upper bounds.
+    """
+    if typ.unit == 'ns':
+        us = -(-raw // 1000) if round_up else raw // 1000
+    else:
+        us = raw * {'s': 1_000_000, 'ms': 1000, 'us': 1}[typ.unit]
+    value = _EPOCH + datetime.timedelta(microseconds=us)
+    return value.replace(tzinfo=datetime.timezone.utc) if typ.tz is not None else value
+
+
+def _numeric_view(arr: pa.Array, kind: str) -> Optional[pa.Array]:
+    """The values as numbers for the outlier bounds, None for kinds without outliers."""
+    if kind == 'number':
+        return arr
+    if kind == 'timestamp':
+        return pc.cast(arr, pa.int64())
+    if kind == 'date':
+        return pc.cast(pc.cast(arr, pa.date32()), pa.int32())
+    if kind == 'decimal':
+        return pc.cast(arr, pa.float64())
+    return None
+
+
+def _from_view(x, arr_type: pa.DataType, kind: str, round_up: bool = False) -> Any:
+    """A value of the numeric view as the Python value of the column."""
+    if kind == 'timestamp':
+        return _timestamp_value(int(x), arr_type, round_up)
+    if kind == 'date':
+        return datetime.date.fromordinal(_EPOCH_ORDINAL + int(x))
+    if kind == 'decimal':
+        return decimal.Decimal(repr(float(x)))
+    return x.item() if hasattr(x, 'item') else x
+
+
+def _exact_bounds(typ: pa.DataType) -> bool:
+    """False if min/max of the type are rounded and can only bound values, not be returned as aggregates."""
+    return not (pa.types.is_timestamp(typ) and typ.unit == 'ns')
+
+
+def _exact_sum(v: np.ndarray) -> Union[int, float]:
+    """Sum of the values, of integers as a Python int instead of wrapping around at 64 bits."""
+    if v.dtype.kind not in 'iu':
+        return v.sum().item()
+    v = v.astype(np.int64 if v.dtype.kind == 'i' else np.uint64, copy=False)
+    # the sums of the high and low 32 bits fit 64 bits for up to 2^31 values
+    shift, mask = v.dtype.type(32), v.dtype.type(0xFFFFFFFF)
+    return (int((v >> shift).sum(dtype=v.dtype)) << 32) + int((v & mask).sum(dtype=v.dtype))
+
+
+def _outlier_mask(arr: pa.Array, lower: Any, upper: Any) -> pa.Array:
+    """Boolean mask of values outside [lower, upper]."""
+    return pc.or_(pc.less(arr, lower), pc.greater(arr, upper))
 
 
 def build_sma(
     path: str,
     column: str,
-    op: str,
-    threshold: float,
     ext: str = ".sma",
+    bloom: bool = BUILD_BLOOM,
 ) -> Optional[Dict[str, Any]]:
-    base = os.path.splitext(os.path.basename(path))[0]
-    sma_file = os.path.join(BASE_FOLDER, f"{base}.parquet_{column}_{op}_{threshold}{ext}")
-
-    # read full table
-    tbl = pq.read_table(path)
-
-    # get only given column
-    arr: pa.ChunkedArray = tbl[column]
-
-    # flatten & drop nulls
-    vals: List[float] = []
-    for chunk in arr.chunks:
-        for v in chunk.to_numpy():
-            if v is not None:
-                vals.append(v)
-    if not vals:
+    """
+    Build the predicate-independent index of `column` in `path`: min/max, the
+    IQR outlier bounds and every outlier row, plus a bloom filter over the
+    distinct values if `bloom`. Predicates are applied at query time.
+
+    Numbers, timestamps, dates and decimals get outliers, computed on their
+    numeric value; strings get lexicographic min/max and the distinct prefixes
+    of each row group (if few) instead. Other types are not indexed.
+
+    `row_groups` holds one zone per row group with its min/max, the min/max
+    of its non-outlier values and the count (and for numbers the sum) of its
+    non-null values, or None if the row group has no non-null values.
+    NaN is left out of min/max and the outlier bounds; zones holding NaN are
+    marked `"nan": True` and always scanned.
+    Outlier rows carry their row group number in `RG_COLUMN` and are stored
+    next to the header, see `storage.open_outliers`.
+    """
+
+    # taken before reading, a concurrent rewrite makes the index stale rather than wrong
+    fingerprint = source_fingerprint(path)
+    pf = pq.ParquetFile(path)
+    typ = pf.schema_arrow.field(column).type
+    kind = value_kind(typ)
+    if kind is None:
         return None
-    
-    # find outliers
-    vals.sort()
-    n = len(vals)
-
-    def quantile(p: float) -> float:
-        idx = p * (n - 1)
-        low, high = math.floor(idx), math.ceil(idx)
-        return vals[low] + (idx - low) * (vals[high] - vals[low])
-    
-    q1, q3 = quantile(0.25), quantile(0.75)
-    iqr = q3 - q1
-    lower_bound = q1 - 1.5 * iqr
-    upper_bound = q3 + 1.5 * iqr
-
-    # identify and filter outlier row indices
-    outlier_indices: List[int] = []
-    row = 0
-    for chunk in arr.chunks:
-        py = chunk.to_numpy()
-        for i, v in enumerate(py):
-            # check null and outlier conditions
-            if v is not None and (v < lower_bound or v > upper_bound):
-                # check if outlier satisfies the predicate
-                if op == '>' and v > threshold:
-                    outlier_indices.append(row + i)
-                elif op == '<' and v < threshold:
-                    outlier_indices.append(row + i)
-                elif op == '=' and v == threshold:
-                    outlier_indices.append(row + i)
-                elif op == '!=' and v != threshold:
-                    outlier_indices.append(row + i)
-                elif op == '>=' and v >= threshold:
-                    outlier_indices.append(row + i)
-                elif op == '<=' and v <= threshold:
-                    outlier_indices.append(row + i)
-        row += len(py)
-    
-    # extract outlier rows with all columns included
-    idx_arr = pa.array(outlier_indices, type=pa.int64())
-    outlier_table = tbl.take(idx_arr) 
+    exact = _exact_bounds(typ)
+
+    # first pass: stream only the indexed column, one row group at a time
+    rg_arrays: List[Optional[pa.Array]] = []
+    for rg in range(pf.num_row_groups):
+        chunks = [
+            batch.column(0).drop_null()
+            for batch in pf.iter_batches(row_groups=[rg], columns=[column])
+        ]
+        chunks = [c for c in chunks if len(c)]
+        rg_arrays.append(pa.concat_arrays(chunks) if chunks else None)
+    if all(a is None for a in rg_arrays):
+        return None
+    # NaN is not null but has no place in min/max or the quantiles, its row groups are never pruned
+    nan_rgs = set()
+    rg_values: List[Optional[np.ndarray]] = []
+    for rg, a in enumerate(rg_arrays):
+        if a is None or kind == 'string':
+            rg_values.append(None)
+            continue
+        if pa.types.is_floating(typ):
+            is_nan = pc.is_nan(a)
+            if pc.any(is_nan).as_py():
+                nan_rgs.add(rg)
+                a = a.filter(pc.invert(is_nan))
+        rg_values.append(_numeric_view(a, kind).to_numpy(zero_copy_only=False) if len(a) else None)
+    if kind != 'string' and all(v is None for v in rg_values):
+        # only NaN
+        return None
+
+    if kind == 'string':
+        # no outliers, the bounds are min/max
+        lower_bound = upper_bound = None
+        distinct = pc.unique(pa.chunked_array([a for a in rg_arrays if a is not None])) if bloom else None
+    else:
+        vals = np.concatenate([v for v in rg_values if v is not None])
+        # find outliers, quantiles use selection instead of a full sort
+        q1, q3 = np.quantile(vals, [0.25, 0.75])
+        iqr = q3 - q1
+        lower_bound = q1 - 1.5 * iqr
+        upper_bound = q3 + 1.5 * iqr
+        if kind in ('timestamp', 'date') or vals.dtype.kind in 'iu':
+            # integer bounds compare exactly with the integer view in both passes, also beyond 2^53
+            info = np.iinfo(vals.dtype)
+            lower_bound = max(int(np.floor(lower_bound)), int(info.min))
+            upper_bound = min(int(np.ceil(upper_bound)), int(info.max))
+        distinct = pc.unique(pa.array(vals)) if bloom and kind == 'number' else None
+        del vals
+    bloom_filter = None if distinct is None else build_bloom(distinct.to_numpy(zero_copy_only=False))
 
+    # per row group zone maps
+    zones: List[Optional[Dict[str, Any]]] = []
+    outlier_rgs: List[int] = []
+    for rg, (a, v) in enumerate(zip(rg_arrays, rg_values)):
+        if a is None:
+            zones.append(None)
+            continue
+        if v is None and kind != 'string':
+            # only NaN besides nulls
+            zone = {"min": None, "max": None, "lower_threshold": None, "upper_threshold": None}
+        elif kind == 'string':
+            lo, hi = pc.min_max(a).values()
+            zone = {"min": lo.as_py(), "max": hi.as_py()}
+            zone.update({"lower_threshold": zone["min"], "upper_threshold": zone["max"]})
+            prefixes = pc.unique(pc.utf8_slice_codeunits(a, 0, STRING_PREFIX_LENGTH))
+            zone["prefixes"] = sorted(prefixes.to_pylist()) if len(prefixes) <= STRING_PREFIX_MAX else None
+        else:
+            mask = (v >= lower_bound) & (v <= upper_bound)
+            inliers = v[mask]
+            if len(inliers) < len(v):
+                outlier_rgs.append(rg)
+            if kind == 'decimal':
+                # exact decimals, the float view only classifies them
+                lo, hi = pc.min_max(a).values()
+                in_lo, in_hi = pc.min_max(a.filter(pa.array(mask))).values() if len(inliers) else (None, None)
+                zone = {
+                    "min": lo.as_py(), "max": hi.as_py(),
+                    "lower_threshold": None if in_lo is None else in_lo.as_py(),
+                    "upper_threshold": None if in_hi is None else in_hi.as_py(),
+                }
+            else:
+                zone = {
+                    "min": _from_view(v.min(), typ, kind),
+                    "max": _from_view(v.max(), typ, kind, round_up=True),
+                    "lower_threshold": _from_view(inliers.min(), typ, kind) if len(inliers) else None,
+                    "upper_threshold": _from_view(inliers.max(), typ, kind, round_up=True) if len(inliers) else None,
+                }
+        zone["count"] = len(a)
+        zone["sum"] = _exact_sum(v) if kind == 'number' and v is not None else None
+        if not exact:
+            zone["exact"] = False
+        if rg in nan_rgs:
+            zone["nan"] = True
+        zones.append(zone)
+    del rg_values
+
+    # second pass: read full rows only from row groups that hold outliers
+    batches: List[pa.RecordBatch] = []
+    for rg in outlier_rgs:
+        for batch in pf.iter_batches(row_groups=[rg]):
+            view = _numeric_view(batch.column(column), kind)
+            batch = batch.filter(pc.fill_null(_outlier_mask(view, lower_bound, upper_bound), False))
+            rg_ids = pa.array(np.full(batch.num_rows, rg, dtype=np.int32))
+            batches.append(pa.RecordBatch.from_arrays(
+                batch.columns + [rg_ids], names=batch.schema.names + [RG_COLUMN]
+            ))
+    schema = pf.schema_arrow.append(pa.field(RG_COLUMN, pa.int32()))
+    outlier_table = pa.Table.from_batches(batches, schema=schema)
+
+    known = [z for z in zones if z is not None and z["min"] is not None]
     stats = {
-        "min": vals[0],
-        "max": vals[-1],
-        "lower_threshold": lower_bound,
-        "upper_threshold": upper_bound,
-        "outliers": outlier_table,
+        "value_type": kind,
+        "min": min(z["min"] for z in known),
+        "max": max(z["max"] for z in known),
+        "lower_threshold": None if lower_bound is None else _from_view(lower_bound, typ, kind),
+        "upper_threshold": None if upper_bound is None else _from_view(upper_bound, typ, kind, round_up=True),
+        "row_groups": zones,
+        "outlier_count": outlier_table.num_rows,
+        "fingerprint": fingerprint,
+        "bloom": None if bloom_filter is None else {
+            "num_bits": bloom_filter.num_bits,
+            "num_hashes": bloom_filter.num_hashes,
+        },
     }
+    if lower_bound is None:
+        stats["lower_threshold"], stats["upper_threshold"] = stats["min"], stats["max"]
 
-    # save stats to sma file
-    with open(sma_file, 'wb') as f:
-        pickle.dump(stats, f)
+    # save stats to sma files, if the store has room for them
+    key = index_key(path, column)
+    bloom_bytes = None if bloom_filter is None else bloom_filter.to_bytes()
+    nbytes = outlier_table.nbytes + 512 + 256 * len(zones)
+    if bloom_bytes is not None and not disk_quota.make_room(key, nbytes + len(bloom_bytes)):
+        # the bloom filter is optional, try to keep the rest of the index
+        bloom_bytes, stats["bloom"] = None, None
+    if bloom_bytes is None and not disk_quota.make_room(key, nbytes):
+        logger.debug("Index %s of %d bytes does not fit the quota", key, nbytes)
+        return None
+    write_index(key, stats, outlier_table, ext, bloom_bytes)
+    _invalidate_index(key, ext)
     
     return stats
 
 
+def _reap_index(key: str) -> int:
+    # logged like a quota eviction, so that processes sharing the store forget the index too
+    return disk_quota.evict(key, reason='stale')
+
+
+# deconstructs stale indexes (B_key<0 or zero skip/outlier in last N scans), see reaper.IndexReaper
+index_reaper = IndexReaper(stats_manager, _reap_index, LAST_N_SCANS_TO_KEEP, list_fn=list_indexes)
+atexit.register(index_reaper.stop)
+
+
+def _forget_index(key: str):
+    _invalidate_index(key)
+    index_reaper.untrack(key)
+
+
+# keeps BASE_FOLDER under its byte quota, see quota.DiskQuota
+disk_quota = DiskQuota(stats_manager, on_evict=_forget_index)
+
+
+def _build_done(path: str, column: str):
+    # builds may run in another process, drop whatever this process cached
+    disk_quota.sync()
+    key = index_key(path, column)
+    _invalidate_index(key)
+    index_reaper.track(key)
+
+
+_seen_store_version: Optional[int] = None
+
+
+def _sync_store():
+    """Forget the indexes other processes dropped, checked once per query."""
+    global _seen_store_version
+    version = store_version()
+    if version != _seen_store_version:
+        _seen_store_version = version
+        disk_quota.sync()
+
+
+# background index builds, see scheduler.BuildScheduler
+build_scheduler = BuildScheduler(build_sma, on_done=_build_done)
+# concurrent.futures refuses new work from its own exit hook on, which runs before atexit's;
+# threading's exit hooks run earlier, last registered first (Python 3.9+)
+getattr(threading, '_register_atexit', atexit.register)(build_scheduler.shutdown)
+
+
+def _zone_action(zone: Optional[Dict[str, Any]], interval: Interval) -> str:
+    """Decide how a file or row group zone is served: 'skip', 'outlier' or 'scan'."""
+    if zone is None:
+        # no non-null values, a range condition never matches
+        return 'skip'
+    if zone.get('nan'):
+        # NaN is not within min/max, and compares above every number in DuckDB
+        return 'scan'
+    if zone['min'] is None or zone['max'] is None:
+        # no statistics for this zone
+        return 'scan'
+    if not interval.overlaps(zone['min'], zone['max']):
+        return 'skip'
+    prefixes = zone.get('prefixes')
+    if prefixes is not None and not any(_prefix_overlaps(interval, p) for p in prefixes):
+        # the range falls between the strings of the zone
+        return 'skip'
+    lower, upper = zone['lower_threshold'], zone['upper_threshold']
+    if lower is None or not interval.overlaps(lower, upper):
+        # every value the predicate allows is an outlier
+        return 'outlier'
+    return 'scan'
+
+
+def _prefix_overlaps(interval: Interval, prefix: str) -> bool:
+    """True if some string starting with `prefix` may fall in the interval."""
+    end = prefix_end(prefix)
+    return end is None or interval.overlaps(prefix, end)
+
+
+def _bloom_may_contain(key: str, header: Dict[str, Any], points, ext: str = ".sma") -> bool:
+    """False if the index's bloom filter rules out every point; True without a filter."""
+    if not header.get('bloom'):
+        return True
+    cache_key = ('bloom', key, ext)
+    bloom = index_cache.get(cache_key)
+    if bloom is None:
+        spec = header['bloom']
+        try:
+            bits = open_bloom(key, ext)
+        except FileNotFoundError:
+            # the index was dropped since its header was loaded
+            return True
+        bloom = BloomFilter.from_buffer(spec['num_bits'], spec['num_hashes'], bits,
+                                        strings=header.get('value_type') == 'string')
+        index_cache.put(cache_key, bloom, len(bloom.bits))
+    return any(bloom.might_contain(p) for p in points)
+
+
+def _file_metadata(path: str) -> pq.FileMetaData:
+    """Parquet footer of `path`, cached in `index_cache` until the file changes."""
+    cache_key = ('metadata', path, _file_signature(path))
+    md = index_cache.get(cache_key)
+    if md is None:
+        md = pq.read_metadata(path)
+        index_cache.put(cache_key, md, md.serialized_size)
+    return md
+
+
+def get_footer_sma(path: str, column: str) -> Dict[str, Any]:
+    """
+    Metadata-only index tier built from the min/max statistics in the Parquet
+    footer. It has the layout of an index header but no outliers: the outlier
+    bounds equal min/max and there are no sums. Row groups without usable
+    statistics get a zone with unknown (None) min/max and are always scanned.
+    Zones whose min/max are not the exact values (truncated strings,
+    nanoseconds rounded to microseconds) are marked `"exact": False`.
+    Footer min/max of floats leave out NaN, and the footer does not say
+    whether there is any: their zones are marked `"nan": True` and neither
+    prune nor answer aggregates.
+    """
+    cache_key = ('footer', path, _file_signature(path), column)
+    cached = index_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    md = _file_metadata(path)
+    schema = md.schema.to_arrow_schema()
+    typ = schema.field(column).type if column in schema.names else pa.null()
+    # string statistics may be truncated, they only bound the values
+    exact = _exact_bounds(typ) and value_kind(typ) != 'string'
+    maybe_nan = pa.types.is_floating(typ)
+    zones: List[Optional[Dict[str, Any]]] = []
+    for rg in range(md.num_row_groups):
+        rg_md = md.row_group(rg)
+        zone = {"min": None, "max": None, "lower_threshold": None, "upper_threshold": None, "count": None}
+        for c in range(rg_md.num_columns):
+            col_md = rg_md.column(c)
+            if col_md.path_in_schema != column:
+                continue
+            st = col_md.statistics
+            if st is not None and st.has_null_count and st.null_count == rg_md.num_rows:
+                # only nulls in this row group
+                zone = None
+                break
+            bounds = _footer_bounds(st, typ) if st is not None and st.has_min_max else None
+            if bounds is not None:
+                lo, hi = bounds
+                zone.update({"min": lo, "max": hi, "lower_threshold": lo, "upper_threshold": hi})
+                if not exact:
+                    zone["exact"] = False
+                if maybe_nan:
+                    zone["nan"] = True
+            if st is not None and st.has_null_count:
+                zone["count"] = rg_md.num_rows - st.null_count
+            break
+        zones.append(zone)
+
+    known = [z for z in zones if z is not None]
+    footer = {
+        "min": None if not known or any(z["min"] is None for z in known) else min(z["min"] for z in known),
+        "max": None if not known or any(z["max"] is None for z in known) else max(z["max"] for z in known),
+        "row_groups": zones,
+    }
+    index_cache.put(cache_key, footer, 512 + 256 * len(zones))
+    return footer
+
+
+def _zone_covered(zone: Optional[Dict[str, Any]], interval: Interval, num_rows: int) -> bool:
+    """True if every row of the zone matches the interval: no nulls and [min, max] inside it."""
+    if zone is None or zone["min"] is None or zone.get("nan") or zone.get("count") != num_rows:
+        return False
+    return interval.covers(zone["min"], zone["max"])
+
+
+def _zone_aggregates(aggregates: List[Aggregate], zones: Dict[str, List[Optional[Dict[str, Any]]]],
+                     rg: int, num_rows: int) -> Optional[tuple]:
+    """Partial aggregates of a whole row group from zone maps, None if a zone lacks a value."""
+    res = []
+    for agg in aggregates:
+        if agg.column is None:
+            res.append(num_rows)
+            continue
+        zone = zones[agg.column][rg]
+        if zone is None:
+            # only nulls
+            res.append(0 if agg.func == 'count' else None)
+            continue
+        if zone.get('nan'):
+            # min/max and sum leave out NaN, DuckDB's do not
+            return None
+        if agg.func in ('min', 'max') and not zone.get('exact', True):
+            # the bounds are rounded, not values of the column
+            return None
+        value = zone.get(agg.func)
+        if value is None:
+            return None
+        res.append(value)
+    return tuple(res)
+
+
+def _partial_row(rel: DuckDBPyRelation) -> tuple:
+    """The one-row aggregate `rel` as Python values, nanosecond timestamps as integers to keep their precision."""
+    row = []
+    for col in rel.fetch_arrow_table().columns:
+        if pa.types.is_timestamp(col.type) and col.type.unit == 'ns':
+            col = col.cast(pa.int64())
+        row.append(col[0].as_py())
+    return tuple(row)
+
+
+def _nan_last(v: Any) -> tuple:
+    """Sort key ordering NaN above every number, as DuckDB does."""
+    return (1, 0) if isinstance(v, float) and v != v else (0, v)
+
+
+def _combine_aggregates(path: str, aggregates: List[Aggregate], partials: List[tuple]) -> pa.Table:
+    """Merge partial aggregates into the one-row result, typed like the columns of `path`."""
+    schema = _file_metadata(path).schema.to_arrow_schema()
+    columns = {}
+    for i, agg in enumerate(aggregates):
+        values = [row[i] for row in partials if row[i] is not None]
+        if agg.func == 'count':
+            columns[agg.name] = pa.array([sum(values)], pa.int64())
+            continue
+        typ = schema.field(agg.column).type
+        if agg.func == 'sum':
+            if pa.types.is_integer(typ):
+                # exact, and typed like DuckDB's HUGEINT sums
+                value = sum(int(v) for v in values) if values else None
+                typ = pa.decimal128(38, 0)
+            else:
+                value = sum(values) if values else None
+                typ = pa.float64() if pa.types.is_floating(typ) else None
+        else:
+            value = (min if agg.func == 'min' else max)(values, key=_nan_last) if values else None
+        columns[agg.name] = pa.array([value], typ)
+    return pa.table(columns)
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _coerce_value(value: Any, kind: Optional[str]) -> Any:
+    """A literal as a value comparable with the zones of a column of `kind`, the way DuckDB casts it."""
+    if kind == 'timestamp':
+        if isinstance(value, str):
+            return datetime.datetime.fromisoformat(value)
+        if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+            return datetime.datetime.combine(value, datetime.time())
+    elif kind == 'date' and isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    elif kind == 'decimal' and isinstance(value, (float, str)):
+        # compare with the decimal DuckDB reads, not its binary approximation
+        return decimal.Decimal(repr(value) if isinstance(value, float) else value)
+    return value
+
+
+def _coerce_ranges(ranges: Dict[str, Interval], schema: pa.Schema) -> Dict[str, Interval]:
+    """
+    The ranges with their literals cast to the column types of `schema`.
+    A literal that does not cast stays as it is, incomparable with the zones,
+    which then neither skip nor cover anything.
+    """
+    coerced = {}
+    for col, interval in ranges.items():
+        kind = value_kind(schema.field(col).type) if col in schema.names else None
+        try:
+            coerced[col] = interval.map(lambda v: _coerce_value(v, kind))
+        except (ValueError, ArithmeticError):
+            coerced[col] = interval
+    return coerced
+
+
+def _footer_bounds(st: pq.Statistics, typ: pa.DataType) -> Optional[tuple]:
+    """Min/max of footer statistics as values of the column type, None if they are not usable."""
+    kind = value_kind(typ)
+    try:
+        if kind == 'timestamp':
+            # the raw integers, converting nanoseconds needs pandas
+            return _timestamp_value(st.min_raw, typ), _timestamp_value(st.max_raw, typ, round_up=True)
+        lo, hi = st.min, st.max
+    except Exception:
+        return None
+    if kind == 'number':
+        ok = _is_number(lo) and _is_number(hi)
+    elif kind == 'date':
+        ok = isinstance(lo, datetime.date) and isinstance(hi, datetime.date)
+    elif kind == 'decimal':
+        ok = isinstance(lo, decimal.Decimal) and isinstance(hi, decimal.Decimal)
+    elif kind == 'string':
+        ok = isinstance(lo, str) and isinstance(hi, str)
+    else:
+        ok = False
+    return (lo, hi) if ok else None
+
+
+def _scan_bytes(path: str, columns: Optional[List[str]]) -> int:
+    """Compressed bytes of `columns` (all if None) in `path`, from the Parquet footer; 0 for remote files."""
+    if is_remote(path):
+        return 0
+    md = _file_metadata(path)
+    names = None if columns is None else set(columns)
+    total = 0
+    for rg in range(md.num_row_groups):
+        rg_md = md.row_group(rg)
+        for c in range(rg_md.num_columns):
+            col_md = rg_md.column(c)
+            if names is None or col_md.path_in_schema in names:
+                total += col_md.total_compressed_size
+    return total
+
+
+def _arrow_filter(predicate_sql: str) -> str:
+    """
+    The predicate for relations over Arrow data. DuckDB pushes plain
+    comparisons into the Arrow scan, where NaN matches none of them; DuckDB
+    itself orders NaN above every number. IS TRUE keeps the filter in DuckDB.
+    """
+    return f"({predicate_sql}) IS TRUE"
+
+
+def _empty_result(path: str, projection: Optional[List[str]], con: 'duckdb.DuckDBPyConnection') -> DuckDBPyRelation:
+    empty = pq.read_schema(path).empty_table()
+    return con.from_arrow(empty.select(projection) if projection else empty)
+
+
+_io_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _prefetch(paths: List[str], columns: List[str]):
+    """
+    Load the index headers (or footer zone maps) of `columns` and the footers
+    of `paths` into `index_cache` on a thread pool, the lookups are I/O bound.
+    """
+    global _io_pool
+    if len(paths) < PARALLEL_LOOKUP_MIN_FILES:
+        return
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='quackdb-io')
+
+    def load(chunk: List[str]):
+        for p in chunk:
+            _file_metadata(p)
+            for col in columns:
+                if get_sma(p, col) is None:
+                    get_footer_sma(p, col)
+
+    chunk_size = max(1, len(paths) // (IO_WORKERS * 4))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    # list() waits for all lookups and re-raises their errors
+    list(_io_pool.map(load, chunks))
+
+
+def _timed_scan(trace: QueryTrace, on_done: Callable[[float], None], duration: float):
+    trace.phase('execute_s', duration)
+    on_done(duration)
+
+
+def _traced_reader(reader: pa.RecordBatchReader, trace: QueryTrace) -> pa.RecordBatchReader:
+    """Count the rows of `reader` into `trace` and finish it once exhausted."""
+    def batches():
+        for batch in reader:
+            trace.produced(batch.num_rows, batch.nbytes)
+            yield batch
+        trace.finish()
+
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+
+def _stream_results(
+    paths: List[str],
+    projection: Optional[List[str]],
+    con: 'duckdb.DuckDBPyConnection',
+    outliers: List[DuckDBPyRelation],
+    scans: List[Tuple[Callable[[], DuckDBPyRelation], Callable[[float], None]]],
+    finish: Callable[[], None],
+    trace: QueryTrace,
+) -> pa.RecordBatchReader:
+    """
+    Chain the outlier relations and then the scans into one reader. Only the
+    time spent producing a scan's batches is reported to its callback, and
+    `finish` runs once the last batch has been read.
+    """
+    # the types DuckDB produces when it scans the files itself
+    selected_fields = '*' if not projection else ', '.join(f'"{c}"' for c in projection)
+    schema = con.sql(f"SELECT {selected_fields} FROM read_parquet({paths[:1]}) LIMIT 0").fetch_arrow_table().schema
+
+    def conform(batch: pa.RecordBatch) -> pa.RecordBatch:
+        trace.produced(batch.num_rows, batch.nbytes)
+        if batch.schema.equals(schema):
+            return batch
+        return pa.Table.from_batches([batch]).cast(schema).to_batches()[0]
+
+    def batches():
+        for rel in outliers:
+            for batch in rel.fetch_record_batch(STREAM_BATCH_ROWS):
+                yield conform(batch)
+        for make_rel, on_done in scans:
+            start = time.perf_counter()
+            reader = make_rel().fetch_record_batch(STREAM_BATCH_ROWS)
+            duration = 0.0
+            while True:
+                try:
+                    batch = reader.read_next_batch()
+                except StopIteration:
+                    break
+                duration += time.perf_counter() - start
+                yield conform(batch)
+                start = time.perf_counter()
+            on_done(duration + time.perf_counter() - start)
+        finish()
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+class SharedScan:
+    """
+    The scans of a batch of queries over the same files, run as one pass.
+
+    read_parquet_sma(..., shared=...) plans a query without scanning: it
+    registers the row groups it has to read and the outliers it would serve.
+    run() then reads every registered row group once, evaluates the predicate
+    of each query on it in a single DuckDB pass and splits the rows by query.
+    Outliers are only served for row groups the shared scan does not read,
+    the scan already holds their rows, and row groups a query skipped cannot
+    match its predicate.
+    """
+    def __init__(self, con: 'duckdb.DuckDBPyConnection'):
+        self.con = con
+        self.queries: List[Dict[str, Any]] = []
+        # row groups to read per file, None for all of them
+        self.row_groups: Dict[str, Optional[set]] = {}
+
+    def register(self, selected_fields: str, predicate_sql: str, columns: Optional[List[str]], trace: QueryTrace,
+                 finish: Callable[[], None], empty: Optional[Callable[[], DuckDBPyRelation]]) -> int:
+        """Add a query, returns its tag."""
+        self.queries.append({
+            "selected_fields": selected_fields,
+            "predicate_sql": predicate_sql,
+            "columns": columns,
+            "trace": trace,
+            "finish": finish,
+            "empty": empty,
+            "scans": [],
+            "outliers": [],
+        })
+        return len(self.queries) - 1
+
+    def scan(self, tag: int, files: List[str], row_groups: Optional[List[int]], on_done: Callable[[float], None]):
+        """Row groups (all if None) of `files` query `tag` has to read, `on_done` gets its share of the scan time."""
+        for p in files:
+            if row_groups is None or self.row_groups.get(p, set()) is None:
+                self.row_groups[p] = None
+            else:
+                self.row_groups.setdefault(p, set()).update(row_groups)
+        self.queries[tag]["scans"].append((files, row_groups, on_done))
+
+    def outliers(self, tag: int, path: str, make_rel: Callable[[List[int]], DuckDBPyRelation], row_groups: List[int]):
+        """Row groups of `path` query `tag` serves from outliers, `make_rel(row_groups)` retrieves them."""
+        self.queries[tag]["outliers"].append((path, make_rel, row_groups))
+
+    def _columns(self) -> Optional[List[str]]:
+        if any(q["columns"] is None for q in self.queries):
+            return None
+        return list(dict.fromkeys(c for q in self.queries for c in q["columns"]))
+
+    def run(self) -> List[Optional[DuckDBPyRelation]]:
+        """Scan once and return the result of every registered query, in order."""
+        con = self.con
+        columns = self._columns()
+        fields = '*' if columns is None else ', '.join(f'"{c}"' for c in columns)
+        tags = [f"__quackdb_q{i}" for i in range(len(self.queries))]
+        scanned = None
+        duration = 0.0
+        if self.row_groups:
+            full = [p for p, rgs in self.row_groups.items() if rgs is None]
+            sources = [con.sql(f"SELECT {fields} FROM read_parquet({full})")] if full else []
+            for p, rgs in self.row_groups.items():
+                if rgs is not None:
+                    tbl = pq.ParquetFile(p).read_row_groups(sorted(rgs), columns=columns)
+                    sources.append(con.from_arrow(tbl).project(fields))
+            src = sources[0]
+            for rel in sources[1:]:
+                src = src.union(rel)
+            # one pass flags the rows of every query, a row no query wants is dropped
+            flags = ', '.join(f"({q['predicate_sql']}) AS {t}" for q, t in zip(self.queries, tags))
+            any_match = ' OR '.join(f"({q['predicate_sql']})" for q in self.queries)
+            start = time.perf_counter()
+            tbl = src.project(f"*, {flags}").filter(_arrow_filter(any_match)).fetch_arrow_table()
+            duration = time.perf_counter() - start
+            scanned = con.from_arrow(tbl)
+            self._attribute(duration, columns)
+
+        results = []
+        for q, t in zip(self.queries, tags):
+            res = None
+            if scanned is not None:
+                selected = q["selected_fields"]
+                if selected == '*':
+                    selected = f"* EXCLUDE ({', '.join(tags)})"
+                res = scanned.filter(f'"{t}"').project(selected)
+            for p, make_rel, rgs in q["outliers"]:
+                read = self.row_groups.get(p, set())
+                if read is None:
+                    continue
+                rgs = [rg for rg in rgs if rg not in read]
+                if rgs:
+                    rel = make_rel(rgs)
+                    res = rel if res is None else res.union(rel)
+            if res is None and q["empty"] is not None:
+                res = q["empty"]()
+            if res is not None and q["trace"].wanted:
+                out = res.fetch_arrow_table()
+                q["trace"].produced(out.num_rows, out.nbytes)
+                res = con.from_arrow(out)
+            results.append(res)
+            q["finish"]()
+        return results
+
+    def _attribute(self, duration: float, columns: Optional[List[str]]):
+        # every registered scan is charged by the bytes it asked for
+        parts = []
+        for q in self.queries:
+            for files, rgs, on_done in q["scans"]:
+                weight = 0.0
+                for p in files:
+                    nbytes = _scan_bytes(p, columns)
+                    weight += nbytes if rgs is None else nbytes * len(rgs) / max(_file_metadata(p).num_row_groups, 1)
+                parts.append((weight, on_done))
+        total = sum(w for w, _ in parts)
+        for weight, on_done in parts:
+            on_done(duration * (weight / total if total else 1 / len(parts)))
+
+
 def read_parquet_sma(
     paths: List[str],
     projection: Optional[List[str]],
-    column: str,
-    op: str,
-    threshold: float,
-    con: 'duckdb.DuckDBPyConnection'
-) -> DuckDBPyRelation:
+    predicate: Predicate,
+    con: 'duckdb.DuckDBPyConnection',
+    stream: bool = False,
+    aggregates: Optional[List[Aggregate]] = None,
+    trace: Optional[QueryTrace] = None,
+    deposit_factor: Optional[float] = None,
+    reinvest_factor: Optional[float] = None,
+    shared: Optional['SharedScan'] = None,
+) -> Union[DuckDBPyRelation, pa.RecordBatchReader, None]:
+    """
+    Run the filtered scan of `paths`, skipping or serving from outliers what
+    the indexes allow. Returns a relation, or with `stream` a RecordBatchReader
+    that yields the outlier rows first and then streams the scans; scan stats
+    are recorded once the reader is exhausted.
+
+    With `aggregates` the result is their single row instead. Row groups whose
+    rows all match are answered from zone maps, outliers and the remaining
+    scans are aggregated by DuckDB and the partial results merged.
+    `projection` must then hold the aggregated columns.
+
+    What the query did is recorded in `trace` (a new QueryTrace if None),
+    which is finished and handed to the trace hooks with the result.
+    `deposit_factor` and `reinvest_factor` override DEPOSIT_FACTOR and
+    REINVEST_FACTOR, e.g. per Session.
+
+    With `shared` the query is only planned: its scans and outliers are
+    registered with the SharedScan, which produces the result, and None is
+    returned (unless the result cache answers the query).
+    """
+    if shared is not None and (stream or aggregates):
+        raise ValueError("Shared scans do not support streaming or aggregates")
+    _sync_store()
+    if trace is None:
+        trace = QueryTrace()
+    if deposit_factor is None:
+        deposit_factor = DEPOSIT_FACTOR
+    if reinvest_factor is None:
+        reinvest_factor = REINVEST_FACTOR
+    if aggregates and stream:
+        return read_parquet_sma(paths, projection, predicate, con, aggregates=aggregates, trace=trace,
+                                deposit_factor=deposit_factor, reinvest_factor=reinvest_factor).fetch_record_batch()
+    if stream:
+        # the reader outlives this call, give it a connection of its own
+        con = con.cursor()
+    plan_start = time.perf_counter()
+    selected_fields = '*' if not projection else ', '.join(f'"{c}"' for c in projection)
+    predicate_sql = predicate.to_sql()
+    trace.predicate = predicate_sql
+    trace.stream = stream
+
+    # remote files have no footer, index or cached result here, DuckDB scans them as they are
+    local = [p for p in paths if not is_remote(p)]
+    if aggregates and not local:
+        fields = ', '.join(f"{a.to_sql()} AS {quote_identifier(a.name)}" for a in aggregates)
+        start = time.perf_counter()
+        tbl = con.sql(f"SELECT {fields} FROM read_parquet({paths}) WHERE {predicate_sql}").fetch_arrow_table()
+        trace.phase('execute_s', time.perf_counter() - start)
+        for p in paths:
+            trace.file(p, 'full')
+        trace.produced(tbl.num_rows, tbl.nbytes)
+        trace.finish()
+        return con.from_arrow(tbl)
+
+    # answer from a cached result of this query or of a looser one
+    fingerprint = file_fingerprint(paths) if len(local) == len(paths) else None
+    cached = None if aggregates or fingerprint is None else result_cache.get(paths, projection, predicate, fingerprint)
+    if cached is not None:
+        tbl, cached_predicate = cached
+        res = con.from_arrow(tbl)
+        if cached_predicate.to_sql() != predicate_sql:
+            res = res.filter(_arrow_filter(predicate_sql))
+        trace.cached = True
+        for p in paths:
+            trace.file(p, 'cached')
+        trace.phase('plan_s', time.perf_counter() - plan_start)
+        if stream:
+            return _traced_reader(res.fetch_record_batch(STREAM_BATCH_ROWS), trace)
+        if trace.wanted:
+            tbl = res.fetch_arrow_table()
+            trace.produced(tbl.num_rows, tbl.nbytes)
+            res = con.from_arrow(tbl)
+        trace.finish()
+        return res
+
     res = None
+    # outlier relations, and the scans as (relation factory, callback taking the measured time)
+    outlier_results: List[DuckDBPyRelation] = []
+    scans: List[Tuple[Callable[[], DuckDBPyRelation], Callable[[float], None]]] = []
     paths_to_scan_fully = []
+    # partial aggregates of every part of the result
+    partials: List[tuple] = []
+    aggregates_sql = None if not aggregates else ', '.join(a.to_sql() for a in aggregates)
+    # columns whose indexes can prune, with the range the predicate allows
+    ranges = predicate.ranges()
+    # with an exact predicate, row groups inside all ranges match entirely
+    exact = is_exact(predicate)
+    scan_columns = None if not projection else list(dict.fromkeys(projection + sorted(predicate.columns())))
     
     # Get a new query ID for this query
     query_id = stats_manager.get_next_query_id()
+    trace.query_id = query_id
+    if ranges and local:
+        # workload history for the layout advisor
+        stats_manager.record_ranges(query_id, local, ranges)
 
     def avg_scan_time(key):
-        fm = stats_manager.stats['files'].get(key, {})
+        fm = stats_manager.get_file_stats(key) or {}
         if fm.get('scan_count', 0):
             return fm['total_scan_time'] / fm['scan_count']
         return 0.0
-    
-    def build_sma_concurrently(path: str, col: str, op: str, threshold: float):
+
+    def add_budget(key: str, amount: float):
+        stats_manager.add_budget(key, amount)
+        trace.budget(key, amount)
+
+    def add_result(rel: DuckDBPyRelation):
+        nonlocal res
+        res = rel if res is None else res.union(rel)
+
+    def add_outliers(rel: DuckDBPyRelation):
+        if aggregates:
+            partials.append(_partial_row(rel.aggregate(aggregates_sql)))
+        elif stream:
+            outlier_results.append(rel)
+        else:
+            add_result(rel)
+
+    def add_scan(make_rel: Callable[[], DuckDBPyRelation], on_done: Callable[[float], None],
+                 files: List[str], row_groups: Optional[List[int]] = None):
+        on_done = partial(_timed_scan, trace, on_done)
+        if shared is not None:
+            shared.scan(tag, files, row_groups, on_done)
+            return
+        if stream:
+            scans.append((make_rel, on_done))
+            return
+        # relations are lazy, time the materialization to get the real scan cost
+        start = time.perf_counter()
+        if aggregates:
+            # the aggregate is pushed into the scan
+            partials.append(_partial_row(make_rel().aggregate(aggregates_sql)))
+            on_done(time.perf_counter() - start)
+            return
+        tbl = make_rel().fetch_arrow_table()
+        on_done(time.perf_counter() - start)
+        add_result(con.from_arrow(tbl))
+
+    def outlier_rows(p: str, key: str, num_row_groups: int, row_groups: List[int]) -> DuckDBPyRelation:
+        # retrieve precomputed full-column outliers of the given row groups and apply the predicate
         try:
-            build_sma(path, col, op, threshold)
-        except Exception as e:
-            # print(f"Error building SMA for {path}: {e}")
-            pass
-    
-    predicate_key = lambda f: f"{os.path.basename(f)}_{column}_{op}_{threshold}"
-
-    for p in paths:
-        # print(f"Processing {p}")
-        key = predicate_key(p)
-        stats = get_sma(p, column, op, threshold)
-        if stats is None:
-            # can we afford construction cost?
-            build_cost = DEPOSIT_FACTOR * avg_scan_time(key)
-            if stats_manager.get_budget(key) >= build_cost:
-                # pay for it and run build concurrently
-                stats_manager.add_budget(key, -build_cost)
-                threading.Thread(
-                    target=build_sma_concurrently, 
-                    args=(p, column, op, threshold),
-                    daemon=False
-                ).start()
-                # Record construction
-                stats_manager.record_construction(key)
-            # fallback to full scan now
-            paths_to_scan_fully.append(p)
-            continue
-        # file skipping check
-        if (
-            (op == '>' and threshold > stats['max']) or
-            (op == '<' and threshold < stats['min'])
-        ):
-            # print(f"Skipping {p} for {column} {op} {threshold}")
-            # reinvest skip benefits - bonus is based on saved scan time
-            skip_bonus = REINVEST_FACTOR * avg_scan_time(key)
-            stats_manager.record_scan(key, 0.0, skipped=True)
-            stats_manager.add_budget(key, skip_bonus)
+            out_tbl: pa.Table = open_outliers(key)
+        except FileNotFoundError:
+            # dropped since the header was loaded, by the reaper, the quota or another process
+            logger.debug("Outliers of %s are gone, scanning row groups %s of %s", key, row_groups, p)
+            _forget_index(key)
+            return scan_row_groups(p, row_groups)
+        if len(row_groups) < num_row_groups:
+            out_tbl = out_tbl.filter(pc.is_in(out_tbl[RG_COLUMN], pa.array(row_groups, pa.int32())))
+        # DuckDB only reads the projected and filtered columns of the mapped table
+        return con.from_arrow(out_tbl.drop([RG_COLUMN])).filter(_arrow_filter(predicate_sql)).project(selected_fields)
+
+    def add_outlier_row_groups(p: str, key: str, num_row_groups: int, row_groups: List[int]):
+        if shared is not None:
+            # the shared scan may read these row groups anyway, it decides once all queries are planned
+            shared.outliers(tag, p, partial(outlier_rows, p, key, num_row_groups), row_groups)
+            return
+        add_outliers(outlier_rows(p, key, num_row_groups, row_groups))
+
+    def scan_row_groups(p: str, scan_rgs: List[int]) -> DuckDBPyRelation:
+        # read only the surviving row groups of a file
+        pf = pq.ParquetFile(p)
+        if stream:
+            batches = pf.iter_batches(STREAM_BATCH_ROWS, row_groups=scan_rgs, columns=scan_columns)
+            schema = pf.schema_arrow if scan_columns is None else pa.schema([pf.schema_arrow.field(c) for c in scan_columns])
+            src = pa.RecordBatchReader.from_batches(schema, batches)
+        else:
+            src = pf.read_row_groups(scan_rgs, columns=scan_columns)
+        return con.from_arrow(src).filter(_arrow_filter(predicate_sql)).project(selected_fields)
+
+    def partial_scan_done(keys: Dict[str, str], indexes: Dict[str, Any], deciders: set,
+                          estimates: Dict[str, float], pruned: float, duration: float):
+        for col in ranges:
+            key = keys[col]
+            if col in deciders and indexes[col] is not None:
+                # bonus for the share of row groups we did not have to read
+                bonus = reinvest_factor * avg_scan_time(key) * pruned
+                stats_manager.record_scan(key, duration, partial=True, estimated=estimates[col], query_id=query_id)
+                add_budget(key, bonus)
+            else:
+                stats_manager.record_scan(key, duration, estimated=estimates[col], query_id=query_id)
+                add_budget(key, deposit_factor * duration)
+
+    def full_scan_done(duration: float):
+        # attribute the cost to each file by the bytes it contributes to the scan
+        scanned = [p for p in paths_to_scan_fully if not is_remote(p)]
+        weights = [_scan_bytes(p, scan_columns) for p in scanned]
+        total_weight = sum(weights)
+        for p, weight in zip(scanned, weights):
+            share = weight / total_weight if total_weight else 1 / len(scanned)
+            file_time = duration * share
+            for col in ranges:
+                key = index_key(p, col)
+                stats_manager.record_scan(key, file_time, estimated=avg_scan_time(key), query_id=query_id)
+                add_budget(key, deposit_factor * file_time)
+
+    def finish():
+        # deconstruct stale indexes, unless the reaper runs on its timer
+        if not index_reaper.running:
+            index_reaper.reap(query_id)
+        stats_manager.save()
+        trace.finish()
+
+    if shared is not None:
+        tag = shared.register(selected_fields, predicate_sql, scan_columns, trace, finish,
+                              partial(_empty_result, local[0], projection, con) if local else None)
+
+    def maybe_build(p: str, col: str, key: str):
+        # can we afford construction cost?
+        build_cost = deposit_factor * avg_scan_time(key)
+        budget = stats_manager.get_budget(key)
+        # queue the build in the background, builds already in flight are not paid twice
+        funded = budget >= build_cost
+        queued = funded and build_scheduler.submit(p, col, priority=budget)
+        trace.build(p, col, key, budget, build_cost, funded, queued)
+        if queued:
+            add_budget(key, -build_cost)
+            # Record construction
+            stats_manager.record_construction(key)
+
+    if ranges or aggregates:
+        start = time.perf_counter()
+        _prefetch(local, list(dict.fromkeys(list(ranges) + [a.column for a in aggregates or [] if a.column])))
+        trace.phase('index_load_s', time.perf_counter() - start)
+    for p in (local if ranges or aggregates else []):
+        load_start = time.perf_counter()
+        keys = {col: index_key(p, col) for col in ranges}
+        # index of every constrained column, without one the footer statistics can still prune
+        indexes = {col: get_sma(p, col) for col in ranges}
+        for col in ranges:
+            if indexes[col] is not None:
+                # stats of this index change below, have the reaper check it
+                index_reaper.touch(keys[col])
+        zones = {col: (indexes[col] or get_footer_sma(p, col))['row_groups'] for col in ranges}
+        md = _file_metadata(p)
+        num_row_groups = md.num_row_groups
+        file_ranges = _coerce_ranges(ranges, md.schema.to_arrow_schema())
+        if aggregates:
+            agg_zones = {
+                agg.column: (get_sma(p, agg.column) or get_footer_sma(p, agg.column))['row_groups']
+                for agg in aggregates if agg.column is not None
+            }
+        load_s = time.perf_counter() - load_start
+        trace.phase('index_load_s', load_s)
+        indexed = [col for col in ranges if indexes[col] is not None]
+        for col, interval in file_ranges.items():
+            if (
+                interval.points is not None and indexes[col] is not None
+                and not _bloom_may_contain(keys[col], indexes[col], interval.points)
+            ):
+                # point lookup for values the file does not contain
+                zones[col] = [None] * num_row_groups
+
+        # decide per row group: skip it, serve it from the outliers of a column index or scan it
+        scan_rgs: List[int] = []
+        outlier_rgs: Dict[str, List[int]] = {}
+        deciders = set()
+        zone_rgs = 0
+        for rg in range(num_row_groups):
+            action, decider = 'scan', None
+            for col, interval in file_ranges.items():
+                a = _zone_action(zones[col][rg], interval)
+                if a == 'skip':
+                    action, decider = 'skip', col
+                    break
+                if a == 'outlier' and action == 'scan' and indexes[col] is not None:
+                    action, decider = 'outlier', col
+            if action == 'scan' and aggregates and exact:
+                num_rows = md.row_group(rg).num_rows
+                if all(_zone_covered(zones[col][rg], interval, num_rows) for col, interval in file_ranges.items()):
+                    row = _zone_aggregates(aggregates, agg_zones, rg, num_rows)
+                    if row is not None:
+                        # the whole row group matches, answer it from the zone maps
+                        partials.append(row)
+                        deciders.update(ranges)
+                        zone_rgs += 1
+                        continue
+            if action == 'scan':
+                scan_rgs.append(rg)
+            else:
+                deciders.add(decider)
+                if action == 'outlier':
+                    outlier_rgs.setdefault(decider, []).append(rg)
+        num_outlier_rgs = sum(len(rgs) for rgs in outlier_rgs.values())
+        rg_outcomes = {
+            "skip": num_row_groups - len(scan_rgs) - num_outlier_rgs - zone_rgs,
+            "outlier": num_outlier_rgs,
+            "zone": zone_rgs,
+            "scan": len(scan_rgs),
+        }
+
+        # file skipping and outlier-only check
+        if not scan_rgs:
+            action = 'outlier' if outlier_rgs else 'zone' if zone_rgs else 'skip'
+            trace.file(p, action, rg_outcomes, indexed, load_s)
+            for col, rgs in outlier_rgs.items():
+                add_outlier_row_groups(p, keys[col], num_row_groups, rgs)
+            for col in deciders:
+                if indexes[col] is None:
+                    # footer statistics cost nothing to keep
+                    continue
+                # reinvest skip benefits - bonus is based on saved scan time
+                # treat outliers like skip - bonus for using outliers instead of full scan
+                key = keys[col]
+                bonus = reinvest_factor * avg_scan_time(key)
+                stats_manager.record_scan(key, 0.0, skipped=col not in outlier_rgs, outlier=col in outlier_rgs,
+                                         query_id=query_id)
+                add_budget(key, bonus)
             continue
-        # outlier-only check
-        if (
-            (op == '>' and threshold > stats['upper_threshold']) or
-            (op == '<' and threshold < stats['lower_threshold'])
-        ):
-            # print(f"Retrieving outliers for {p} for {column} {op} {threshold}")
-            # retrieve precomputed full-column outliers table
-            out_tbl: pa.Table = stats['outliers']
-
-            # apply projection if specified
-            if projection:
-                out_tbl = out_tbl.select(projection)
-            outliers = con.from_arrow(out_tbl)
-
-            stats_manager.record_scan(key, 0.0, outlier=True)
-            # treat like skip - bonus for using outliers instead of full scan
-            out_bonus = REINVEST_FACTOR * avg_scan_time(key)
-            stats_manager.add_budget(key, out_bonus)
-            res = outliers if res is None else res.union(outliers)
+
+        # the file has to be scanned, fund the missing indexes
+        for col in ranges:
+            if indexes[col] is None:
+                maybe_build(p, col, keys[col])
+
+        if len(scan_rgs) < num_row_groups:
+            # partial scan: read only the surviving row groups, outliers serve the rest
+            trace.file(p, 'partial', rg_outcomes, indexed, load_s)
+            for col, rgs in outlier_rgs.items():
+                add_outlier_row_groups(p, keys[col], num_row_groups, rgs)
+            pruned = 1 - len(scan_rgs) / num_row_groups
+            estimates = {col: avg_scan_time(keys[col]) * (1 - pruned) for col in ranges}
+            add_scan(partial(scan_row_groups, p, scan_rgs),
+                     partial(partial_scan_done, keys, indexes, deciders, estimates, pruned),
+                     [p], scan_rgs)
             continue
-        else:
-            # Index exists but cannot skip or use outliers - penalize it
-            stats_manager.add_budget(key, -stats_manager.get_budget(key))
-            # file is not skipped, add to full scan list
-            paths_to_scan_fully.append(p)
-         
+
+        for col in ranges:
+            if indexes[col] is not None:
+                # Index exists but cannot skip or use outliers - penalize it
+                add_budget(keys[col], -stats_manager.get_budget(keys[col]))
+        # file is not skipped, add to full scan list
+        trace.file(p, 'full', rg_outcomes, indexed, load_s)
+        paths_to_scan_fully.append(p)
+
+    if not ranges and not aggregates:
+        # nothing in the predicate can be pruned with an index
+        paths_to_scan_fully = list(paths)
+        for p in paths:
+            trace.file(p, 'full')
+    else:
+        for p in paths:
+            if is_remote(p):
+                paths_to_scan_fully.append(p)
+                trace.file(p, 'full')
 
     if len(paths_to_scan_fully) > 0:
-        selected_fields = '*' if not projection else ', '.join(f'"{c}"' for c in projection)
         # scan files that cannot be skipped
-        sql = f"SELECT {selected_fields} FROM read_parquet({paths_to_scan_fully}) WHERE \"{column}\" {op} {threshold}"
+        sql = f"SELECT {selected_fields} FROM read_parquet({paths_to_scan_fully}) WHERE {predicate_sql}"
+        add_scan(lambda: con.sql(sql), full_scan_done, paths_to_scan_fully)
 
-        start = time.perf_counter()
-        rel = con.sql(sql)
-        duration = time.perf_counter() - start
+    # scans run so far were timed as execution
+    trace.phase('plan_s', time.perf_counter() - plan_start - trace.phases['execute_s'])
 
-        for p in paths_to_scan_fully:
-            # print(f"Stat updated for {p}")
-            key = predicate_key(p)
-            avg_scan_time = duration / len(paths_to_scan_fully)
-            stats_manager.record_scan(key, avg_scan_time)
-            stats_manager.add_budget(key, DEPOSIT_FACTOR * avg_scan_time)
+    if shared is not None:
+        return None
 
-        res = rel if res is None else res.union(rel)
+    if stream:
+        return _stream_results(paths, projection, con, outlier_results, scans, finish, trace)
 
-    # deconstruct stale indexes
-    # delete any .sma with B_key<0 or zero skip/outlier in last N scans
-    for index, file_stats in stats_manager.stats['files'].items():
-        budget = stats_manager.get_budget(index)
-        should_deconstruct = False
-        
-        # Check if budget is negative
-        if budget < 0:
-            # print(f"Index {index} has negative budget ({budget}), marking for deconstruction")
-            should_deconstruct = True
-        
-        # Check if index hasn't been useful recently
-        elif (file_stats['scan_count'] >= LAST_N_SCANS_TO_KEEP and 
-            (file_stats['skipped_count'] == 0 and file_stats['outlier_retrieved_count'] == 0)):
-            # print(f"Index {index} hasn't provided benefits in {LAST_N_SCANS_TO_KEEP} scans, marking for deconstruction")
-            should_deconstruct = True
-            # stats_manager.add_budget(index, -budget)
-            
-        # Check if index hasn't been used recently
-        elif (query_id - file_stats['last_sma_used_query_id'] > LAST_N_SCANS_TO_KEEP):
-            # print(f"Index {index} hasn't been used in {LAST_N_SCANS_TO_KEEP} queries, marking for deconstruction")
-            should_deconstruct = True
-            
-        if should_deconstruct:
-            sma_file = os.path.join(BASE_FOLDER, f"{index}.sma")    
-            if os.path.exists(sma_file):
-                # print(f"Deleting stale index {sma_file}")
-                os.remove(sma_file)
-                stats_manager.record_deconstruction(index)
-    
-    stats_manager.save()
+    if aggregates:
+        tbl = _combine_aggregates(local[0], aggregates, partials)
+        trace.produced(tbl.num_rows, tbl.nbytes)
+        finish()
+        return con.from_arrow(tbl)
+
+    if res is None and local:
+        # every file was skipped
+        res = _empty_result(local[0], projection, con)
+
+    cacheable = fingerprint is not None and result_cache.lru.max_bytes > 0
+    if res is not None and (cacheable or trace.wanted):
+        start = time.perf_counter()
+        tbl = res.fetch_arrow_table()
+        trace.phase('execute_s', time.perf_counter() - start)
+        trace.produced(tbl.num_rows, tbl.nbytes)
+        if cacheable:
+            result_cache.put(paths, projection, predicate, fingerprint, tbl)
+        res = con.from_arrow(tbl)
+
+    finish()
     return res
@@ -0,0 +1,406 @@
+"""
+Data layout advice. Skipping only pays off if row groups have narrow,
+non-overlapping min/max ranges on the filtered columns. The advisor replays
+the range predicates recorded in the stats (StatsManager.record_ranges)
+against the row groups of a dataset, then against the same data sorted or
+Z-ordered on the most filtered columns, and rewrite() produces the layout:
+
+    quackdb layout advise 'data/*.parquet' [--json]
+    quackdb layout rewrite 'data/*.parquet' out/ [--keys a,b] [--method sort|zorder]
+                           [--row-group-size N] [--files N]
+"""
+import os, sys, json, math, argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .core import index_key, get_footer_sma, _coerce_ranges, _file_metadata, _timestamp_value, _zone_action
+from .paths import expand_paths
+from .stats import stats_manager
+from .utils import Interval, quote_identifier, sql_literal
+
+# sort keys considered, the workload columns that would gain most first
+MAX_KEYS = 2
+# bits per key of a Z-order value
+ZORDER_BITS = 16
+# candidate row group sizes are the current one divided by these
+ROW_GROUP_DIVISORS = (8, 4, 2, 1)
+MIN_ROW_GROUP_ROWS = 16_384
+# the largest row group size whose skip rate is within this of the best is recommended
+ROW_GROUP_TOLERANCE = 0.02
+
+METHODS = ('sort', 'zorder')
+
+# a zone per filtered column of a row group ({min, max, ...}, None if only nulls) and its rows
+Zones = List[Tuple[int, Dict[str, Optional[Dict[str, Any]]]]]
+
+
+def _related(a: str, b: str) -> bool:
+    # one folder holds the other
+    return a == b or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+
+def workload_history(paths: List[str]) -> List[Dict[str, Interval]]:
+    """
+    The recorded range predicates of queries on the folders of `paths`, with
+    their literals cast to the column types; columns the files do not have are
+    dropped.
+    """
+    folder = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    schema = _file_metadata(paths[0]).schema.to_arrow_schema()
+    queries = []
+    for row in stats_manager.workload():
+        if not _related(row["folder"], folder):
+            continue
+        ranges = {col: i for col, i in row["ranges"].items() if col in schema.names}
+        if ranges:
+            queries.append(_coerce_ranges(ranges, schema))
+    return queries
+
+
+def _skip_rate(zones: Zones, queries: List[Dict[str, Interval]], only: Optional[str] = None) -> Optional[float]:
+    """
+    Fraction of the rows in row groups the zone maps skip, averaged over the
+    queries (those filtering `only`, counting its range alone, if given).
+    """
+    total = sum(rows for rows, _ in zones)
+    rates = []
+    for ranges in queries:
+        if only is not None:
+            if only not in ranges:
+                continue
+            ranges = {only: ranges[only]}
+        skipped = sum(
+            rows for rows, rg in zones
+            if any(_zone_action(rg[col], interval) == 'skip' for col, interval in ranges.items())
+        )
+        rates.append(skipped / total if total else 0.0)
+    return sum(rates) / len(rates) if rates else None
+
+
+def _rates(zones: Zones, queries: List[Dict[str, Interval]], columns: List[str]) -> Dict[str, Any]:
+    return {
+        "skip_rate": _skip_rate(zones, queries),
+        "per_column": {col: _skip_rate(zones, queries, col) for col in columns},
+    }
+
+
+def current_zones(paths: List[str], columns: List[str]) -> Zones:
+    """The row groups of `paths` as they are, from the footer statistics."""
+    zones: Zones = []
+    for p in paths:
+        md = _file_metadata(p)
+        footers = {col: get_footer_sma(p, col)["row_groups"] for col in columns}
+        for rg in range(md.num_row_groups):
+            zones.append((md.row_group(rg).num_rows, {col: footers[col][rg] for col in columns}))
+    return zones
+
+
+def _layout_sql(paths: List[str], keys: List[str], method: str) -> Tuple[str, str, List[str]]:
+    """FROM clause and ORDER BY expression of the data laid out on `keys`, and the helper columns to drop."""
+    src = f"read_parquet([{', '.join(sql_literal(p) for p in paths)}])"
+    if method == 'sort':
+        return src, ', '.join(quote_identifier(k) for k in keys), []
+    if method != 'zorder':
+        raise ValueError(f"Unknown layout method {method}, expected one of {', '.join(METHODS)}")
+    # interleave the bits of each key's rank bucket
+    bits = min(ZORDER_BITS, 63 // len(keys))
+    helpers = [f"__quackdb_z{i}" for i in range(len(keys))]
+    ranks = ', '.join(
+        f"ntile({1 << bits}) OVER (ORDER BY {quote_identifier(k)}) - 1 AS {h}" for k, h in zip(keys, helpers)
+    )
+    order = ' | '.join(
+        f"((({h} >> {b}) & 1) << {b * len(keys) + i})" for b in range(bits) for i, h in enumerate(helpers)
+    )
+    return f"(SELECT *, {ranks} FROM {src})", order, helpers
+
+
+def _as_values(col: pa.ChunkedArray, round_up: bool = False) -> List[Any]:
+    # timestamps through their integers, converting nanoseconds or time zones otherwise needs pandas or pytz
+    if pa.types.is_timestamp(col.type):
+        return [None if v is None else _timestamp_value(v, col.type, round_up) for v in col.cast(pa.int64()).to_pylist()]
+    return col.to_pylist()
+
+
+def ordered_values(con: duckdb.DuckDBPyConnection, paths: List[str], columns: List[str],
+                   keys: List[str], method: str) -> pa.Table:
+    """`columns` of `paths` with their position `__pos` once laid out on `keys` with `method`."""
+    src, order, _ = _layout_sql(paths, keys, method)
+    cols = ', '.join(quote_identifier(c) for c in columns)
+    return con.sql(f"SELECT {cols}, row_number() OVER (ORDER BY {order}) - 1 AS __pos FROM {src}").fetch_arrow_table()
+
+
+def _footer_prunes(typ: pa.DataType) -> bool:
+    # footer min/max of floats leave out NaN, get_footer_sma() never prunes with them
+    return not pa.types.is_floating(typ)
+
+
+def projected_zones(con: duckdb.DuckDBPyConnection, ordered: pa.Table, columns: List[str], row_group_size: int) -> Zones:
+    """
+    The row groups of ordered_values() written in row groups of `row_group_size`
+    rows, with the zones get_footer_sma() will read from them.
+    """
+    cols = [quote_identifier(c) for c in columns]
+    aggs = ', '.join(f"min({c}), max({c}), count({c})" for c in cols)
+    con.register('__quackdb_ordered', ordered)
+    try:
+        tbl = con.sql(
+            f"SELECT __pos // {int(row_group_size)} AS __rg, count(*), {aggs} "
+            f"FROM __quackdb_ordered GROUP BY __rg ORDER BY __rg"
+        ).fetch_arrow_table()
+    finally:
+        con.unregister('__quackdb_ordered')
+    rows = tbl.column(1).to_pylist()
+    per_column = {}
+    for i, col in enumerate(columns):
+        mins = _as_values(tbl.column(2 + 3 * i))
+        maxs = _as_values(tbl.column(3 + 3 * i), round_up=True)
+        counts = tbl.column(4 + 3 * i).to_pylist()
+        flags = {} if _footer_prunes(ordered.schema.field(col).type) else {"nan": True}
+        per_column[col] = [
+            None if n == 0 else dict({"min": lo, "max": hi, "lower_threshold": lo, "upper_threshold": hi}, **flags)
+            for lo, hi, n in zip(mins, maxs, counts)
+        ]
+    return [(n, {col: per_column[col][rg] for col in columns}) for rg, n in enumerate(rows)]
+
+
+def _full_scans(paths: List[str], column: str) -> Dict[str, int]:
+    """Per file, how often queries filtering `column` had to scan it completely."""
+    scans = {}
+    for p in paths:
+        fm = stats_manager.get_file_stats(index_key(p, column)) or {}
+        full = (fm.get('scan_count', 0) - fm.get('skipped_count', 0)
+                - fm.get('outlier_retrieved_count', 0) - fm.get('partial_scan_count', 0))
+        if full > 0:
+            scans[p] = full
+    return scans
+
+
+def _row_counts(paths: List[str]) -> Tuple[int, int]:
+    rows = row_groups = 0
+    for p in paths:
+        md = _file_metadata(p)
+        rows += md.num_rows
+        row_groups += md.num_row_groups
+    return rows, row_groups
+
+
+def advise(
+    patterns: List[str],
+    keys: Optional[List[str]] = None,
+    methods: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Recommend a layout of the files matching `patterns` for the recorded
+    workload. Columns are ranked by how many queries filter them times the
+    share of rows those queries still read; the top MAX_KEYS (or `keys`),
+    leaving out floats whose footer statistics do not prune, are
+    tried as sort keys, and together as Z-order keys, at row group sizes down
+    to an eighth of the current one. The report has the current skip rate
+    (share of rows skipped by the zone maps, averaged over the queries), the
+    projected one of every candidate and the recommendation, the largest row
+    group size within ROW_GROUP_TOLERANCE of the best candidate.
+    """
+    paths = expand_paths(patterns)
+    if not paths:
+        raise ValueError(f"No Parquet files match {patterns}")
+    queries = workload_history(paths)
+    if not queries:
+        raise ValueError(f"No recorded range queries on {patterns}")
+    columns = sorted({col for ranges in queries for col in ranges})
+    rows, row_groups = _row_counts(paths)
+    row_group_size = max(1, rows // max(row_groups, 1))
+
+    current = _rates(current_zones(paths, columns), queries, columns)
+    ranked = []
+    for col in columns:
+        n = sum(1 for ranges in queries if col in ranges)
+        full = _full_scans(paths, col)
+        ranked.append({
+            "column": col,
+            "queries": n,
+            "skip_rate": current["per_column"][col],
+            "full_scans": sum(full.values()),
+            "most_scanned": sorted(full, key=full.get, reverse=True)[:5],
+        })
+    ranked.sort(key=lambda c: c["queries"] * (1 - c["skip_rate"]), reverse=True)
+
+    # sorting on a column whose footer statistics never prune gains nothing
+    schema = _file_metadata(paths[0]).schema.to_arrow_schema()
+    prunable = [c["column"] for c in ranked if _footer_prunes(schema.field(c["column"]).type)]
+    keys = keys or (prunable or [c["column"] for c in ranked])[:MAX_KEYS]
+    layouts = [(keys[:1], 'sort')]
+    if len(keys) > 1:
+        layouts += [(keys, 'sort'), (keys, 'zorder')]
+    layouts = [(k, m) for k, m in layouts if methods is None or m in methods]
+    sizes = sorted({max(MIN_ROW_GROUP_ROWS, row_group_size // d) for d in ROW_GROUP_DIVISORS} | {row_group_size})
+
+    con = duckdb.connect()
+    candidates = []
+    for layout_keys, method in layouts:
+        # one sort per layout, the row group sizes only regroup it
+        ordered = ordered_values(con, paths, columns, layout_keys, method)
+        candidates += [
+            dict(keys=layout_keys, method=method, row_group_size=size,
+                 **_rates(projected_zones(con, ordered, columns, size), queries, columns))
+            for size in sizes
+        ]
+    con.close()
+    candidates.sort(key=lambda o: (-o["skip_rate"], -o["row_group_size"]))
+    top = candidates[0]["skip_rate"]
+    # larger row groups compress better and keep footers small
+    recommendation = max(
+        (o for o in candidates if o["skip_rate"] >= top - ROW_GROUP_TOLERANCE), key=lambda o: o["row_group_size"]
+    )
+    return {
+        "files": len(paths),
+        "rows": rows,
+        "row_group_size": row_group_size,
+        "queries": len(queries),
+        "columns": ranked,
+        "current": current,
+        "candidates": candidates,
+        "recommendation": dict(recommendation, improvement=recommendation["skip_rate"] - current["skip_rate"]),
+    }
+
+
+def rewrite(
+    patterns: List[str],
+    out_dir: str,
+    keys: Optional[List[str]] = None,
+    method: Optional[str] = None,
+    row_group_size: Optional[int] = None,
+    files: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Write the files matching `patterns` to new Parquet files in `out_dir`,
+    sorted or Z-ordered on `keys` with row groups of `row_group_size` rows,
+    split into `files` files (default: as many as there are now). Settings
+    not given are taken from advise(). The input files are left alone. With
+    a workload history the report has the skip rate before and after, the
+    latter measured on the written files.
+    """
+    paths = expand_paths(patterns)
+    if not paths:
+        raise ValueError(f"No Parquet files match {patterns}")
+    out_dir = os.path.abspath(os.path.expanduser(out_dir))
+    if any(_related(os.path.dirname(os.path.abspath(p)), out_dir) for p in paths):
+        raise ValueError(f"{out_dir} overlaps the input folders, write the new layout elsewhere")
+    os.makedirs(out_dir, exist_ok=True)
+    if any(name.endswith('.parquet') for name in os.listdir(out_dir)):
+        raise ValueError(f"{out_dir} already holds Parquet files")
+
+    if keys is None:
+        recommended = advise(patterns)["recommendation"]
+        keys = recommended["keys"]
+        method = method or recommended["method"]
+        row_group_size = row_group_size or recommended["row_group_size"]
+    rows, row_groups = _row_counts(paths)
+    method = method or 'sort'
+    row_group_size = row_group_size or max(1, rows // max(row_groups, 1))
+    files = files or len(paths)
+    # whole row groups per file, so the files split the order at row group boundaries
+    rows_per_file = max(1, math.ceil(rows / files / row_group_size)) * row_group_size
+
+    src, order, helpers = _layout_sql(paths, keys, method)
+    select = f"* EXCLUDE ({', '.join(helpers)})" if helpers else "*"
+    con = duckdb.connect()
+    reader = con.sql(f"SELECT {select} FROM {src} ORDER BY {order}").fetch_record_batch(row_group_size)
+    written: List[str] = []
+    writer, in_file, pending = None, 0, []
+
+    def flush(table: pa.Table):
+        nonlocal writer, in_file
+        if writer is None or in_file >= rows_per_file:
+            if writer is not None:
+                writer.close()
+            written.append(os.path.join(out_dir, f"part-{len(written):05d}.parquet"))
+            writer, in_file = pq.ParquetWriter(written[-1], reader.schema), 0
+        writer.write_table(table, row_group_size=row_group_size)
+        in_file += table.num_rows
+
+    # regroup the batches into row groups of exactly row_group_size rows
+    for batch in reader:
+        pending.append(batch)
+        buffered = pa.Table.from_batches(pending)
+        while buffered.num_rows >= row_group_size:
+            flush(buffered.slice(0, row_group_size))
+            buffered = buffered.slice(row_group_size)
+        pending = buffered.to_batches()
+    leftover = pa.Table.from_batches(pending, schema=reader.schema)
+    if leftover.num_rows or not written:
+        flush(leftover)
+    writer.close()
+    con.close()
+
+    report = {
+        "files": written,
+        "rows": rows,
+        "keys": keys,
+        "method": method,
+        "row_group_size": row_group_size,
+    }
+    queries = workload_history(paths)
+    if queries:
+        columns = sorted({col for ranges in queries for col in ranges})
+        report["before"] = _rates(current_zones(paths, columns), queries, columns)
+        report["after"] = _rates(current_zones(written, columns), queries, columns)
+    return report
+
+
+def _print_rates(label: str, rates: Dict[str, Any]):
+    cols = ", ".join(f"{c} {r:.1%}" for c, r in rates["per_column"].items() if r is not None)
+    print(f"{label:<10} skip rate {rates['skip_rate']:.1%}  ({cols})")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='quackdb layout', description="Advise on and rewrite the data layout.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    adv = commands.add_parser('advise', help="recommend sort keys and row group sizes for the recorded workload")
+    adv.add_argument('patterns', nargs='+', help="Parquet files, globs or directories")
+    adv.add_argument('--keys', help="comma separated sort keys to evaluate (default: from the workload)")
+    adv.add_argument('--json', action='store_true')
+    rw = commands.add_parser('rewrite', help="write the data in a new layout")
+    rw.add_argument('patterns', nargs='+')
+    rw.add_argument('out_dir')
+    rw.add_argument('--keys', help="comma separated (default: the recommendation)")
+    rw.add_argument('--method', choices=METHODS)
+    rw.add_argument('--row-group-size', type=int)
+    rw.add_argument('--files', type=int, help="output files (default: as many as the input)")
+    rw.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+    keys = None if args.keys is None else args.keys.split(',')
+
+    if args.command == 'advise':
+        report = advise(args.patterns, keys)
+        if args.json:
+            json.dump(report, sys.stdout, indent=2, default=str)
+            print()
+            return 0
+        print(f"{report['files']} files, {report['rows']} rows in row groups of ~{report['row_group_size']}, "
+              f"{report['queries']} recorded queries")
+        for c in report["columns"]:
+            print(f"  {c['column']:<20} {c['queries']} queries, skip rate {c['skip_rate']:.1%}, "
+                  f"{c['full_scans']} full file scans")
+        _print_rates("current", report["current"])
+        for o in report["candidates"]:
+            print(f"  {o['method']:<6} on {','.join(o['keys']):<30} row groups of {o['row_group_size']:<8} "
+                  f"skip rate {o['skip_rate']:.1%}")
+        rec = report["recommendation"]
+        print(f"recommended: {rec['method']} on {','.join(rec['keys'])}, row groups of {rec['row_group_size']} "
+              f"({rec['improvement']:+.1%} rows skipped)")
+        return 0
+
+    report = rewrite(args.patterns, args.out_dir, keys, args.method, args.row_group_size, args.files)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+        return 0
+    print(f"wrote {len(report['files'])} files, {report['rows']} rows, {report['method']} on "
+          f"{','.join(report['keys'])}, row groups of {report['row_group_size']}")
+    if "before" in report:
+        _print_rates("before", report["before"])
+        _print_rates("after", report["after"])
+    return 0
@@ -0,0 +1,46 @@
+import os, glob, time
+from typing import List
+
+from .cache import LRUCache
+
+# seconds an expanded glob or directory listing is reused
+PATH_CACHE_TTL = 30.0
+
+# expansions by pattern list, sized by the number of paths they hold
+_path_cache = LRUCache(16 * 1024 * 1024)
+
+
+def is_remote(path: str) -> bool:
+    """True for URLs (https://, s3://, ...), which only DuckDB reads."""
+    return '://' in path
+
+
+def _expand(pattern: str) -> List[str]:
+    if is_remote(pattern):
+        # remote files are passed to DuckDB as they are
+        return [pattern]
+    if os.path.isdir(pattern):
+        # every Parquet file below the directory, e.g. a hive partitioned dataset
+        return sorted(
+            os.path.join(root, f)
+            for root, _, files in os.walk(pattern)
+            for f in files if f.endswith('.parquet')
+        )
+    if any(c in pattern for c in '*?['):
+        return sorted(glob.glob(pattern, recursive=True))
+    return [pattern]
+
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    """
+    Expand globs (`*`, `?`, `[...]`, `**` for any depth) and directories into
+    the Parquet files they match, keeping plain paths as they are.
+    Expansions are cached for PATH_CACHE_TTL seconds.
+    """
+    key = tuple(patterns)
+    cached = _path_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < PATH_CACHE_TTL:
+        return cached[1]
+    paths = list(dict.fromkeys(p for pattern in patterns for p in _expand(pattern)))
+    _path_cache.put(key, (time.monotonic(), paths), 128 + sum(len(p) + 64 for p in paths))
+    return paths
@@ -0,0 +1,156 @@
+import os, json, time
+from threading import RLock
+from typing import Any, Callable, Dict, List, Optional
+
+from . import storage
+from .stats import StatsManager
+
+
+def parse_size(value: Optional[str]) -> Optional[int]:
+    """Parse a byte size like '500000', '512MB' or '2GiB'. None or '' means no limit."""
+    if value is None or not value.strip():
+        return None
+    value = value.strip().upper().replace('IB', 'B')
+    units = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4, 'B': 1}
+    for suffix, factor in units.items():
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(value)
+
+
+# byte quota of BASE_FOLDER, None for no limit
+SMA_QUOTA_BYTES = parse_size(os.environ.get('QUACKDB_SMA_QUOTA'))
+
+# quota evictions are appended here, one JSON object per line
+EVICTIONS_FILE = 'evictions.jsonl'
+
+
+class DiskQuota:
+    """
+    Keeps the indexes in BASE_FOLDER under a byte quota.
+
+    Before a new index is written, make_room() evicts the indexes that earn the
+    least per byte they occupy: lowest budget per byte first, and among equal
+    scores the one used longest ago. Evictions are logged to EVICTIONS_FILE so
+    that processes sharing the folder see each other's evictions on sync().
+    `on_evict(key)` is called for every index evicted or seen evicted.
+    """
+    def __init__(
+        self,
+        stats: StatsManager,
+        quota_bytes: Optional[int] = SMA_QUOTA_BYTES,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.stats = stats
+        self.quota_bytes = quota_bytes
+        self.on_evict = on_evict
+        self.lock = RLock()
+        self.evictions = 0
+        self.bytes_evicted = 0
+        path = self._log_path()
+        self._log_offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _log_path(self) -> str:
+        return os.path.join(storage.BASE_FOLDER, EVICTIONS_FILE)
+
+    def set_quota(self, quota_bytes: Optional[int]):
+        """Change the quota, None removes it. Existing indexes are only evicted by the next build."""
+        with self.lock:
+            self.quota_bytes = quota_bytes
+
+    def usage(self) -> Dict[str, Any]:
+        """Current size of the index store."""
+        sizes = storage.index_sizes()
+        used = sum(sizes.values())
+        return {
+            "bytes": used,
+            "quota": self.quota_bytes,
+            "free": None if self.quota_bytes is None else max(self.quota_bytes - used, 0),
+            "indexes": len(sizes),
+            "evictions": self.evictions,
+            "bytes_evicted": self.bytes_evicted,
+        }
+
+    def score(self, key: str, nbytes: int) -> float:
+        """Benefit per byte of an index, its budget is what skipping with it has saved."""
+        return self.stats.get_budget(key) / max(nbytes, 1)
+
+    def make_room(self, key: str, nbytes: int) -> bool:
+        """
+        Evict indexes until an index of `nbytes` for `key` fits, replacing any
+        existing index of `key`. Returns False if it is larger than the quota.
+        """
+        with self.lock:
+            if self.quota_bytes is None:
+                return True
+            if nbytes > self.quota_bytes:
+                return False
+            sizes = storage.index_sizes()
+            sizes.pop(key, None)
+            excess = sum(sizes.values()) + nbytes - self.quota_bytes
+            if excess <= 0:
+                return True
+
+            def rank(k: str):
+                fm = self.stats.get_file_stats(k) or {}
+                return self.score(k, sizes[k]), fm.get('last_sma_used_query_id', 0)
+
+            for victim in sorted(sizes, key=rank):
+                if excess <= 0:
+                    break
+                excess -= self.evict(victim, sizes[victim])
+            return excess <= 0
+
+    def evict(self, key: str, nbytes: Optional[int] = None, reason: str = 'quota') -> int:
+        """Drop an index, log the eviction and return the bytes freed."""
+        with self.lock:
+            budget = self.stats.get_budget(key)
+            freed = storage.drop_index(key)
+            if not freed:
+                return 0
+            self.stats.record_deconstruction(key)
+            self.evictions += 1
+            self.bytes_evicted += freed
+            entry = {
+                "time": time.time(),
+                "key": key,
+                "bytes": freed,
+                "budget": budget,
+                "score": budget / max(nbytes or freed, 1),
+                "reason": reason,
+                "pid": os.getpid(),
+            }
+            with open(self._log_path(), 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+        if self.on_evict is not None:
+            self.on_evict(key)
+        return freed
+
+    def sync(self) -> List[str]:
+        """Notify `on_evict` of evictions logged since the last sync, e.g. by build processes."""
+        with self.lock:
+            path = self._log_path()
+            if not os.path.exists(path):
+                return []
+            with open(path, 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read()
+            # leave a line that is still being written for the next sync
+            data = data[:data.rfind(b"\n") + 1]
+            self._log_offset += len(data)
+        entries = [json.loads(line) for line in data.splitlines() if line.strip()]
+        # evictions of this process were already reported by evict()
+        keys = [e['key'] for e in entries if e.get('pid') != os.getpid()]
+        if self.on_evict is not None:
+            for key in keys:
+                self.on_evict(key)
+        return keys
+
+    def history(self, limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+        """The last `limit` evictions, oldest first (all of them if limit is None)."""
+        path = self._log_path()
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return entries if limit is None else entries[-limit:]
@@ -0,0 +1,163 @@
+import heapq
+import logging
+import threading
+from threading import RLock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .stats import StatsManager
+
+logger = logging.getLogger(__name__)
+
+
+class IndexReaper:
+    """
+    Deconstructs stale indexes incrementally instead of sweeping every index
+    after every query.
+
+    Tracked indexes sit in a heap ordered by the query id at which they expire
+    for lack of use (last use + `keep_last_n`), then by budget. reap() only
+    checks the indexes touched since the last call and the expired heads of
+    the heap. An index is deconstructed if its budget is negative, if it has
+    not skipped or pruned anything in `keep_last_n` scans, or if it has not
+    been used in the last `keep_last_n` queries.
+
+    `drop_fn(key)` deletes an index, records its deconstruction in the stats
+    and returns the bytes freed, `list_fn()`
+    lists the indexes already on disk and is called on the first reap().
+    """
+    def __init__(
+        self,
+        stats: StatsManager,
+        drop_fn: Callable[[str], int],
+        keep_last_n: int,
+        list_fn: Optional[Callable[[], Iterable[str]]] = None,
+    ):
+        self.stats = stats
+        self.drop_fn = drop_fn
+        self.keep_last_n = keep_last_n
+        self.list_fn = list_fn
+        self.lock = RLock()
+        self._heap: List[Tuple[int, float, str]] = []
+        self._expiry: Dict[str, int] = {}
+        self._touched: Set[str] = set()
+        self._timer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reclaimed = 0
+        self.bytes_freed = 0
+
+    @property
+    def running(self) -> bool:
+        """True while reap() runs on the background timer."""
+        return self._timer is not None
+
+    def track(self, key: str):
+        """Start tracking an index, e.g. after it was built."""
+        with self.lock:
+            self._push(key)
+
+    def touch(self, key: str):
+        """Mark an index whose stats changed, it is checked on the next reap()."""
+        with self.lock:
+            self._touched.add(key)
+
+    def untrack(self, key: str):
+        """Forget an index that was removed by other means."""
+        with self.lock:
+            self._expiry.pop(key, None)
+            self._touched.discard(key)
+
+    def should_deconstruct(self, key: str, file_stats: Dict[str, Any], query_id: int) -> bool:
+        # Check if budget is negative
+        if self.stats.get_budget(key) < 0:
+            return True
+        # Check if index hasn't been useful recently
+        if (file_stats['scan_count'] >= self.keep_last_n and
+                file_stats['skipped_count'] == 0 and file_stats['outlier_retrieved_count'] == 0
+                and file_stats['partial_scan_count'] == 0):
+            return True
+        # Check if index hasn't been used recently
+        return query_id - file_stats['last_sma_used_query_id'] > self.keep_last_n
+
+    def reap(self, query_id: Optional[int] = None) -> Dict[str, int]:
+        """
+        Check the touched and expired indexes and deconstruct the stale ones.
+        Returns the number of indexes reclaimed and the bytes freed.
+        """
+        with self.lock:
+            if self.list_fn is not None:
+                for key in self.list_fn():
+                    if key not in self._expiry:
+                        self._push(key)
+                self.list_fn = None
+            if query_id is None:
+                # the id of the last query that ran
+                query_id = self.stats.current_query_id() - 1
+
+            candidates = self._touched
+            self._touched = set()
+            while self._heap and self._heap[0][0] < query_id:
+                expiry, _, key = heapq.heappop(self._heap)
+                # entries pushed before the last use are stale
+                if self._expiry.get(key) == expiry:
+                    candidates.add(key)
+
+            reclaimed = freed = 0
+            for key in candidates:
+                file_stats = self.stats.get_file_stats(key)
+                if file_stats is None:
+                    self._expiry.pop(key, None)
+                    continue
+                if not self.should_deconstruct(key, file_stats, query_id):
+                    self._push(key, file_stats)
+                    continue
+                self._expiry.pop(key, None)
+                size = self.drop_fn(key)
+                if size:
+                    logger.debug("Deconstructed stale index %s, %d bytes freed", key, size)
+                    reclaimed += 1
+                    freed += size
+            self.reclaimed += reclaimed
+            self.bytes_freed += freed
+            return {"reclaimed": reclaimed, "bytes_freed": freed}
+
+    def start(self, interval: float):
+        """Run reap() every `interval` seconds on a daemon thread, off the query path."""
+        with self.lock:
+            if self._timer is not None:
+                return
+            self._stop.clear()
+            self._timer = threading.Thread(target=self._run, args=(interval,), name='quackdb-reaper', daemon=True)
+            self._timer.start()
+
+    def stop(self):
+        """Stop the background timer, reap() runs after each query again."""
+        timer = self._timer
+        if timer is None:
+            return
+        self._stop.set()
+        timer.join()
+        self._timer = None
+
+    def info(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "tracked": len(self._expiry),
+                "pending": len(self._touched),
+                "reclaimed": self.reclaimed,
+                "bytes_freed": self.bytes_freed,
+            }
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.reap()
+            except Exception:
+                # keep the timer alive, the next run retries
+                logger.exception("Background index reaping failed")
+
+    def _push(self, key: str, file_stats: Optional[Dict[str, Any]] = None):
+        if file_stats is None:
+            file_stats = self.stats.get_file_stats(key) or {}
+        expiry = file_stats.get('last_sma_used_query_id', 0) + self.keep_last_n
+        self._expiry[key] = expiry
+        heapq.heappush(self._heap, (expiry, self.stats.get_budget(key), key))
@@ -0,0 +1,170 @@
+import os, heapq, itertools
+import logging
+import multiprocessing
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from threading import Condition
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# default number of concurrent index builds
+BUILD_WORKERS = 2
+# 'thread' or 'process'; process pools sidestep the GIL for CPU-bound builds
+BUILD_EXECUTOR = os.environ.get('QUACKDB_BUILD_EXECUTOR', 'thread')
+
+BuildKey = Tuple[str, str]
+
+logger = logging.getLogger(__name__)
+
+
+class BuildScheduler:
+    """
+    Runs index builds on a bounded worker pool.
+
+    Requests for a (path, column) that is already queued or running are merged,
+    queued builds start in order of priority (the budget accumulated for the
+    index), and `wait_for_builds()` blocks until the queue has drained.
+    `on_done(path, column)` is called in the submitting process after every build.
+    """
+    def __init__(
+        self,
+        build_fn: Callable[[str, str], object],
+        max_workers: int = BUILD_WORKERS,
+        executor: str = BUILD_EXECUTOR,
+        on_done: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.build_fn = build_fn
+        self.on_done = on_done
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self._cond = Condition()
+        self._heap: List[Tuple[float, int, BuildKey]] = []
+        self._pending: Dict[BuildKey, Tuple[float, int]] = {}
+        self._running: Set[BuildKey] = set()
+        self._seq = itertools.count()
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+
+    def configure(self, max_workers: Optional[int] = None, executor: Optional[str] = None):
+        """Change the pool size or kind. Running builds finish on the old pool."""
+        if executor is not None and executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor kind: {executor}")
+        with self._cond:
+            old = self._executor
+            if max_workers is not None:
+                self.max_workers = max_workers
+            if executor is not None:
+                self.executor_kind = executor
+            self._executor = None
+            self._closed = False
+        if old is not None:
+            old.shutdown(wait=False)
+        with self._cond:
+            self._dispatch()
+
+    def submit(self, path: str, column: str, priority: float = 0.0) -> bool:
+        """
+        Queue a build. Returns False if the same build is already queued or
+        running; a queued duplicate is bumped to the higher priority.
+        """
+        key = (path, column)
+        with self._cond:
+            if self._closed or key in self._running:
+                return False
+            if key in self._pending:
+                if priority > self._pending[key][0]:
+                    self._push(key, priority)
+                return False
+            self._push(key, priority)
+            self._dispatch()
+            return True
+
+    def is_scheduled(self, path: str, column: str) -> bool:
+        with self._cond:
+            key = (path, column)
+            return key in self._pending or key in self._running
+
+    def wait_for_builds(self, timeout: Optional[float] = None) -> bool:
+        """Block until no builds are queued or running. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def shutdown(self, wait: bool = True):
+        """Drop queued builds and stop the pool, waiting for running builds if `wait`."""
+        with self._cond:
+            self._closed = True
+            self._heap.clear()
+            self._pending.clear()
+            executor, self._executor = self._executor, None
+            self._cond.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def info(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "queued": len(self._pending),
+                "running": len(self._running),
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_workers": self.max_workers,
+            }
+
+    def _push(self, key: BuildKey, priority: float):
+        seq = next(self._seq)
+        self._pending[key] = (priority, seq)
+        heapq.heappush(self._heap, (-priority, seq, key))
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                # spawned, SQLite connections of the stats backend must not cross a fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='quackdb-build'
+                )
+        return self._executor
+
+    def _dispatch(self):
+        # called with the lock held
+        while self._heap and len(self._running) < self.max_workers and not self._closed:
+            _, seq, key = heapq.heappop(self._heap)
+            if self._pending.get(key, (None, None))[1] != seq:
+                # superseded by a higher priority entry
+                continue
+            del self._pending[key]
+            self._running.add(key)
+            try:
+                future = self._get_executor().submit(self.build_fn, *key)
+            except RuntimeError:
+                # the pool was shut down, e.g. by the interpreter exiting: drop what is queued
+                self._running.discard(key)
+                self._closed = True
+                self._heap.clear()
+                self._pending.clear()
+                self._cond.notify_all()
+                return
+            future.add_done_callback(lambda f, key=key: self._finished(key, f))
+
+    def _finished(self, key: BuildKey, future: Future):
+        failed = future.cancelled() or future.exception() is not None
+        if failed and not future.cancelled():
+            error = future.exception()
+            logger.error("Index build of %s failed", key, exc_info=(type(error), error, error.__traceback__))
+        if self.on_done is not None:
+            try:
+                self.on_done(*key)
+            except Exception:
+                logger.exception("Build callback for %s failed", key)
+        with self._cond:
+            self._running.discard(key)
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self._dispatch()
+            self._cond.notify_all()
+
@@ -0,0 +1,183 @@
+import os
+import asyncio
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import duckdb
+import pyarrow as pa
+
+from . import storage
+from .core import read_parquet_sma, SharedScan, DEPOSIT_FACTOR, REINVEST_FACTOR
+from .trace import QueryTrace
+from .utils import parse_sql, parse_aggregates
+from .paths import expand_paths
+
+# concurrent queries of a session by default
+MAX_CONCURRENCY = os.cpu_count() or 4
+
+
+class Session:
+    """
+    A DuckDB database with a pool of cursors, safe to query from many threads.
+
+    Each query checks out a cursor, so up to `max_concurrency` queries run at
+    once and further callers wait. A relation keeps the cursor it was created
+    on; that cursor leaves the pool with it and is replaced by a fresh one.
+    An index that another query reaps or evicts while a query still plans
+    with it is not needed: the row groups it would have served are scanned.
+
+    Per-session settings: `threads` (DuckDB threads, None for DuckDB's
+    default) and the economic constants `deposit_factor` and
+    `reinvest_factor`. Indexes, budgets, the quota and the caches belong to the
+    index folder and are shared by every session of the process; the folder is
+    set with QUACKDB_SMA_FOLDER, `index_folder` may only repeat it.
+    """
+    def __init__(
+        self,
+        threads: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        deposit_factor: float = DEPOSIT_FACTOR,
+        reinvest_factor: float = REINVEST_FACTOR,
+        index_folder: Optional[str] = None,
+    ):
+        if index_folder is not None and os.path.abspath(os.path.expanduser(index_folder)) != os.path.abspath(storage.BASE_FOLDER):
+            raise ValueError(
+                f"Index folder is {storage.BASE_FOLDER} for the whole process, set QUACKDB_SMA_FOLDER to change it"
+            )
+        self.threads = threads
+        self.max_concurrency = max_concurrency or MAX_CONCURRENCY
+        self.deposit_factor = deposit_factor
+        self.reinvest_factor = reinvest_factor
+        self.db = duckdb.connect()
+        if threads is not None:
+            self.db.execute(f"SET threads = {int(threads)}")
+        self._pool: "queue.Queue[duckdb.DuckDBPyConnection]" = queue.Queue()
+        for _ in range(self.max_concurrency):
+            self._pool.put(self.db.cursor())
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def sql(
+        self,
+        query: str,
+        stream: bool = False,
+        explain: bool = False,
+        on_trace: Optional[Callable[[QueryTrace], None]] = None,
+    ) -> Union[duckdb.DuckDBPyRelation, pa.RecordBatchReader, Tuple[Any, QueryTrace]]:
+        """quackdb.sql() on this session, see there."""
+        trace = QueryTrace(query, on_trace, explain)
+        con = self._pool.get()
+        handed_off = False
+        try:
+            res = self._run(query, stream, trace, con)
+            # a streamed result reads from a cursor of its own
+            handed_off = isinstance(res, duckdb.DuckDBPyRelation)
+        finally:
+            self._pool.put(self.db.cursor() if handed_off else con)
+        return (res, trace) if explain else res
+
+    def sql_many(
+        self,
+        queries: List[str],
+        explain: bool = False,
+        on_trace: Optional[Callable[[QueryTrace], None]] = None,
+    ) -> List[Any]:
+        """
+        Run a batch of queries, returning their results in order. Queries over
+        the same files share one scan: skip and outlier decisions are made per
+        query, then the row groups any of them has to read are read once and
+        every predicate is evaluated in the same pass. Aggregate queries run on
+        their own. With `explain` each result is a (result, QueryTrace) pair.
+        """
+        traces = [QueryTrace(q, on_trace, explain) for q in queries]
+        results: List[Any] = [None] * len(queries)
+        con = self._pool.get()
+        try:
+            groups: Dict[Tuple[str, ...], List[Tuple[int, list, list, Any]]] = {}
+            for i, query in enumerate(queries):
+                files, proj, pred = self._parse(query)
+                if parse_aggregates(query) is not None:
+                    results[i] = self._run(query, False, traces[i], con)
+                else:
+                    groups.setdefault(tuple(files), []).append((i, files, proj, pred))
+            for members in groups.values():
+                shared = SharedScan(con)
+                pending = []
+                for i, files, proj, pred in members:
+                    res = read_parquet_sma(files, proj, pred, con=con, trace=traces[i], shared=shared,
+                                           deposit_factor=self.deposit_factor, reinvest_factor=self.reinvest_factor)
+                    if res is None:
+                        pending.append(i)
+                    else:
+                        # answered by the result cache
+                        results[i] = res
+                for i, res in zip(pending, shared.run()):
+                    results[i] = res
+        finally:
+            # the relations keep the cursor
+            self._pool.put(self.db.cursor())
+        return list(zip(results, traces)) if explain else results
+
+    async def asql(
+        self,
+        query: str,
+        stream: bool = False,
+        explain: bool = False,
+        on_trace: Optional[Callable[[QueryTrace], None]] = None,
+    ):
+        """sql() on a worker thread, without blocking the event loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='quackdb-query')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.sql, query, stream, explain, on_trace))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "threads": self.threads,
+            "max_concurrency": self.max_concurrency,
+            "idle_cursors": self._pool.qsize(),
+            "deposit_factor": self.deposit_factor,
+            "reinvest_factor": self.reinvest_factor,
+        }
+
+    def close(self):
+        """Close the database, relations of this session become unusable."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.db.close()
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _parse(self, query: str):
+        parts = parse_sql(query)
+        if not parts:
+            raise ValueError("Query can not be parsed")
+        files, proj, pred = parts
+        files = expand_paths(files)
+        if not files:
+            raise ValueError(f"No Parquet files match {parts[0]}")
+        if pred is None:
+            raise ValueError("Query can not be executed")
+        return files, proj, pred
+
+    def _run(self, query: str, stream: bool, trace: QueryTrace, con: duckdb.DuckDBPyConnection):
+        files, proj, pred = self._parse(query)
+        options = dict(con=con, stream=stream, trace=trace,
+                       deposit_factor=self.deposit_factor, reinvest_factor=self.reinvest_factor)
+        aggregates = parse_aggregates(query)
+        if aggregates is not None:
+            # COUNT/MIN/MAX/SUM only: read the aggregated and filtered columns
+            cols = [a.column for a in aggregates if a.column is not None] + sorted(pred.columns())
+            return read_parquet_sma(files, list(dict.fromkeys(cols)) or None, pred, aggregates=aggregates, **options)
+        return read_parquet_sma(files, proj, pred, **options)
+
+
+def connect(**config) -> Session:
+    """A new Session, see there for the settings."""
+    return Session(**config)
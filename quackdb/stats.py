@@ -1,142 +1,383 @@
 import os
 import json
+import logging
+import sqlite3
+import threading
 from threading import RLock
+from typing import Any, Dict, List, Optional
+
+from .storage import BASE_FOLDER, _encode_value
+from .utils import Interval
+
+logger = logging.getLogger(__name__)
 
-BASE_FOLDER = os.path.expanduser('~/Desktop/theses/data/sma')
 STATS_FILE = os.path.join(BASE_FOLDER, 'stats.json')
+STATS_DB = os.path.join(BASE_FOLDER, 'stats.db')
 
-class StatsManager:
+# 'sqlite' (incremental, safe across processes) or 'json' (whole document rewritten on save)
+STATS_BACKEND = 'sqlite'
+
+# per-index metrics and their initial values
+FILE_FIELDS: Dict[str, Any] = {
+    'scan_count': 0,
+    'skipped_count': 0,
+    'outlier_retrieved_count': 0,
+    'partial_scan_count': 0,
+    'total_scan_time': 0.0,
+    'last_scan_time': 0.0,
+    'estimated_count': 0,
+    'total_estimated_scan_time': 0.0,
+    'last_estimated_scan_time': 0.0,
+    'last_parquet_scanned_query_id': 0,
+    'last_sma_used_query_id': 0,
+    'construction_count': 0,
+    'deconstruction_count': 0,
+}
+
+# range predicates of this many recent queries are kept for the layout advisor, see layout.py
+WORKLOAD_HISTORY = 10_000
+
+
+class JsonStatsBackend:
     """
-    Manages persistent workload-driven budgets and per-predicate metrics for SMA indexing.
+    Keeps the whole stats document in memory and rewrites the JSON file on flush().
     Stores JSON with structure:
       {
-        "budgets": { "<predicate_key>": float, ... },
-        "files": {
-            "<predicate_key>": {
-                "budget": float,
-                "scan_count": int,
-                "skipped_count": int,
-                "outlier_retrieved_count": int,
-                "total_scan_time": float,
-                "last_scan_time": float,
-                "last_parquet_scanned_query_id": int,
-                "last_sma_used_query_id": int,
-                "construction_count": int,
-                "deconstruction_count": int
-            },
-            ...
-        },
-        "current_query_id": int
+        "budgets": { "<index_key>": float, ... },
+        "files": { "<index_key>": { <FILE_FIELDS> }, ... },
+        "current_query_id": int,
+        "workload": [ {"query_id": int, "folder": str, "ranges": str}, ... ]
       }
     """
-    def __init__(self):
-        self.lock = RLock()
-        self.stats = {"budgets": {}, "files": {}, "current_query_id": 0}
-        self._load()
-
-    def _load(self):
-        if os.path.exists(STATS_FILE):
+    def __init__(self, path: str = STATS_FILE):
+        self.path = path
+        self.stats = {"budgets": {}, "files": {}, "current_query_id": 0, "workload": []}
+        if os.path.exists(path):
             try:
-                with open(STATS_FILE, 'r') as f:
-                    data = json.load(f)
-                    self.stats = data
-            except Exception as e:
-                # print(f"Error loading stats file {STATS_FILE}: {e}")
-                self.stats = {"budgets": {}, "files": {}, "current_query_id": 0}
+                with open(path, 'r') as f:
+                    self.stats = json.load(f)
+            except Exception:
+                # start over rather than fail every query, the old budgets are lost
+                logger.warning("Could not load stats file %s, starting with empty stats", path, exc_info=True)
         else:
-            os.makedirs(BASE_FOLDER, exist_ok=True)
-            self.stats = {"budgets": {}, "files": {}, "current_query_id": 0}
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        fm = self.stats['files'].get(key)
+        return None if fm is None else dict(FILE_FIELDS, **fm)
+
+    def keys(self) -> List[str]:
+        return list(self.stats['files'])
+
+    def get_budget(self, key: str) -> float:
+        return float(self.stats.get('budgets', {}).get(key, 0.0))
+
+    def add_budget(self, key: str, amount: float):
+        self.stats.setdefault('budgets', {})[key] = max(self.get_budget(key) + amount, 0)
+        # a key with a budget has metrics, as in SqliteStatsBackend
+        self.stats.setdefault('files', {}).setdefault(key, dict(FILE_FIELDS))
+
+    def update(self, key: str, increments: Dict[str, float], assignments: Dict[str, Any]):
+        fm = self.stats.setdefault('files', {}).setdefault(key, dict(FILE_FIELDS))
+        for field, amount in increments.items():
+            fm[field] = fm.get(field, FILE_FIELDS[field]) + amount
+        fm.update(assignments)
+
+    def next_query_id(self) -> int:
+        query_id = self.stats["current_query_id"]
+        self.stats["current_query_id"] += 1
+        return query_id
+
+    def current_query_id(self) -> int:
+        return self.stats["current_query_id"]
+
+    def add_workload(self, query_id: int, folder: str, ranges: str):
+        workload = self.stats.setdefault('workload', [])
+        workload.append({"query_id": query_id, "folder": folder, "ranges": ranges})
+        del workload[:-WORKLOAD_HISTORY]
+
+    def workload(self) -> List[Dict[str, Any]]:
+        return list(self.stats.get('workload', []))
+
+    def flush(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.stats, f, indent=2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return json.loads(json.dumps(self.stats))
+
+
+class SqliteStatsBackend:
+    """
+    Stores one row per index key in SQLite (WAL mode). Every update is a small
+    transaction on a single row, so writes do not grow with the history, and
+    concurrent processes sharing the folder see each other's budgets.
+    Rows are read on demand.
+    """
+    def __init__(self, path: str = STATS_DB, import_json: Optional[str] = STATS_FILE):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fresh = not os.path.exists(path)
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('current_query_id', 0)")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, budget REAL NOT NULL DEFAULT 0)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workload (query_id INTEGER PRIMARY KEY, folder TEXT NOT NULL, ranges TEXT NOT NULL)"
+            )
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+            for field, default in FILE_FIELDS.items():
+                if field not in existing:
+                    kind = 'REAL' if isinstance(default, float) else 'INTEGER'
+                    conn.execute(f"ALTER TABLE files ADD COLUMN {field} {kind} NOT NULL DEFAULT {default!r}")
+        if fresh and import_json and os.path.exists(import_json):
+            self._import(JsonStatsBackend(import_json))
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _import(self, old: JsonStatsBackend):
+        """One-off migration of an existing stats.json."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key in set(old.keys()) | set(old.stats.get('budgets', {})):
+                self.update(key, {}, dict(old.get(key) or {}, budget=old.get_budget(key)))
+            for row in old.workload():
+                self.add_workload(row["query_id"], row["folder"], row["ranges"])
+            conn.execute("UPDATE meta SET value = ? WHERE name = 'current_query_id'", (old.current_query_id(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        cur = self._conn().execute(f"SELECT {', '.join(FILE_FIELDS)} FROM files WHERE key = ?", (key,))
+        row = cur.fetchone()
+        return None if row is None else dict(zip(FILE_FIELDS, row))
+
+    def keys(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT key FROM files")]
+
+    def get_budget(self, key: str) -> float:
+        row = self._conn().execute("SELECT budget FROM files WHERE key = ?", (key,)).fetchone()
+        return float(row[0]) if row else 0.0
+
+    def add_budget(self, key: str, amount: float):
+        self.update(key, {}, {}, budget_delta=amount)
+
+    def update(self, key: str, increments: Dict[str, float], assignments: Dict[str, Any],
+               budget_delta: Optional[float] = None):
+        sets = [f"{field} = {field} + ?" for field in increments]
+        sets += [f"{field} = ?" for field in assignments]
+        params = list(increments.values()) + list(assignments.values())
+        if budget_delta is not None:
+            sets.append("budget = MAX(budget + ?, 0)")
+            params.append(budget_delta)
+        conn = self._conn()
+        # a single statement on one row is atomic, no explicit transaction needed
+        conn.execute("INSERT OR IGNORE INTO files (key) VALUES (?)", (key,))
+        if sets:
+            conn.execute(f"UPDATE files SET {', '.join(sets)} WHERE key = ?", params + [key])
+
+    def next_query_id(self) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            query_id = conn.execute("SELECT value FROM meta WHERE name = 'current_query_id'").fetchone()[0]
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'current_query_id'")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return query_id
+
+    def current_query_id(self) -> int:
+        return self._conn().execute("SELECT value FROM meta WHERE name = 'current_query_id'").fetchone()[0]
+
+    def add_workload(self, query_id: int, folder: str, ranges: str):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO workload VALUES (?, ?, ?)", (query_id, folder, ranges))
+        if query_id % 100 == 0:
+            # query ids are shared by all processes, this keeps about the last WORKLOAD_HISTORY queries
+            conn.execute("DELETE FROM workload WHERE query_id <= ?", (query_id - WORKLOAD_HISTORY,))
+
+    def workload(self) -> List[Dict[str, Any]]:
+        cur = self._conn().execute("SELECT query_id, folder, ranges FROM workload ORDER BY query_id")
+        return [{"query_id": q, "folder": f, "ranges": r} for q, f, r in cur]
+
+    def flush(self):
+        # every update is already committed
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        cur = self._conn().execute(f"SELECT key, budget, {', '.join(FILE_FIELDS)} FROM files")
+        budgets, files = {}, {}
+        for row in cur:
+            budgets[row[0]] = row[1]
+            files[row[0]] = dict(zip(FILE_FIELDS, row[2:]))
+        return {"budgets": budgets, "files": files, "current_query_id": self.current_query_id()}
+
+
+def make_backend(kind: str = STATS_BACKEND):
+    if kind == 'json':
+        return JsonStatsBackend()
+    if kind == 'sqlite':
+        return SqliteStatsBackend()
+    raise ValueError(f"Unknown stats backend: {kind}")
+
+
+class StatsManager:
+    """
+    Manages persistent workload-driven budgets and per-index metrics for SMA indexing.
+    Storage is delegated to a backend, see JsonStatsBackend and SqliteStatsBackend;
+    snapshot() returns the stats in the JSON layout for either backend.
+    """
+    def __init__(self, backend=None):
+        self.lock = RLock()
+        self.backend = backend if backend is not None else make_backend()
 
     def save(self):
-        """Persist current stats to disk."""
+        """Persist current stats to disk (a no-op for incremental backends)."""
+        with self.lock:
+            self.backend.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return self.backend.snapshot()
+
+    def get_file_stats(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the metrics of an index key, or None if it was never recorded."""
+        with self.lock:
+            return self.backend.get(key)
+
+    def keys(self) -> List[str]:
         with self.lock:
-            with open(STATS_FILE, 'w') as f:
-                json.dump(self.stats, f, indent=2)
+            return self.backend.keys()
 
     def get_budget(self, key: str) -> float:
-        """Return current budget for a predicate key."""
+        """Return current budget for an index key."""
         with self.lock:
-            return float(self.stats.get('budgets', {}).get(key, 0.0))
+            return self.backend.get_budget(key)
 
     def add_budget(self, key: str, amount: float):
-        """Adjust budget by amount. In-memory only; call save() after queries."""
+        """Adjust budget by amount, never going below zero."""
         with self.lock:
-            b = self.get_budget(key) + amount
-            if b < 0:
-                b = 0
-            self.stats.setdefault('budgets', {})[key] = b
+            self.backend.add_budget(key, amount)
 
     def get_next_query_id(self) -> int:
         """Get and increment the current query ID."""
         with self.lock:
-            query_id = self.stats["current_query_id"]
-            self.stats["current_query_id"] += 1
-            return query_id
+            return self.backend.next_query_id()
+
+    def current_query_id(self) -> int:
+        """The ID the next query will get."""
+        with self.lock:
+            return self.backend.current_query_id()
 
     def record_construction(self, key: str):
-        """Record that an index was constructed for the given predicate key."""
+        """Record that an index was constructed for the given index key."""
         with self.lock:
-            fm = self.stats.setdefault('files', {}).setdefault(key, {
-                'scan_count': 0,
-                'skipped_count': 0,
-                'outlier_retrieved_count': 0,
-                'total_scan_time': 0.0,
-                'last_scan_time': 0.0,
-                'last_parquet_scanned_query_id': 0,
-                'last_sma_used_query_id': 0,
-                'construction_count': 0,
-                'deconstruction_count': 0
-            })
-            fm['construction_count'] = fm.get('construction_count', 0) + 1
+            self.backend.update(key, {'construction_count': 1}, {})
+
+    def record_prebuilt(self, key: str):
+        """
+        Record an index built ahead of the queries, e.g. by `quackdb index build`.
+        It counts as used by the current query, so the reaper gives it the
+        usual grace period before it has to prove itself.
+        """
+        with self.lock:
+            self.backend.update(key, {'construction_count': 1},
+                                {'last_sma_used_query_id': self.backend.current_query_id()})
 
     def record_deconstruction(self, key: str):
-        """Record that an index was deconstructed for the given predicate key."""
-        # print(f"Deconstructing index for {key}")
+        """Record that an index was deconstructed for the given index key."""
         with self.lock:
-            fm = self.stats.setdefault('files', {}).setdefault(key, {
-                'scan_count': 0,
-                'skipped_count': 0,
-                'outlier_retrieved_count': 0,
-                'total_scan_time': 0.0,
-                'last_scan_time': 0.0,
-                'last_parquet_scanned_query_id': 0,
-                'last_sma_used_query_id': 0,
-                'construction_count': 0,
-                'deconstruction_count': 0
-            })
-            fm['deconstruction_count'] = fm.get('deconstruction_count', 0) + 1
-
-    def record_scan(self, key: str, scan_time: float, skipped: bool = False, outlier: bool = False):
+            self.backend.update(key, {'deconstruction_count': 1}, {})
+
+    def record_scan(self, key: str, scan_time: float, skipped: bool = False, outlier: bool = False,
+                    partial: bool = False, estimated: Optional[float] = None, query_id: Optional[int] = None):
         """
-        Record a file scan event for predicate `key` on `file`:
-          - scan_time: seconds of the full DuckDB scan
+        Record a file scan event for index `key` (one file and column):
+          - scan_time: measured seconds of the file's share of the DuckDB scan
           - skipped: True if the file was skipped
           - outlier: True if outlier retrieval was used
-        Updates in-memory stats; call save() after queries.
+          - partial: True if only some row groups had to be scanned
+          - estimated: the scan time we expected before scanning, if any
+          - query_id: the query that scanned, the current one if None; concurrent
+            queries pass their own
         """
         with self.lock:
-            fm = self.stats.setdefault('files', {}).setdefault(key, {
-                'scan_count': 0,
-                'skipped_count': 0,
-                'outlier_retrieved_count': 0,
-                'total_scan_time': 0.0,
-                'last_scan_time': 0.0,
-                'last_parquet_scanned_query_id': 0,
-                'last_sma_used_query_id': 0,
-                'construction_count': 0,
-                'deconstruction_count': 0
-            })
-            fm['scan_count'] += 1
-            fm['total_scan_time'] += scan_time
-            fm['last_scan_time'] = scan_time
-            if skipped or outlier:
-                fm['last_sma_used_query_id'] = self.stats["current_query_id"]
+            if query_id is None:
+                query_id = self.backend.current_query_id()
+            increments: Dict[str, float] = {'scan_count': 1, 'total_scan_time': scan_time}
+            assignments: Dict[str, Any] = {'last_scan_time': scan_time}
+            if estimated is not None:
+                increments['estimated_count'] = 1
+                increments['total_estimated_scan_time'] = estimated
+                assignments['last_estimated_scan_time'] = estimated
+            if skipped or outlier or partial:
+                assignments['last_sma_used_query_id'] = query_id
             if skipped:
-                fm['skipped_count'] += 1
+                increments['skipped_count'] = 1
             elif outlier:
-                fm['outlier_retrieved_count'] += 1
+                increments['outlier_retrieved_count'] = 1
             else:
-                fm['last_parquet_scanned_query_id'] = self.stats["current_query_id"]
+                if partial:
+                    increments['partial_scan_count'] = 1
+                assignments['last_parquet_scanned_query_id'] = query_id
+            self.backend.update(key, increments, assignments)
+
+    def record_ranges(self, query_id: int, paths: List[str], ranges: Dict[str, Any]):
+        """
+        Record the column ranges (utils.Interval) a query filtered `paths` on,
+        the workload history read by the layout advisor.
+        """
+        folder = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+        encoded = json.dumps({col: interval.to_dict() for col, interval in ranges.items()}, default=_encode_value)
+        with self.lock:
+            self.backend.add_workload(query_id, folder, encoded)
+
+    def workload(self) -> List[Dict[str, Any]]:
+        """
+        The recorded queries, oldest first, as dicts with query_id, folder and
+        ranges ({column: Interval}). Dates, timestamps and decimals come back
+        as strings, see layout.py for casting them to the column types.
+        """
+        with self.lock:
+            rows = self.backend.workload()
+        return [
+            dict(row, ranges={col: Interval.from_dict(d) for col, d in json.loads(row["ranges"]).items()})
+            for row in rows
+        ]
+
+    def cost_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Measured versus estimated scan cost per index key, for scans where an
+        estimate was made. Error is measured minus estimated on the last scan.
+        """
+        report = {}
+        for key, fm in self.snapshot()['files'].items():
+            if not fm.get('estimated_count'):
+                continue
+            report[key] = {
+                'scan_count': fm['scan_count'],
+                'avg_measured': fm['total_scan_time'] / fm['scan_count'],
+                'avg_estimated': fm['total_estimated_scan_time'] / fm['estimated_count'],
+                'last_measured': fm['last_scan_time'],
+                'last_estimated': fm['last_estimated_scan_time'],
+                'last_error': fm['last_scan_time'] - fm['last_estimated_scan_time'],
+            }
+        return report
 
 # singleton instance
 stats_manager = StatsManager()
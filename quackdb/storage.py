@@ -0,0 +1,178 @@
+import os, json
+import datetime
+import decimal
+from typing import Optional, Dict, Any, List
+
+import pyarrow as pa
+
+# configure base folder for .sma files
+BASE_FOLDER = os.path.expanduser(os.environ.get('QUACKDB_SMA_FOLDER', '~/Desktop/theses/data/sma'))
+os.makedirs(BASE_FOLDER, exist_ok=True)
+
+# bump whenever the header layout or the outlier file changes
+SMA_FORMAT_VERSION = 6
+
+# header fields holding column values, encoded as strings for the non-numeric value types
+VALUE_FIELDS = ('min', 'max', 'lower_threshold', 'upper_threshold')
+
+# An index is stored as two or three files:
+#   <key>.sma        small JSON header with the scalar aggregates and zone maps
+#   <key>.sma.arrow  outlier rows as an Arrow IPC file, opened memory-mapped
+#   <key>.sma.bloom  optional bloom filter bits, see bloom.BloomFilter
+OUTLIERS_EXT = ".arrow"
+BLOOM_EXT = ".bloom"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Can not store {type(value).__name__} in an index header")
+
+
+_DECODERS = {
+    'timestamp': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'decimal': decimal.Decimal,
+}
+
+
+def _decode_values(header: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn the encoded values of a header back into datetimes, dates or decimals, by its `value_type`."""
+    decode = _DECODERS.get(header.get('value_type'))
+    if decode is None:
+        return header
+    for part in [header] + [z for z in header['row_groups'] if z is not None]:
+        for field in VALUE_FIELDS:
+            if part.get(field) is not None:
+                part[field] = decode(part[field])
+    return header
+
+
+def sma_path(key: str, ext: str = ".sma") -> str:
+    return os.path.join(BASE_FOLDER, f"{key}{ext}")
+
+
+def _replace_atomically(path: str, write) -> None:
+    tmp = f"{path}.tmp.{os.getpid()}"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_index(
+    key: str,
+    header: Dict[str, Any],
+    outliers: pa.Table,
+    ext: str = ".sma",
+    bloom: Optional[bytes] = None,
+) -> None:
+    """Write the outlier and bloom files first and the header last, so a readable header implies a complete index."""
+    header_file = sma_path(key, ext)
+
+    def write_outliers(tmp: str):
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, outliers.schema) as writer:
+                writer.write_table(outliers)
+
+    def write_header(tmp: str):
+        with open(tmp, 'w') as f:
+            json.dump(dict(header, version=SMA_FORMAT_VERSION), f, default=_encode_value)
+
+    def write_bloom(tmp: str):
+        with open(tmp, 'wb') as f:
+            f.write(bloom)
+
+    _replace_atomically(header_file + OUTLIERS_EXT, write_outliers)
+    if bloom is not None:
+        _replace_atomically(header_file + BLOOM_EXT, write_bloom)
+    elif os.path.exists(header_file + BLOOM_EXT):
+        # left by an earlier version of the index, it would count against the quota
+        os.remove(header_file + BLOOM_EXT)
+    _replace_atomically(header_file, write_header)
+
+
+def read_header(key: str, ext: str = ".sma") -> Optional[Dict[str, Any]]:
+    """
+    Return the index header, or None if there is no index or it was written in
+    another format version (e.g. pickled indexes from before version 2) or
+    lacks the zone maps.
+    """
+    try:
+        with open(sma_path(key, ext), 'r') as f:
+            header = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # not JSON, an index from an older release
+        return None
+    if not isinstance(header, dict) or header.get('version') != SMA_FORMAT_VERSION:
+        return None
+    if not isinstance(header.get('row_groups'), list):
+        # a layout change that missed a version bump, treat it like any other old index
+        return None
+    return _decode_values(header)
+
+
+def index_exists(key: str, ext: str = ".sma") -> bool:
+    """True if the header of the index is on disk."""
+    return os.path.exists(sma_path(key, ext))
+
+
+def open_outliers(key: str, columns: Optional[List[str]] = None, ext: str = ".sma") -> pa.Table:
+    """
+    Open the outlier rows memory-mapped. Buffers are not copied, and selecting
+    `columns` keeps the other columns from ever being touched.
+    """
+    source = pa.memory_map(sma_path(key, ext) + OUTLIERS_EXT, 'r')
+    tbl = pa.ipc.open_file(source).read_all()
+    return tbl.select(columns) if columns is not None else tbl
+
+
+def open_bloom(key: str, ext: str = ".sma") -> pa.Buffer:
+    """Memory-map the bloom filter bits of an index."""
+    return pa.memory_map(sma_path(key, ext) + BLOOM_EXT, 'r').read_buffer()
+
+
+def drop_index(key: str, ext: str = ".sma") -> int:
+    """Delete all files of an index and return the number of bytes freed."""
+    freed = 0
+    header_file = sma_path(key, ext)
+    for f in (header_file, header_file + OUTLIERS_EXT, header_file + BLOOM_EXT):
+        try:
+            size = os.path.getsize(f)
+            os.remove(f)
+            freed += size
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+def store_version() -> int:
+    """Changes whenever an index file is added to or removed from BASE_FOLDER, also by other processes."""
+    return os.stat(BASE_FOLDER).st_mtime_ns
+
+
+def list_indexes(ext: str = ".sma") -> List[str]:
+    """Keys of the indexes in BASE_FOLDER."""
+    return [f[:-len(ext)] for f in os.listdir(BASE_FOLDER) if f.endswith(ext)]
+
+
+def index_sizes(ext: str = ".sma") -> Dict[str, int]:
+    """Bytes on disk of every index in BASE_FOLDER, by key."""
+    sizes: Dict[str, int] = {}
+    for entry in os.scandir(BASE_FOLDER):
+        for suffix in (ext, ext + OUTLIERS_EXT, ext + BLOOM_EXT):
+            if entry.name.endswith(suffix):
+                key = entry.name[:-len(suffix)]
+                try:
+                    sizes[key] = sizes.get(key, 0) + entry.stat().st_size
+                except FileNotFoundError:
+                    # dropped concurrently
+                    pass
+                break
+    return sizes
@@ -0,0 +1,165 @@
+import os, json, time
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# every finished trace is appended to this file as a JSON line, if set
+TRACE_FILE = os.environ.get('QUACKDB_TRACE_FILE')
+
+
+class QueryTrace:
+    """
+    What one query did, filled in by read_parquet_sma():
+
+      files          per file the decision (skip, outlier, zone, partial, full
+                     or cached), its row groups by outcome, the columns that had
+                     an index and the time spent loading indexes and footers
+      builds         index builds considered for scanned files, whether the
+                     budget could pay for them and whether they were queued
+                     (not if a build of the index was already in flight)
+      budget_deltas  net budget change per index key
+      phases         planning, index loading and DuckDB execution time
+
+    plus the rows and bytes produced. Recording only appends small dicts, so
+    tracing is always on; a trace is passed to the hooks once the query has
+    finished, for a streamed result once the reader is exhausted.
+    """
+    def __init__(
+        self,
+        query: Optional[str] = None,
+        callback: Optional[Callable[['QueryTrace'], None]] = None,
+        explain: bool = False,
+    ):
+        self.query = query
+        self.callback = callback
+        self.explain = explain
+        self.query_id: Optional[int] = None
+        self.predicate: Optional[str] = None
+        self.stream = False
+        self.cached = False
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.phases = {"plan_s": 0.0, "index_load_s": 0.0, "execute_s": 0.0, "total_s": None}
+        self.files: List[Dict[str, Any]] = []
+        self.builds: List[Dict[str, Any]] = []
+        self.budget_deltas: Dict[str, float] = {}
+        self.rows: Optional[int] = None
+        self.bytes: Optional[int] = None
+        self.finished = False
+
+    @property
+    def wanted(self) -> bool:
+        """True if anything consumes the trace, results are then materialized to count their rows."""
+        return self.explain or self.callback is not None or bool(_hooks)
+
+    def file(self, path: str, action: str, row_groups: Optional[Dict[str, int]] = None,
+             indexed: Optional[List[str]] = None, load_s: float = 0.0):
+        self.files.append({
+            "path": path,
+            "action": action,
+            "row_groups": row_groups or {},
+            "indexed": indexed or [],
+            "load_s": load_s,
+        })
+
+    def build(self, path: str, column: str, key: str, budget: float, cost: float, funded: bool, queued: bool):
+        self.builds.append({"path": path, "column": column, "key": key, "budget": budget,
+                            "cost": cost, "funded": funded, "queued": queued})
+
+    def budget(self, key: str, delta: float):
+        self.budget_deltas[key] = self.budget_deltas.get(key, 0.0) + delta
+
+    def phase(self, name: str, seconds: float):
+        self.phases[name] += seconds
+
+    def produced(self, rows: int, nbytes: int):
+        self.rows = (self.rows or 0) + rows
+        self.bytes = (self.bytes or 0) + nbytes
+
+    def finish(self):
+        """Close the trace and hand it to the callback and the global hooks."""
+        if self.finished:
+            return
+        self.finished = True
+        self.phases["total_s"] = time.perf_counter() - self._start
+        for hook in ([self.callback] if self.callback else []) + list(_hooks):
+            try:
+                hook(self)
+            except Exception:
+                # a failing hook must not fail the query
+                logger.exception("Trace hook %r failed for query %s", hook, self.query_id)
+
+    def summary(self) -> Dict[str, int]:
+        """Number of files per decision."""
+        counts: Dict[str, int] = {}
+        for f in self.files:
+            counts[f["action"]] = counts.get(f["action"], 0) + 1
+        return counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query_id": self.query_id,
+            "query": self.query,
+            "predicate": self.predicate,
+            "started": self.started,
+            "stream": self.stream,
+            "cached": self.cached,
+            "phases": dict(self.phases),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "summary": self.summary(),
+            "files": self.files,
+            "builds": self.builds,
+            "budget_deltas": self.budget_deltas,
+        }
+
+    def __str__(self) -> str:
+        ms = {k: v * 1000 for k, v in self.phases.items() if v is not None}
+        lines = [
+            f"query {self.query_id}: {self.rows} rows, {self.bytes} bytes"
+            + (" (from result cache)" if self.cached else ""),
+            "  " + ", ".join(f"{k[:-2]} {v:.1f} ms" for k, v in ms.items()),
+            "  files: " + (", ".join(f"{n} {a}" for a, n in sorted(self.summary().items())) or "none"),
+        ]
+        for f in self.files:
+            rgs = ", ".join(f"{n} {o}" for o, n in f["row_groups"].items() if n)
+            lines.append(f"    {f['action']:<8} {f['path']}" + (f"  [{rgs}]" if rgs else ""))
+        for b in self.builds:
+            state = "queued" if b["queued"] else "in flight" if b["funded"] else "unfunded"
+            lines.append(f"  build {state}: {b['key']} (budget {b['budget']:.4f}, cost {b['cost']:.4f})")
+        return "\n".join(lines)
+
+
+class JsonlExporter:
+    """Trace hook appending each trace as one JSON object per line to `path`."""
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self.lock = Lock()
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def __call__(self, trace: QueryTrace):
+        line = json.dumps(trace.to_dict(), default=str) + "\n"
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line)
+
+
+# called with every finished trace
+_hooks: List[Callable[[QueryTrace], None]] = []
+
+
+def add_trace_hook(hook: Callable[[QueryTrace], None]):
+    """Call `hook(trace)` after every query, e.g. with a JsonlExporter."""
+    _hooks.append(hook)
+
+
+def remove_trace_hook(hook: Callable[[QueryTrace], None]):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+if TRACE_FILE:
+    add_trace_hook(JsonlExporter(TRACE_FILE))
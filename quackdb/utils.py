@@ -1,21 +1,652 @@
 import re
-from typing import Optional, List, Tuple
+import datetime
+from typing import Optional, List, Tuple, Dict, Any, Set, FrozenSet
 
 # Regex to extract projection, parquet files, and predicate
 _SELECT = re.compile(r"SELECT\s+(.*?)\s+FROM", re.IGNORECASE)
 _FROM_PQ = re.compile(
-    r"FROM\s+read_parquet\(\[([^\]]+)\]\)",
+    r"FROM\s+(?:read_parquet\(\s*(?:\[([^\]]+)\]|('(?:[^']|'')*'))\s*\)|('(?:[^']|'')*\.parquet'))",
     re.IGNORECASE
 )
-_WHERE = re.compile(
-    r"WHERE\s+([a-zA-Z_]\w*)\s*(=|>|<|>=|<=|!=)\s*([0-9.]+)",
+
+# Tokens of a WHERE clause
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^']|'')*')
+      | (?P<quoted>"(?:[^"]|"")+")
+      | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<ident>[A-Za-z_]\w*)
+      | (?P<op><>|!=|>=|<=|=|>|<|\(|\)|,|-|\+)
+    )""", re.VERBOSE)
+
+# comparison with the operands swapped, e.g. `5 < x` is `x > 5`
+_FLIPPED = {'=': '=', '!=': '!=', '<': '>', '>': '<', '<=': '>=', '>=': '<='}
+
+
+class Interval:
+    """
+    Range of values a column can take, None bounds are unbounded.
+    `points`, if set, is the finite set of allowed values (from = and IN) and
+    `excluded` holds values ruled out by != and NOT IN.
+    Used to decide whether a zone [min, max] can contain matching rows.
+    """
+    def __init__(
+        self,
+        low: Any = None,
+        high: Any = None,
+        low_inclusive: bool = True,
+        high_inclusive: bool = True,
+        points: Optional[FrozenSet[Any]] = None,
+        excluded: FrozenSet[Any] = frozenset(),
+    ):
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+        self.points = points
+        self.excluded = excluded
+
+    def __repr__(self) -> str:
+        left = '[' if self.low_inclusive else '('
+        right = ']' if self.high_inclusive else ')'
+        res = f"{left}{self.low}, {self.high}{right}"
+        if self.points is not None:
+            res += f" in {sorted(self.points, key=repr)}"
+        if self.excluded:
+            res += f" not in {sorted(self.excluded, key=repr)}"
+        return res
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Interval) and (
+            (self.low, self.high, self.low_inclusive, self.high_inclusive, self.points, self.excluded) ==
+            (other.low, other.high, other.low_inclusive, other.high_inclusive, other.points, other.excluded)
+        )
+
+    def is_empty(self) -> bool:
+        if self.points is not None and not self.points:
+            return True
+        if self.low is None or self.high is None:
+            return False
+        try:
+            return self.low > self.high or (
+                self.low == self.high and not (self.low_inclusive and self.high_inclusive)
+            )
+        except TypeError:
+            return False
+
+    def admits(self, value: Any) -> bool:
+        """True if the value may satisfy the interval. Incomparable types are admitted."""
+        return self.overlaps(value, value)
+
+    def overlaps(self, lo: Any, hi: Any) -> bool:
+        """
+        True if some value in the closed range [lo, hi] may fall in the interval.
+        Incomparable types are assumed to overlap.
+        """
+        try:
+            if self.is_empty():
+                return False
+            if self.low is not None and (hi < self.low or (hi == self.low and not self.low_inclusive)):
+                return False
+            if self.high is not None and (lo > self.high or (lo == self.high and not self.high_inclusive)):
+                return False
+            if self.points is not None and not any(lo <= p <= hi for p in self.points):
+                return False
+            if lo == hi and lo in self.excluded:
+                return False
+        except TypeError:
+            pass
+        return True
+
+    def map(self, fn) -> 'Interval':
+        """The interval with `fn` applied to every bound and value, e.g. to convert literals."""
+        return Interval(
+            None if self.low is None else fn(self.low),
+            None if self.high is None else fn(self.high),
+            self.low_inclusive,
+            self.high_inclusive,
+            None if self.points is None else frozenset(fn(p) for p in self.points),
+            frozenset(fn(v) for v in self.excluded),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The interval as plain values, e.g. to store it as JSON."""
+        return {
+            "low": self.low,
+            "high": self.high,
+            "low_inclusive": self.low_inclusive,
+            "high_inclusive": self.high_inclusive,
+            "points": None if self.points is None else sorted(self.points, key=repr),
+            "excluded": sorted(self.excluded, key=repr),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'Interval':
+        return cls(
+            d["low"], d["high"], d["low_inclusive"], d["high_inclusive"],
+            None if d["points"] is None else frozenset(d["points"]),
+            frozenset(d["excluded"]),
+        )
+
+    def intersect(self, other: 'Interval') -> 'Interval':
+        try:
+            low, low_inc = _tighter(self.low, self.low_inclusive, other.low, other.low_inclusive, max)
+            high, high_inc = _tighter(self.high, self.high_inclusive, other.high, other.high_inclusive, min)
+        except TypeError:
+            return self
+        excluded = self.excluded | other.excluded
+        res = Interval(low, high, low_inc, high_inc, excluded=excluded)
+        if self.points is not None or other.points is not None:
+            candidates = self.points if self.points is not None else other.points
+            res.points = frozenset(p for p in candidates if self.admits(p) and other.admits(p))
+        return res
+
+    def hull(self, other: 'Interval') -> 'Interval':
+        try:
+            low, low_inc = _looser(self.low, self.low_inclusive, other.low, other.low_inclusive, min)
+            high, high_inc = _looser(self.high, self.high_inclusive, other.high, other.high_inclusive, max)
+        except TypeError:
+            return Interval()
+        points = None
+        if self.points is not None and other.points is not None:
+            points = self.points | other.points
+        return Interval(low, high, low_inc, high_inc, points, self.excluded & other.excluded)
+
+    def contains(self, other: 'Interval') -> bool:
+        """True if every value of `other` lies in this interval."""
+        return self.intersect(other) == other
+
+    def covers(self, lo: Any, hi: Any) -> bool:
+        """
+        True if every value in the closed range [lo, hi] lies in the interval.
+        Incomparable types are not covered.
+        """
+        try:
+            if self.low is not None and (lo < self.low or (lo == self.low and not self.low_inclusive)):
+                return False
+            if self.high is not None and (hi > self.high or (hi == self.high and not self.high_inclusive)):
+                return False
+            if self.points is not None and not (lo == hi and lo in self.points):
+                return False
+            return not any(lo <= v <= hi for v in self.excluded)
+        except TypeError:
+            return False
+
+
+def _tighter(a, a_inc, b, b_inc, pick):
+    if a is None:
+        return b, b_inc
+    if b is None or a == b:
+        return a, a_inc and (b_inc if b is not None else True)
+    return (a, a_inc) if pick(a, b) == a else (b, b_inc)
+
+
+def _looser(a, a_inc, b, b_inc, pick):
+    if a is None or b is None:
+        return None, True
+    if a == b:
+        return a, a_inc or b_inc
+    return (a, a_inc) if pick(a, b) == a else (b, b_inc)
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """The smallest string greater than every string starting with `prefix`, None if there is none."""
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_literal(value: Any) -> str:
+    """Render a Python value as a DuckDB SQL literal."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime.datetime):
+        return f"TIMESTAMP '{value.isoformat(sep=' ')}'"
+    if isinstance(value, datetime.date):
+        return f"DATE '{value.isoformat()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class Predicate:
+    """Node of a parsed WHERE clause."""
+    def columns(self) -> Set[str]:
+        """Columns referenced anywhere in the predicate."""
+        raise NotImplementedError
+
+    def ranges(self) -> Dict[str, Interval]:
+        """
+        Necessary conditions: every row matching the predicate has a non-null
+        value in ranges()[col] for each returned column.
+        """
+        return {}
+
+    def to_sql(self) -> str:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return self.to_sql()
+
+
+class Comparison(Predicate):
+    def __init__(self, column: str, op: str, value: Any):
+        self.column = column
+        self.op = '!=' if op == '<>' else op
+        self.value = value
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def ranges(self) -> Dict[str, Interval]:
+        v = self.value
+        if v is None:
+            return {}
+        if self.op == '=':
+            return {self.column: Interval(v, v, points=frozenset([v]))}
+        if self.op == '!=':
+            return {self.column: Interval(excluded=frozenset([v]))}
+        if self.op == '>':
+            return {self.column: Interval(v, None, low_inclusive=False)}
+        if self.op == '>=':
+            return {self.column: Interval(v, None)}
+        if self.op == '<':
+            return {self.column: Interval(None, v, high_inclusive=False)}
+        if self.op == '<=':
+            return {self.column: Interval(None, v)}
+        return {}
+
+    def to_sql(self) -> str:
+        return f"{quote_identifier(self.column)} {self.op} {sql_literal(self.value)}"
+
+
+class InList(Predicate):
+    def __init__(self, column: str, values: List[Any], negated: bool = False):
+        self.column = column
+        self.values = values
+        self.negated = negated
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def ranges(self) -> Dict[str, Interval]:
+        values = [v for v in self.values if v is not None]
+        if not values:
+            return {}
+        if self.negated:
+            return {self.column: Interval(excluded=frozenset(values))}
+        try:
+            return {self.column: Interval(min(values), max(values), points=frozenset(values))}
+        except TypeError:
+            return {}
+
+    def to_sql(self) -> str:
+        values = ', '.join(sql_literal(v) for v in self.values)
+        return f"{quote_identifier(self.column)} {'NOT IN' if self.negated else 'IN'} ({values})"
+
+
+class Like(Predicate):
+    """`column LIKE pattern`, only a literal prefix of the pattern can prune."""
+    def __init__(self, column: str, pattern: str, negated: bool = False):
+        self.column = column
+        self.pattern = pattern
+        self.negated = negated
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def prefix(self) -> str:
+        """The characters before the first wildcard."""
+        m = re.match(r"[^%_\\]*", self.pattern)
+        return m.group(0)
+
+    def ranges(self) -> Dict[str, Interval]:
+        if self.negated:
+            return {}
+        prefix = self.prefix()
+        if prefix == self.pattern:
+            # no wildcards, plain equality
+            return {self.column: Interval(prefix, prefix, points=frozenset([prefix]))}
+        if not prefix:
+            return {}
+        return {self.column: Interval(prefix, prefix_end(prefix), high_inclusive=False)}
+
+    def to_sql(self) -> str:
+        return f"{quote_identifier(self.column)} {'NOT LIKE' if self.negated else 'LIKE'} {sql_literal(self.pattern)}"
+
+
+class IsNull(Predicate):
+    def __init__(self, column: str, negated: bool = False):
+        self.column = column
+        self.negated = negated
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def to_sql(self) -> str:
+        return f"{quote_identifier(self.column)} IS {'NOT NULL' if self.negated else 'NULL'}"
+
+
+class And(Predicate):
+    def __init__(self, children: List[Predicate]):
+        self.children = children
+
+    def columns(self) -> Set[str]:
+        return set().union(*(c.columns() for c in self.children))
+
+    def ranges(self) -> Dict[str, Interval]:
+        res: Dict[str, Interval] = {}
+        for child in self.children:
+            for col, interval in child.ranges().items():
+                res[col] = res[col].intersect(interval) if col in res else interval
+        return res
+
+    def to_sql(self) -> str:
+        if not self.children:
+            return 'TRUE'
+        return '(' + ' AND '.join(c.to_sql() for c in self.children) + ')'
+
+
+class Or(Predicate):
+    def __init__(self, children: List[Predicate]):
+        self.children = children
+
+    def columns(self) -> Set[str]:
+        return set().union(*(c.columns() for c in self.children))
+
+    def ranges(self) -> Dict[str, Interval]:
+        child_ranges = [c.ranges() for c in self.children]
+        res: Dict[str, Interval] = {}
+        for col, interval in child_ranges[0].items():
+            if all(col in r for r in child_ranges[1:]):
+                for r in child_ranges[1:]:
+                    interval = interval.hull(r[col])
+                res[col] = interval
+        return res
+
+    def to_sql(self) -> str:
+        return '(' + ' OR '.join(c.to_sql() for c in self.children) + ')'
+
+
+class Not(Predicate):
+    def __init__(self, child: Predicate):
+        self.child = child
+
+    def columns(self) -> Set[str]:
+        return self.child.columns()
+
+    def to_sql(self) -> str:
+        return f"(NOT {self.child.to_sql()})"
+
+
+class _Parser:
+    """Recursive descent parser for the WHERE clauses quackdb can index."""
+    def __init__(self, text: str):
+        self.tokens: List[Tuple[str, str]] = []
+        pos = 0
+        text = text.rstrip().rstrip(';')
+        while pos < len(text):
+            m = _TOKEN.match(text, pos)
+            if not m or m.end() == pos:
+                if text[pos:].strip() == '':
+                    break
+                raise ValueError(f"Unexpected character at {pos}: {text[pos:pos + 10]!r}")
+            kind = m.lastgroup
+            self.tokens.append((kind, m.group(kind)))
+            pos = m.end()
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def peek_keyword(self, *words: str) -> bool:
+        kind, val = self.peek()
+        return kind == 'ident' and val.upper() in words
+
+    def take(self) -> Tuple[str, str]:
+        tok = self.peek()
+        if tok[0] is None:
+            raise ValueError("Unexpected end of WHERE clause")
+        self.pos += 1
+        return tok
+
+    def expect(self, value: str):
+        kind, val = self.take()
+        if (val.upper() if kind == 'ident' else val) != value:
+            raise ValueError(f"Expected {value}, got {val}")
+
+    def done(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    def parse_or(self) -> Predicate:
+        children = [self.parse_and()]
+        while self.peek_keyword('OR'):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self) -> Predicate:
+        children = [self.parse_not()]
+        while self.peek_keyword('AND'):
+            self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self) -> Predicate:
+        if self.peek_keyword('NOT'):
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Predicate:
+        kind, val = self.peek()
+        if kind == 'op' and val == '(':
+            self.take()
+            inner = self.parse_or()
+            self.expect(')')
+            return inner
+        if self.is_literal_start():
+            # literal on the left: `5 < x`
+            value = self.parse_literal()
+            _, op = self.take()
+            if op not in _FLIPPED and op != '<>':
+                raise ValueError(f"Unsupported operator {op}")
+            return Comparison(self.parse_column(), _FLIPPED['!=' if op == '<>' else op], value)
+
+        column = self.parse_column()
+        negated = False
+        if self.peek_keyword('IS'):
+            self.take()
+            if self.peek_keyword('NOT'):
+                self.take()
+                negated = True
+            self.expect('NULL')
+            return IsNull(column, negated)
+        if self.peek_keyword('NOT'):
+            self.take()
+            negated = True
+        if self.peek_keyword('BETWEEN'):
+            self.take()
+            low = self.parse_literal()
+            self.expect('AND')
+            high = self.parse_literal()
+            between = And([Comparison(column, '>=', low), Comparison(column, '<=', high)])
+            return Not(between) if negated else between
+        if self.peek_keyword('IN'):
+            self.take()
+            self.expect('(')
+            values = [self.parse_literal()]
+            while self.peek() == ('op', ','):
+                self.take()
+                values.append(self.parse_literal())
+            self.expect(')')
+            return InList(column, values, negated)
+        if self.peek_keyword('LIKE'):
+            self.take()
+            kind, pattern = self.take()
+            if kind != 'string':
+                raise ValueError(f"Expected a pattern, got {pattern}")
+            if self.peek_keyword('ESCAPE'):
+                raise ValueError("LIKE ... ESCAPE is not supported")
+            return Like(column, pattern[1:-1].replace("''", "'"), negated)
+        if negated:
+            raise ValueError("Expected BETWEEN, IN or LIKE after NOT")
+        kind, op = self.take()
+        if kind != 'op' or op not in ('=', '!=', '<>', '<', '>', '<=', '>='):
+            raise ValueError(f"Unsupported operator {op}")
+        return Comparison(column, op, self.parse_literal())
+
+    def parse_column(self) -> str:
+        kind, val = self.take()
+        if kind == 'quoted':
+            return val[1:-1].replace('""', '"')
+        if kind == 'ident' and val.upper() not in ('AND', 'OR', 'NOT', 'NULL', 'LIKE'):
+            return val
+        raise ValueError(f"Expected a column, got {val}")
+
+    def is_literal_start(self) -> bool:
+        kind, val = self.peek()
+        if kind in ('number', 'string') or (kind == 'op' and val in ('-', '+')):
+            return True
+        if kind == 'ident' and val.upper() in ('DATE', 'TIMESTAMP'):
+            return self.peek(1)[0] == 'string'
+        return kind == 'ident' and val.upper() in ('TRUE', 'FALSE', 'NULL')
+
+    def parse_literal(self) -> Any:
+        kind, val = self.take()
+        sign = 1
+        if kind == 'op' and val in ('-', '+'):
+            sign = -1 if val == '-' else 1
+            kind, val = self.take()
+            if kind != 'number':
+                raise ValueError(f"Expected a number, got {val}")
+        if kind == 'number':
+            num = float(val) if any(ch in val for ch in '.eE') else int(val)
+            return sign * num
+        if kind == 'string':
+            return val[1:-1].replace("''", "'")
+        if kind == 'ident':
+            word = val.upper()
+            if word in ('DATE', 'TIMESTAMP'):
+                _, text = self.take()
+                text = text[1:-1]
+                if word == 'DATE':
+                    return datetime.date.fromisoformat(text)
+                return datetime.datetime.fromisoformat(text)
+            if word in ('TRUE', 'FALSE'):
+                return word == 'TRUE'
+            if word == 'NULL':
+                return None
+        raise ValueError(f"Expected a literal, got {val}")
+
+
+def is_exact(pred: Predicate) -> bool:
+    """True if the predicate is exactly the conjunction of its ranges()."""
+    if isinstance(pred, Comparison):
+        return pred.value is not None
+    if isinstance(pred, InList):
+        return bool(pred.values) and all(v is not None for v in pred.values)
+    if isinstance(pred, And):
+        return all(is_exact(c) for c in pred.children)
+    return False
+
+
+def implies(pred: Predicate, other: Predicate) -> bool:
+    """
+    True if every row matching `pred` also matches `other`. Conservative:
+    only range predicates on `other` are compared, anything else must be equal.
+    """
+    if pred.to_sql() == other.to_sql():
+        return True
+    if not is_exact(other):
+        return False
+    ranges = pred.ranges()
+    for col, interval in other.ranges().items():
+        if col not in ranges or not interval.contains(ranges[col]):
+            return False
+    return True
+
+
+class Aggregate:
+    """COUNT, MIN, MAX or SUM of a column in the SELECT list, `column` is None for count(*)."""
+    def __init__(self, func: str, column: Optional[str], alias: Optional[str] = None):
+        self.func = func
+        self.column = column
+        self.alias = alias
+
+    @property
+    def name(self) -> str:
+        """Result column name, the alias or the name DuckDB would give it."""
+        if self.alias is not None:
+            return self.alias
+        if self.column is None:
+            return 'count_star()'
+        return f"{self.func}({self.column})"
+
+    def to_sql(self) -> str:
+        return f"{self.func}({'*' if self.column is None else quote_identifier(self.column)})"
+
+    def __repr__(self) -> str:
+        return self.to_sql()
+
+
+_AGGREGATE = re.compile(
+    r"""^(count|min|max|sum)\s*\(\s*(\*|"(?:[^"]|"")+"|[A-Za-z_]\w*)\s*\)"""
+    r"""(?:\s+AS\s+("(?:[^"]|"")+"|[A-Za-z_]\w*))?$""",
     re.IGNORECASE
 )
 
-def parse_sql(sql: str) -> Optional[Tuple[List[str], Optional[List[str]], Optional[str], Optional[str], Optional[float]]]:
+
+def _unquote(name: str) -> str:
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name
+
+
+def parse_aggregates(sql: str) -> Optional[List[Aggregate]]:
     """
-    Returns (files, projection_columns, filter_column, operator, value)
-    projection_columns is None if '*' or not found.
+    Aggregates of a SELECT list made only of count(*), count(col), min(col),
+    max(col) and sum(col), optionally with aliases. None for any other SELECT list.
+    """
+    m_sel = _SELECT.search(sql)
+    if not m_sel:
+        return None
+    res = []
+    for item in m_sel.group(1).split(','):
+        m = _AGGREGATE.match(item.strip())
+        if not m:
+            return None
+        func, arg, alias = m.group(1).lower(), m.group(2), m.group(3)
+        if arg == '*' and func != 'count':
+            return None
+        res.append(Aggregate(func, None if arg == '*' else _unquote(arg), None if alias is None else _unquote(alias)))
+    return res
+
+
+def parse_where(text: str) -> Predicate:
+    """Parse the body of a WHERE clause into a predicate tree."""
+    parser = _Parser(text)
+    pred = parser.parse_or()
+    if not parser.done():
+        raise ValueError(f"Unexpected {parser.peek()[1]} in WHERE clause")
+    return pred
+
+
+def parse_sql(sql: str) -> Optional[Tuple[List[str], Optional[List[str]], Optional[Predicate]]]:
+    """
+    Returns (files, projection_columns, predicate)
+    files are the paths as written and may hold globs or directories.
+    projection_columns is None if '*' or not found, predicate is an empty And
+    (TRUE) if there is nothing after FROM and None if the WHERE clause can not
+    be parsed or something else follows.
     """
     # projection
     m_sel = _SELECT.search(sql)
@@ -28,10 +659,10 @@ def parse_sql(sql: str) -> Optional[Tuple[List[str], Optional[List[str]], Option
     m_from = _FROM_PQ.search(sql)
     if not m_from:
         return None
-    
-    # Extract the content inside the brackets
-    files_content = m_from.group(1)
-    
+
+    # Extract the list inside the brackets, a single path or glob, or a bare 'file.parquet'
+    files_content = m_from.group(1) or m_from.group(2) or m_from.group(3)
+
     # Split by comma and clean up each file path
     files = []
     for file_part in files_content.split(','):
@@ -39,9 +670,14 @@ def parse_sql(sql: str) -> Optional[Tuple[List[str], Optional[List[str]], Option
         file_path = file_part.strip().strip("'\"")
         files.append(file_path)
     # predicate
-    m_wh = _WHERE.search(sql)
+    pred = None
+    rest = sql[m_from.end():].strip()
+    if not rest:
+        pred = And([])
+    m_wh = re.match(r"WHERE\s+(.*)$", rest, re.IGNORECASE | re.DOTALL)
     if m_wh:
-        col, op, val = m_wh.group(1), m_wh.group(2), float(m_wh.group(3))
-    else:
-        col = op = val = None
-    return files, proj, col, op, val
\ No newline at end of file
+        try:
+            pred = parse_where(m_wh.group(1))
+        except ValueError:
+            pred = None
+    return files, proj, pred
@@ -1,30 +1,80 @@
 import duckdb
 import pyarrow as pa
-from .core import read_parquet_sma
-from .utils import parse_sql
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from threading import Lock
+from .core import disk_quota
+from .session import Session
+from .trace import QueryTrace
 
-_conn = duckdb.connect()
+# the session behind the module-level functions, created on first use
+_session: Optional[Session] = None
+_session_lock = Lock()
 
-def sql(query: str) -> pa.Table:
+def default_session() -> Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = Session()
+    return _session
+
+def sql(
+    query: str,
+    stream: bool = False,
+    explain: bool = False,
+    on_trace: Optional[Callable[[QueryTrace], None]] = None,
+) -> Union[duckdb.DuckDBPyRelation, pa.RecordBatchReader, Tuple[Any, QueryTrace]]:
     """
     Run SQL through DuckDB, but intercept Parquet queries to apply SMA skipping/outliers.
-    Returns a pyarrow.Table by default.
+    Returns a DuckDBPyRelation, or a pyarrow.RecordBatchReader if `stream`.
+    With `explain` returns (result, QueryTrace) instead, `on_trace(trace)` is
+    called once the query has finished. A streamed trace finishes when the
+    reader is exhausted. Safe to call from many threads, see Session.
     """
-    parts = parse_sql(query)
-    if parts:
-        files, proj, col, op, val = parts
-        if col and op and val is not None:
-            return read_parquet_sma(files, proj, col, op, val, con=_conn)
-        else:
-            raise ValueError("Query can not be executed")
-    else:
-        raise ValueError("Query can not be parsed")
+    return default_session().sql(query, stream, explain, on_trace)
+
+def sql_many(
+    queries: List[str],
+    explain: bool = False,
+    on_trace: Optional[Callable[[QueryTrace], None]] = None,
+) -> List[Any]:
+    """Run a batch of queries, sharing one scan per file set, see Session.sql_many()."""
+    return default_session().sql_many(queries, explain, on_trace)
+
+async def asql(
+    query: str,
+    stream: bool = False,
+    explain: bool = False,
+    on_trace: Optional[Callable[[QueryTrace], None]] = None,
+):
+    """sql() run off the event loop: `await quackdb.asql(...)`."""
+    return await default_session().asql(query, stream, explain, on_trace)
 
 # convenience alias
 query = sql
 
+def index_usage() -> Dict[str, Any]:
+    """Bytes used by the SMA index store, its quota and the evictions so far."""
+    return disk_quota.usage()
+
+def index_evictions(limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+    """The last indexes evicted to stay under the quota, oldest first."""
+    return disk_quota.history(limit)
+
+def set_index_quota(quota_bytes: Optional[int]):
+    """Limit the SMA index store to `quota_bytes` (None for no limit), see QUACKDB_SMA_QUOTA."""
+    disk_quota.set_quota(quota_bytes)
+
 def main():
     import sys
+    if sys.argv[1:2] == ['index']:
+        # quackdb index build|status|drop ..., see admin.main
+        from .admin import main as index_main
+        sys.exit(index_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['layout']:
+        # quackdb layout advise|rewrite ..., see layout.main
+        from .layout import main as layout_main
+        sys.exit(layout_main(sys.argv[2:]))
     sql_text = ' '.join(sys.argv[1:])
     table = sql(sql_text)
     print(table)
@@ -8,6 +8,7 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "duckdb>=0.8.1",
+        "numpy>=1.20",
         "pyarrow>=9.0.0",
     ],
     packages=find_packages(),
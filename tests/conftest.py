@@ -0,0 +1,51 @@
+import os, math, tempfile, decimal
+
+# the index folder is fixed at import, keep the tests away from the user's indexes
+os.environ['QUACKDB_SMA_FOLDER'] = tempfile.mkdtemp(prefix='quackdb-tests-')
+
+import duckdb
+import pytest
+
+import quackdb
+from quackdb.cache import result_cache
+
+
+@pytest.fixture(autouse=True)
+def no_result_cache():
+    """Every query runs through the indexes, not the result cache."""
+    max_bytes = result_cache.lru.max_bytes
+    result_cache.lru.set_max_bytes(0)
+    yield
+    result_cache.lru.set_max_bytes(max_bytes)
+
+
+def _normalize(value):
+    if isinstance(value, float) and math.isnan(value):
+        return ('nan',)
+    if isinstance(value, float):
+        # sums of floats depend on the order they are added in
+        return round(value, 6)
+    if isinstance(value, decimal.Decimal) and value == value.to_integral_value():
+        return int(value)
+    return value
+
+
+def _sort_key(row):
+    return [(v is None, type(v).__name__, v if v is not None else 0) for v in row]
+
+
+def result_rows(rel):
+    """Rows of a relation, normalized and in a fixed order."""
+    rows = [tuple(_normalize(v) for v in row) for row in rel.fetchall()]
+    return sorted(rows, key=_sort_key)
+
+
+@pytest.fixture
+def compare():
+    """Run a query through quackdb and DuckDB and assert they return the same rows."""
+    def check(query: str):
+        expected = result_rows(duckdb.sql(query))
+        actual = result_rows(quackdb.sql(query))
+        assert actual == expected, query
+        return actual
+    return check
@@ -0,0 +1,16 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from quackdb import core
+from quackdb.admin import build_indexes
+
+
+def test_build_indexes_in_worker_processes(tmp_path):
+    path = str(tmp_path / "data.parquet")
+    pq.write_table(pa.table({"x": list(range(1000))}), path, row_group_size=100)
+    # the parent holds an open stats connection while the workers build
+    core.stats_manager.get_budget(core.index_key(path, "x"))
+    results = build_indexes([path], ["x"], workers=2)
+    assert [r["status"] for r in results] == ["built"]
+    assert core.get_sma(path, "x") is not None
+    assert [r["status"] for r in build_indexes([path], ["x"], workers=2)] == ["current"]
@@ -0,0 +1,23 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from quackdb import core
+
+
+def test_integer_sum_beyond_int64(tmp_path, compare):
+    path = str(tmp_path / "big.parquet")
+    values = np.full(64, 2 ** 61, dtype=np.int64)
+    values[::7] = -(2 ** 62)
+    pq.write_table(pa.table({"x": values}), path, row_group_size=16)
+    core.build_sma(path, "x")
+    assert core.get_sma(path, "x")["row_groups"][0]["sum"] == int(values[:16].astype(object).sum())
+    compare(f"SELECT sum(x) FROM '{path}'")
+    compare(f"SELECT sum(x), count(*) FROM '{path}' WHERE x > 0")
+
+
+def test_small_integer_sum(tmp_path, compare):
+    path = str(tmp_path / "small.parquet")
+    pq.write_table(pa.table({"x": pa.array(np.arange(-100, 100), pa.int8())}), path, row_group_size=50)
+    core.build_sma(path, "x")
+    compare(f"SELECT sum(x), min(x), max(x) FROM '{path}'")
@@ -0,0 +1,29 @@
+import os, sys, decimal, subprocess
+
+import pyarrow as pa
+
+from quackdb import storage
+from quackdb.bench.runner import result_checksum
+
+
+def test_checksum_ignores_order_and_integer_type():
+    a = pa.table({"x": [1, 2, 3], "y": [0.5, float("nan"), None]})
+    b = pa.table({"x": pa.array([decimal.Decimal(3), decimal.Decimal(1), decimal.Decimal(2)], pa.decimal128(38, 0)),
+                  "y": [None, 0.5, float("nan")]})
+    assert result_checksum(a) == result_checksum(b)
+
+
+def test_checksum_sees_wrong_rows_with_the_same_count():
+    a = pa.table({"x": [1, 2, 3]})
+    assert result_checksum(a) != result_checksum(pa.table({"x": [1, 2, 4]}))
+    assert result_checksum(a)[0] == 3
+
+
+def test_build_benchmark_keeps_its_indexes_out_of_the_store():
+    before = set(storage.list_indexes())
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-m", "quackdb.bench.build_sma", "20000", "4096"],
+                         check=True, cwd=root, stdout=subprocess.PIPE, text=True).stdout
+    assert "results match" in out
+    # the builds ran on an index folder of their own
+    assert set(storage.list_indexes()) == before
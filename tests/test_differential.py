@@ -0,0 +1,132 @@
+"""
+quackdb against DuckDB over generated Parquet files: every query must return
+the same rows from footer statistics only, with an index on every column, and
+once more when the indexes have been used.
+"""
+import datetime
+import decimal
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from quackdb import core
+
+COLUMNS = ["id", "big", "amt", "price", "f", "ts", "d", "dec", "s"]
+
+PREDICATES = [
+    "id > 1500",
+    "id BETWEEN 200 AND 260",
+    "id = 2999",
+    "id IN (5, 1234, 99999)",
+    "id NOT IN (1, 2, 3) AND id < 40",
+    "id != 17 AND id <= 20",
+    "id < 100 OR id > 5900",
+    "big > 4611686018427387904",
+    "big < -9223372036854775000",
+    "big = 9223372036854775807",
+    "amt > 5000",
+    "amt >= 10000000 AND id > 100",
+    "amt < 0 OR amt > 10000000",
+    "price > 5000",
+    "price < -5000 AND s LIKE 'k0%'",
+    "f > 50",
+    "f < -20",
+    "f BETWEEN 0 AND 10",
+    "f > 1000",
+    "f IS NULL",
+    "ts >= TIMESTAMP '2024-03-01 00:00:00'",
+    "ts < TIMESTAMP '2024-01-01 06:00:00'",
+    "d = DATE '2024-01-05'",
+    "d < DATE '2024-01-03' OR d > DATE '2024-03-30'",
+    "dec > 900.5",
+    "dec <= 1.25",
+    "dec = 123.45",
+    "s = 'k007'",
+    "s LIKE 'k1%'",
+    "s IN ('k003', 'zzz')",
+    "s > 'k9'",
+    "s IS NOT NULL AND id < 50",
+    "id > 1000 AND f > 50 AND s LIKE 'k0%'",
+]
+
+AGGREGATES = [
+    "count(*)",
+    "count(f), min(f), max(f), sum(f)",
+    "count(big), min(big), max(big), sum(big)",
+    "min(id), max(id), sum(id)",
+    "count(amt), sum(amt), max(amt)",
+    "min(price), max(price), sum(price)",
+    "min(ts), max(ts), count(ts)",
+    "min(d), max(d)",
+    "min(dec), max(dec), sum(dec)",
+    "min(s), max(s), count(s)",
+]
+
+
+def _generate(folder, seed: int, files: int = 2, rows: int = 3000, row_group_size: int = 500):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for n in range(files):
+        ids = np.arange(n * rows, (n + 1) * rows)
+        big = rng.integers(-2 ** 63, 2 ** 63 - 1, rows, dtype=np.int64, endpoint=True)
+        big[::97] = 2 ** 63 - 1
+        big[::89] = -2 ** 63
+        amt = rng.integers(0, 1000, rows)
+        amt[rng.random(rows) < 0.005] = 10 ** 7
+        price = rng.normal(100, 10, rows)
+        price[rng.random(rows) < 0.005] = 9999.5
+        price[rng.random(rows) < 0.005] = -9999.5
+        f = rng.normal(0, 100, rows)
+        f[rng.random(rows) < 0.01] = 1e6
+        f[rng.random(rows) < 0.02] = np.nan
+        start = datetime.datetime(2024, 1, 1)
+        ts = [start + datetime.timedelta(minutes=int(m)) for m in np.sort(rng.integers(0, 130_000, rows))]
+        vocab = [f"k{i:03d}" for i in range(200)]
+        s = [vocab[int(i)] for i in np.minimum(rng.zipf(1.3, rows), 200) - 1]
+        table = pa.table({
+            "id": pa.array(ids, pa.int64()),
+            "big": pa.array(big, pa.int64()),
+            "amt": pa.array(amt, pa.int32(), mask=rng.random(rows) < 0.02),
+            "price": pa.array(price, pa.float64()),
+            "f": pa.array(f, pa.float64(), mask=rng.random(rows) < 0.05),
+            "ts": pa.array(ts, pa.timestamp("us")),
+            "d": pa.array([t.date() for t in ts], pa.date32()),
+            "dec": pa.array([decimal.Decimal(int(v)).scaleb(-2) for v in rng.integers(0, 100_000, rows)],
+                            pa.decimal128(12, 2)),
+            "s": pa.array(s, pa.string(), mask=rng.random(rows) < 0.03),
+        })
+        path = str(folder / f"part-{n}.parquet")
+        pq.write_table(table, path, row_group_size=row_group_size)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    return _generate(tmp_path_factory.mktemp("differential"), seed=7)
+
+
+def _queries(paths):
+    src = f"read_parquet({paths})"
+    queries = [f"SELECT * FROM {src} WHERE {p}" for p in PREDICATES]
+    queries += [f"SELECT id, f FROM {src} WHERE {p}" for p in PREDICATES[::3]]
+    queries += [f"SELECT {a} FROM {src}" for a in AGGREGATES]
+    queries += [f"SELECT {a} FROM {src} WHERE {p}" for a in AGGREGATES for p in PREDICATES[::4]]
+    return queries
+
+
+def test_matches_duckdb(dataset, compare):
+    queries = _queries(dataset)
+    # footer statistics, and whatever the budgets build on the way
+    for q in queries:
+        compare(q)
+    core.build_scheduler.wait_for_builds()
+    for p in dataset:
+        for col in COLUMNS:
+            core.build_sma(p, col)
+    # every column indexed, then again with the stats those queries left
+    for _ in range(2):
+        for q in queries:
+            compare(q)
@@ -0,0 +1,82 @@
+"""The layout advisor's projected skip rates against the files rewrite() produces."""
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import quackdb
+from quackdb import layout
+
+
+@pytest.fixture(autouse=True)
+def small_row_groups(monkeypatch):
+    monkeypatch.setattr(layout, "MIN_ROW_GROUP_ROWS", 100)
+
+
+def _dataset(folder, files: int = 4, rows: int = 2000):
+    rng = np.random.default_rng(3)
+    folder.mkdir()
+    for n in range(files):
+        pq.write_table(pa.table({
+            "x": rng.uniform(0, 1000, rows),
+            "i": rng.integers(0, 1000, rows),
+            "s": pa.array([f"k{v:03d}" for v in rng.integers(0, 1000, rows)]),
+        }), str(folder / f"part{n}.parquet"), row_group_size=1000)
+    return str(folder / "*.parquet")
+
+
+def _workload(pattern, predicates):
+    for pred in predicates:
+        quackdb.sql(f"SELECT count(*) FROM '{pattern}' WHERE {pred}").fetchall()
+
+
+def _assert_projection_holds(report, rewritten):
+    rec = report["recommendation"]
+    assert rewritten["before"]["skip_rate"] == pytest.approx(report["current"]["skip_rate"])
+    assert rewritten["after"]["skip_rate"] == pytest.approx(rec["skip_rate"], abs=0.02)
+    for col, rate in rec["per_column"].items():
+        assert rewritten["after"]["per_column"][col] == pytest.approx(rate, abs=0.02), col
+
+
+def test_advice_on_integers_and_strings(tmp_path):
+    pattern = _dataset(tmp_path / "in")
+    _workload(pattern, ["i < 50", "i BETWEEN 500 AND 520", "s = 'k123'", "s > 'k9'", "i > 900 AND s < 'k1'"])
+    report = layout.advise([pattern])
+    rec = report["recommendation"]
+    assert report["queries"] == 5
+    assert rec["improvement"] > 0.3
+    rewritten = layout.rewrite([pattern], str(tmp_path / "out"), rec["keys"], rec["method"], rec["row_group_size"])
+    assert len(rewritten["files"]) == 4
+    _assert_projection_holds(report, rewritten)
+
+
+@pytest.mark.parametrize("method", layout.METHODS)
+def test_float_projection_matches_rewrite(tmp_path, method):
+    pattern = _dataset(tmp_path / "in")
+    _workload(pattern, ["x < 100", "x > 900", "s = 'k123'", "x BETWEEN 10 AND 20 AND s < 'k5'"])
+    report = layout.advise([pattern], keys=["x", "s"], methods=[method])
+    rec = report["recommendation"]
+    # footer statistics of floats never prune, sorting on them gains nothing
+    assert rec["per_column"]["x"] == 0.0
+    rewritten = layout.rewrite([pattern], str(tmp_path / "out"), rec["keys"], rec["method"], rec["row_group_size"])
+    _assert_projection_holds(report, rewritten)
+
+
+def test_float_columns_are_not_chosen_as_keys(tmp_path):
+    pattern = _dataset(tmp_path / "in")
+    _workload(pattern, ["x < 100", "x > 900", "x < 5", "i < 50"])
+    rec = layout.advise([pattern])["recommendation"]
+    assert rec["keys"] == ["i"]
+
+
+def test_rewrite_keeps_every_row(tmp_path):
+    pattern = _dataset(tmp_path / "in")
+    rewritten = layout.rewrite([pattern], str(tmp_path / "out"), ["i"], "sort", 500, files=3)
+    assert len(rewritten["files"]) == 3
+    before = quackdb.sql(f"SELECT count(*), sum(i), min(s), max(x) FROM '{pattern}'").fetchall()
+    after = quackdb.sql(f"SELECT count(*), sum(i), min(s), max(x) FROM '{tmp_path}/out/*.parquet'").fetchall()
+    assert after == before
+    md = pq.read_metadata(rewritten["files"][0])
+    assert all(md.row_group(rg).num_rows == 500 for rg in range(md.num_row_groups))
+    with pytest.raises(ValueError):
+        layout.rewrite([pattern], str(tmp_path / "out"), ["i"])
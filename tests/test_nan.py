@@ -0,0 +1,44 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from quackdb import core
+
+
+def _nan_file(tmp_path):
+    path = str(tmp_path / "nan.parquet")
+    values = np.concatenate([np.arange(95, dtype=np.float64), np.full(5, np.nan)])
+    pq.write_table(pa.table({"x": values}), path, row_group_size=20)
+    return path
+
+
+def test_nan_rows_match_after_build(tmp_path, compare):
+    path = _nan_file(tmp_path)
+    query = f"SELECT x FROM '{path}' WHERE x > 60"
+    header = core.build_sma(path, "x")
+    assert [bool(z.get("nan")) for z in header["row_groups"]] == [False] * 4 + [True]
+    assert header["lower_threshold"] == header["lower_threshold"]  # not NaN
+    for _ in range(3):
+        assert len(compare(query)) == 39
+
+
+def test_nan_aggregates(tmp_path, compare):
+    path = _nan_file(tmp_path)
+    core.build_sma(path, "x")
+    compare(f"SELECT count(*), count(x) FROM '{path}' WHERE x > 60")
+    compare(f"SELECT min(x), max(x), sum(x), count(x) FROM '{path}'")
+
+
+def test_only_nan_is_not_indexed(tmp_path):
+    path = str(tmp_path / "all_nan.parquet")
+    pq.write_table(pa.table({"x": [float("nan")] * 10}), path)
+    assert core.build_sma(path, "x") is None
+
+
+def test_nan_rows_match_from_footer(tmp_path, compare):
+    path = _nan_file(tmp_path)
+    zones = core.get_footer_sma(path, "x")["row_groups"]
+    assert all(z["nan"] for z in zones)
+    assert len(compare(f"SELECT x FROM '{path}' WHERE x > 60")) == 39
+    compare(f"SELECT count(*), max(x), count(x) FROM '{path}' WHERE x > 10")
+    compare(f"SELECT min(x), max(x), sum(x), count(x) FROM '{path}'")
@@ -0,0 +1,51 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import quackdb
+from quackdb import core
+from quackdb.cache import result_cache
+
+
+def test_index_key_follows_the_working_directory(tmp_path, monkeypatch):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        pq.write_table(pa.table({"x": list(range(100))}), str(tmp_path / name / "data.parquet"))
+    monkeypatch.chdir(tmp_path / "a")
+    key_a = core.index_key("data.parquet", "x")
+    assert core.build_sma("data.parquet", "x") is not None
+    monkeypatch.chdir(tmp_path / "b")
+    assert core.index_key("data.parquet", "x") != key_a
+    assert core.get_sma("data.parquet", "x") is None
+    monkeypatch.chdir(tmp_path / "a")
+    # the index of a/data.parquet was not discarded as stale
+    assert core.get_sma("data.parquet", "x") is not None
+
+
+def _remote(tmp_path):
+    # DuckDB reads file:// URLs itself, like any other remote file
+    path = str(tmp_path / "remote.parquet")
+    pq.write_table(pa.table({"x": list(range(1000)), "y": [i % 7 for i in range(1000)]}), path, row_group_size=100)
+    return path, f"file://{path}"
+
+
+def test_remote_files_are_scanned_by_duckdb(tmp_path, compare, monkeypatch):
+    monkeypatch.setattr(result_cache.lru, "max_bytes", 1 << 20)
+    _, url = _remote(tmp_path)
+    for _ in range(3):
+        assert len(compare(f"SELECT x FROM '{url}' WHERE x > 950")) == 49
+    compare(f"SELECT count(*), min(x), max(y), sum(x) FROM '{url}' WHERE x > 5")
+    compare(f"SELECT * FROM '{url}' WHERE y = 3")
+    _, trace = quackdb.sql(f"SELECT x FROM '{url}' WHERE x > 950", explain=True)
+    assert [f["action"] for f in trace.files] == ["full"]
+    assert trace.builds == []
+    assert sum(quackdb.sql(f"SELECT x FROM '{url}' WHERE x > 950", stream=True).read_all()["x"].to_pylist()) == \
+        sum(range(951, 1000))
+
+
+def test_remote_and_local_files_in_one_query(tmp_path, compare):
+    local, url = _remote(tmp_path)
+    core.build_sma(local, "x")
+    query = f"SELECT x FROM read_parquet(['{local}', '{url}']) WHERE x > 950"
+    assert len(compare(query)) == 98
+    compare(f"SELECT count(*), max(x), sum(y) FROM read_parquet(['{local}', '{url}']) WHERE x < 20")
+    assert len(quackdb.sql_many([query, query])[1].fetchall()) == 98
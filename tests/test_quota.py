@@ -0,0 +1,125 @@
+"""DiskQuota over an index folder of its own: eviction order, bloom-less writes and the shared eviction log."""
+import os, sys, json, subprocess
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from quackdb import core, storage
+from quackdb.quota import DiskQuota, EVICTIONS_FILE
+
+
+class _Stats:
+    """Budgets and last uses set by the test."""
+    def __init__(self):
+        self.budgets = {}
+        self.last_used = {}
+        self.deconstructed = []
+
+    def get_budget(self, key):
+        return self.budgets.get(key, 0.0)
+
+    def get_file_stats(self, key):
+        return {"last_sma_used_query_id": self.last_used.get(key, 0)}
+
+    def record_deconstruction(self, key):
+        self.deconstructed.append(key)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    folder = tmp_path / "store"
+    folder.mkdir()
+    monkeypatch.setattr(storage, "BASE_FOLDER", str(folder))
+    return str(folder)
+
+
+def _index(key: str, rows: int):
+    storage.write_index(key, {"row_groups": []}, pa.table({"v": pa.array(range(rows), pa.int64())}))
+    return storage.index_sizes()[key]
+
+
+def test_lowest_benefit_per_byte_is_evicted_first(store):
+    stats = _Stats()
+    evicted = []
+    quota = DiskQuota(stats, None, on_evict=evicted.append)
+    sizes = {key: _index(key, 1000) for key in ("earns", "idle", "stale", "older")}
+    stats.budgets.update(earns=10.0, idle=0.0, stale=0.0, older=0.0)
+    # among equal scores the one used longest ago goes first
+    stats.last_used.update(idle=7, stale=3, older=1)
+    quota.set_quota(sum(sizes.values()))
+    assert quota.make_room("new", 1)
+    assert evicted == ["older"]
+    assert quota.make_room("new", sizes["idle"] * 3)
+    assert evicted == ["older", "stale", "idle"]
+    assert sorted(storage.index_sizes()) == ["earns"]
+    assert [e["key"] for e in quota.history()] == evicted
+    assert all(e["reason"] == "quota" for e in quota.history())
+    assert stats.deconstructed == evicted
+    assert quota.usage()["evictions"] == 3
+
+
+def test_replacing_an_index_does_not_evict_others(store):
+    stats = _Stats()
+    quota = DiskQuota(stats, None)
+    size = _index("a", 1000)
+    _index("b", 1000)
+    quota.set_quota(2 * size)
+    # a new version of b replaces the old one
+    assert quota.make_room("b", size)
+    assert sorted(storage.index_sizes()) == ["a", "b"]
+    assert not quota.make_room("c", 2 * size + 1)
+    assert sorted(storage.index_sizes()) == ["a", "b"]
+
+
+def test_index_is_written_without_its_bloom_filter_when_short_of_room(store, tmp_path, monkeypatch, compare):
+    path = str(tmp_path / "data.parquet")
+    pq.write_table(pa.table({"x": list(range(20000))}), path, row_group_size=2000)
+    requested = []
+    make_room = core.disk_quota.make_room
+    monkeypatch.setattr(core.disk_quota, "make_room", lambda key, n: requested.append(n) or make_room(key, n))
+    monkeypatch.setattr(core.disk_quota, "quota_bytes", None)
+    key = core.index_key(path, "x")
+    assert core.build_sma(path, "x")["bloom"] is not None
+    bloom_bytes = os.path.getsize(storage.sma_path(key) + storage.BLOOM_EXT)
+    # room for the index, not for its bloom filter
+    core.disk_quota.set_quota(requested[0] - bloom_bytes // 2)
+    header = core.build_sma(path, "x")
+    assert header is not None and header["bloom"] is None
+    assert requested[1:] == [requested[0], requested[0] - bloom_bytes]
+    assert not os.path.exists(storage.sma_path(key) + storage.BLOOM_EXT)
+    assert core.get_sma(path, "x")["bloom"] is None
+    compare(f"SELECT x FROM '{path}' WHERE x = 12345")
+    compare(f"SELECT x FROM '{path}' WHERE x IN (3, 99999)")
+    # no room at all
+    core.disk_quota.set_quota(requested[0] - bloom_bytes - 1)
+    assert core.build_sma(path, "x") is None
+
+
+def test_evictions_of_other_processes_are_replayed(store):
+    evicted = []
+    quota = DiskQuota(_Stats(), None, on_evict=evicted.append)
+    for key in ("a", "b", "c"):
+        _index(key, 100)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [sys.executable, "-c", "from quackdb import core; core.disk_quota.evict('a'); core.disk_quota.evict('b', reason='drop')"],
+        check=True, cwd=root, env=dict(os.environ, QUACKDB_SMA_FOLDER=store),
+    )
+    assert evicted == []
+    assert quota.sync() == ["a", "b"]
+    assert evicted == ["a", "b"]
+    assert quota.sync() == []
+    # this process's own evictions were reported by evict()
+    quota.evict("c")
+    assert quota.sync() == []
+    assert evicted == ["a", "b", "c"]
+    # a line still being written waits for the next sync
+    line = json.dumps({"key": "d", "pid": -1}) + "\n"
+    with open(os.path.join(store, EVICTIONS_FILE), "a") as f:
+        f.write(line[:10])
+        f.flush()
+        assert quota.sync() == []
+        f.write(line[10:])
+    assert quota.sync() == ["d"]
+    assert [e.get("reason") for e in quota.history()] == ["quota", "drop", "quota", None]
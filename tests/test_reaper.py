@@ -0,0 +1,81 @@
+import os, sys, logging, subprocess
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import quackdb
+from quackdb import core
+from quackdb.reaper import IndexReaper
+
+
+class _FailingStats:
+    def __init__(self):
+        self.calls = threading.Event()
+
+    def current_query_id(self):
+        self.calls.set()
+        raise RuntimeError("stats unavailable")
+
+
+def test_background_failures_are_logged(caplog):
+    stats = _FailingStats()
+    reaper = IndexReaper(stats, lambda key: 0, keep_last_n=5)
+    with caplog.at_level(logging.ERROR, logger="quackdb.reaper"):
+        reaper.start(0.01)
+        assert stats.calls.wait(5)
+        reaper.stop()
+    assert "stats unavailable" in caplog.text
+
+
+def _outlier_file(tmp_path):
+    path = str(tmp_path / "outliers.parquet")
+    values = np.arange(1000) % 100
+    values[::250] = 10 ** 6
+    pq.write_table(pa.table({"x": values}), path, row_group_size=100)
+    return path
+
+
+def _other_process(code: str):
+    # shares the index folder through QUACKDB_SMA_FOLDER
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+def _indexed_query(tmp_path, compare):
+    path = _outlier_file(tmp_path)
+    query = f"SELECT x FROM '{path}' WHERE x > 1000"
+    core.build_sma(path, "x")
+    _, trace = quackdb.sql(query, explain=True)
+    assert trace.files[0]["action"] == "outlier"
+    assert len(compare(query)) == 4
+    return path, query
+
+
+def test_reaped_index_is_logged_for_other_processes(tmp_path, compare):
+    path, query = _indexed_query(tmp_path, compare)
+    key = core.index_key(path, "x")
+    _other_process(f"from quackdb import core; assert core._reap_index({key!r})")
+    assert core.disk_quota.history()[-1]["key"] == key
+    assert core.disk_quota.history()[-1]["reason"] == "stale"
+    for _ in range(3):
+        assert len(compare(query)) == 4
+
+
+def test_cached_header_is_revalidated_when_the_store_changes(tmp_path, compare):
+    path, query = _indexed_query(tmp_path, compare)
+    # dropped without an entry in the eviction log
+    _other_process(f"from quackdb import storage, core; storage.drop_index(core.index_key({path!r}, 'x'))")
+    assert core.get_sma(path, "x") is None
+    assert len(compare(query)) == 4
+
+
+def test_missing_outliers_are_scanned(tmp_path, compare, monkeypatch):
+    path, query = _indexed_query(tmp_path, compare)
+
+    def gone(key, *args, **kwargs):
+        raise FileNotFoundError(key)
+
+    monkeypatch.setattr(core, "open_outliers", gone)
+    assert len(compare(query)) == 4
@@ -0,0 +1,117 @@
+"""
+Queries answered from cached results, of the same query or of a looser one
+that contains it, against DuckDB.
+"""
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import quackdb
+from quackdb.cache import result_cache
+
+# each query after the first is contained in an earlier one
+CONTAINED = [
+    ("SELECT * FROM '{path}' WHERE x > 10", "SELECT * FROM '{path}' WHERE x > 50"),
+    ("SELECT * FROM '{path}' WHERE x > 10", "SELECT * FROM '{path}' WHERE x > 10 AND s = 'b'"),
+    ("SELECT * FROM '{path}' WHERE x BETWEEN -50 AND 50", "SELECT * FROM '{path}' WHERE x BETWEEN 0 AND 20"),
+    ("SELECT * FROM '{path}' WHERE s IN ('a', 'b')", "SELECT * FROM '{path}' WHERE s = 'a'"),
+    ("SELECT * FROM '{path}' WHERE i >= 0", "SELECT * FROM '{path}' WHERE i > 40 AND x < 0"),
+    ("SELECT x, s FROM '{path}' WHERE x > -20", "SELECT x, s FROM '{path}' WHERE x > 30 AND s != 'c'"),
+]
+
+
+@pytest.fixture(autouse=True)
+def with_result_cache(monkeypatch):
+    result_cache.clear()
+    result_cache.lru.set_max_bytes(64 * 1024 * 1024)
+    # count the hits of this test only
+    monkeypatch.setattr(result_cache, "hits", 0)
+    monkeypatch.setattr(result_cache, "contained_hits", 0)
+    yield
+    result_cache.clear()
+
+
+def _write(path: str, seed: int, rows: int = 2000):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(0, 50, rows)
+    x[rng.random(rows) < 0.02] = np.nan
+    pq.write_table(pa.table({
+        "x": pa.array(x, mask=rng.random(rows) < 0.05),
+        "i": pa.array(rng.integers(0, 100, rows), mask=rng.random(rows) < 0.05),
+        "s": pa.array(rng.choice(["a", "b", "c", None], rows).tolist()),
+    }), path, row_group_size=250)
+
+
+@pytest.fixture
+def data(tmp_path):
+    path = str(tmp_path / "data.parquet")
+    _write(path, 1)
+    return path
+
+
+def _hits():
+    info = result_cache.info()
+    return info["hits"], info["contained_hits"]
+
+
+@pytest.mark.parametrize("looser, query", CONTAINED)
+def test_contained_query_is_answered_from_the_cache(data, compare, looser, query):
+    compare(looser.format(path=data))
+    _, trace = quackdb.sql(query.format(path=data), explain=True)
+    assert trace.cached
+    assert _hits() == (0, 1)
+    compare(query.format(path=data))
+
+
+def test_repeated_query_is_a_hit(data, compare):
+    query = f"SELECT * FROM '{data}' WHERE x > 20 OR x IS NULL"
+    compare(query)
+    compare(query)
+    assert _hits() == (1, 0)
+
+
+@pytest.mark.parametrize("looser, query", [
+    # i is not in the cached result
+    ("SELECT x FROM '{path}' WHERE x > 10", "SELECT x FROM '{path}' WHERE x > 50 AND i < 10"),
+    # implies() only compares exact range predicates
+    ("SELECT * FROM '{path}' WHERE x < 0 OR x > 90", "SELECT * FROM '{path}' WHERE x > 95"),
+    ("SELECT * FROM '{path}' WHERE x > 10", "SELECT * FROM '{path}' WHERE x > 5"),
+])
+def test_query_not_contained_is_scanned(data, compare, looser, query):
+    compare(looser.format(path=data))
+    compare(query.format(path=data))
+    assert _hits() == (0, 0)
+
+
+def test_rewritten_file_drops_the_cached_result(data, compare):
+    query = f"SELECT * FROM '{data}' WHERE x > 10"
+    before = compare(query)
+    _write(data, 2, rows=2100)
+    assert compare(query) != before
+    assert _hits() == (0, 0)
+    # contained in the result of the rewritten file
+    compare(f"SELECT * FROM '{data}' WHERE x > 50")
+    assert _hits() == (0, 1)
+
+
+def test_rewrite_of_the_same_size_drops_the_cached_result(tmp_path, compare):
+    path = str(tmp_path / "plain.parquet")
+
+    def write(offset: float):
+        values = np.arange(1000, dtype=np.float64) + offset
+        pq.write_table(pa.table({"x": values}), path, compression='none', use_dictionary=False)
+
+    write(0)
+    query = f"SELECT * FROM '{path}' WHERE x > 10"
+    before = compare(query)
+    size, mtime = os.path.getsize(path), os.stat(path).st_mtime_ns
+    write(0.5)
+    assert os.path.getsize(path) == size
+    # a clock too coarse to tell the writes apart
+    os.utime(path, ns=(mtime + 1, mtime + 1))
+    assert compare(query) != before
+    compare(f"SELECT * FROM '{path}' WHERE x > 500")
+    assert _hits() == (0, 1)
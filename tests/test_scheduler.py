@@ -0,0 +1,44 @@
+import logging
+import threading
+
+from quackdb.scheduler import BuildScheduler
+
+
+def test_submit_after_pool_shutdown_drops_queue():
+    release = threading.Event()
+    built = []
+
+    def build(path, column):
+        release.wait(5)
+        built.append((path, column))
+
+    scheduler = BuildScheduler(build, max_workers=1)
+    assert scheduler.submit("a.parquet", "x")
+    assert scheduler.submit("b.parquet", "x")
+    # what concurrent.futures does to every pool when the interpreter exits
+    scheduler._executor.shutdown(wait=False)
+    release.set()
+    assert scheduler.wait_for_builds(5)
+    info = scheduler.info()
+    assert (info["queued"], info["running"], info["completed"]) == (0, 0, 1)
+    assert built == [("a.parquet", "x")]
+    assert not scheduler.submit("c.parquet", "x")
+
+
+def test_failures_are_logged(caplog):
+    def build(path, column):
+        raise ValueError(f"cannot read {path}")
+
+    def on_done(path, column):
+        raise RuntimeError("callback broke")
+
+    scheduler = BuildScheduler(build, max_workers=1, on_done=on_done)
+    with caplog.at_level(logging.ERROR, logger="quackdb.scheduler"):
+        assert scheduler.submit("a.parquet", "x")
+        assert scheduler.wait_for_builds(5)
+    scheduler.shutdown()
+    assert scheduler.info()["failed"] == 1
+    assert "cannot read a.parquet" in caplog.text
+    assert "callback broke" in caplog.text
+    # with the tracebacks
+    assert caplog.text.count("Traceback") == 2
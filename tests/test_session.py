@@ -0,0 +1,64 @@
+"""Queries from many threads on one Session, while indexes are built, reaped and evicted."""
+import threading
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from quackdb import core
+from quackdb.session import Session
+from conftest import result_rows
+
+QUERIES = [
+    "SELECT x FROM '{path}' WHERE x > 1000",
+    "SELECT x, y FROM '{path}' WHERE x < 5",
+    "SELECT y FROM '{path}' WHERE y BETWEEN 10 AND 20 AND x < 50",
+    "SELECT count(*), max(x), sum(y) FROM '{path}' WHERE x > 90",
+]
+
+
+def _files(tmp_path, files: int = 4):
+    rng = np.random.default_rng(7)
+    paths = []
+    for n in range(files):
+        path = str(tmp_path / f"part{n}.parquet")
+        x = rng.integers(0, 100, 2000)
+        x[rng.random(2000) < 0.005] = 10 ** 6
+        pq.write_table(pa.table({"x": x, "y": rng.integers(0, 50, 2000)}), path, row_group_size=200)
+        paths.append(path)
+    return paths
+
+
+def test_concurrent_queries_while_indexes_come_and_go(tmp_path, monkeypatch):
+    paths = _files(tmp_path)
+    for p in paths:
+        core.build_sma(p, "x")
+    queries = [q.format(path=p) for p in paths for q in QUERIES]
+    expected = {q: result_rows(duckdb.sql(q)) for q in queries}
+    # every query reaps whatever it has not used lately, builds keep replacing them
+    monkeypatch.setattr(core.index_reaper, "keep_last_n", 1)
+
+    session = Session(max_concurrency=4)
+    errors = []
+
+    def worker(offset: int):
+        try:
+            for i in range(12):
+                q = queries[(offset + i) % len(queries)]
+                assert result_rows(session.sql(q)) == expected[q], q
+                if i % 4 == 0:
+                    # an eviction by another query's build
+                    p = paths[(offset + i) % len(paths)]
+                    core.disk_quota.evict(core.index_key(p, "x"))
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    core.build_scheduler.wait_for_builds()
+    session.close()
+    assert not errors, errors
@@ -0,0 +1,71 @@
+"""sql_many() against each of its queries run alone and against DuckDB."""
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import quackdb
+from quackdb import core
+from conftest import result_rows
+
+BATCH = [
+    "SELECT * FROM '{a}' WHERE x > 1000",
+    "SELECT x FROM '{a}' WHERE x < 10",
+    "SELECT y FROM '{a}' WHERE y = 3 AND x BETWEEN 20 AND 40",
+    "SELECT * FROM '{a}' WHERE f > 2 OR f IS NULL",
+    "SELECT x, f FROM '{a}' WHERE x > 1000000000",
+    "SELECT count(*), sum(x), max(f) FROM '{a}' WHERE x > 50",
+    "SELECT * FROM '{both}' WHERE x > 95",
+    "SELECT y FROM '{both}' WHERE y < 1",
+    "SELECT * FROM '{b}' WHERE f < -2",
+]
+
+
+def _write(path: str, seed: int):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, 100, 3000)
+    x[::400] = 10 ** 6
+    f = rng.normal(0, 1, 3000)
+    f[::333] = np.nan
+    pq.write_table(pa.table({
+        "x": x,
+        "y": pa.array(rng.integers(0, 10, 3000), mask=rng.random(3000) < 0.1),
+        "f": pa.array(f, mask=rng.random(3000) < 0.05),
+    }), path, row_group_size=300)
+
+
+@pytest.fixture
+def batch(tmp_path):
+    a, b = str(tmp_path / "a.parquet"), str(tmp_path / "b.parquet")
+    _write(a, 1)
+    _write(b, 2)
+    return [q.format(a=a, b=b, both=f"{tmp_path}/*.parquet") for q in BATCH]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_batch_matches_queries_run_alone(tmp_path, batch, indexed):
+    if indexed:
+        for name in ("a", "b"):
+            for col in ("x", "f"):
+                core.build_sma(str(tmp_path / f"{name}.parquet"), col)
+    for _ in range(2):
+        results = quackdb.sql_many(batch)
+        assert len(results) == len(batch)
+        for query, res in zip(batch, results):
+            expected = result_rows(duckdb.sql(query))
+            assert result_rows(res) == expected, query
+            assert result_rows(quackdb.sql(query)) == expected, query
+
+
+def test_batch_traces(batch):
+    results = quackdb.sql_many(batch, explain=True)
+    for query, (res, trace) in zip(batch, results):
+        assert trace.query == query
+        assert trace.finished
+        assert trace.rows == len(res.fetchall())
+
+
+def test_same_query_twice_in_a_batch(batch):
+    first, second = quackdb.sql_many([batch[0], batch[0]])
+    assert result_rows(first) == result_rows(second) == result_rows(duckdb.sql(batch[0]))
@@ -0,0 +1,110 @@
+"""The JSON and SQLite stats backends behave alike, and SQLite imports stats.json once."""
+import json
+import logging
+
+import numpy as np
+import pytest
+
+from quackdb.stats import StatsManager, JsonStatsBackend, SqliteStatsBackend
+from quackdb.utils import Interval
+
+KEYS = ["a.parquet_1_x", "a.parquet_1_y", "b.parquet_2_x"]
+
+
+def _workload(manager: StatsManager, seed: int, steps: int = 300):
+    """A random run of what read_parquet_sma() and the builds record."""
+    rng = np.random.default_rng(seed)
+    for _ in range(steps):
+        key = KEYS[rng.integers(len(KEYS))]
+        op = rng.integers(7)
+        if op == 0:
+            query_id = manager.get_next_query_id()
+            manager.record_ranges(query_id, ["/data/a.parquet"], {"x": Interval(low=int(rng.integers(100)))})
+        elif op == 1:
+            manager.record_scan(key, float(rng.random()), estimated=float(rng.random()))
+        elif op == 2:
+            manager.record_scan(key, 0.0, skipped=True, query_id=manager.current_query_id() - 1)
+        elif op == 3:
+            manager.record_scan(key, float(rng.random()), outlier=bool(rng.integers(2)), partial=True)
+        elif op == 4:
+            manager.add_budget(key, float(rng.normal(0, 1)))
+        elif op == 5:
+            manager.record_construction(key)
+        else:
+            manager.record_deconstruction(key)
+        manager.save()
+
+
+def _rounded(value):
+    # SQLite adds floats in another order than Python
+    if isinstance(value, float):
+        return round(value, 9)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_rounded(v) for v in value)
+    return value
+
+
+def _state(manager: StatsManager):
+    return _rounded({
+        "files": {k: manager.get_file_stats(k) for k in KEYS},
+        "budgets": {k: manager.get_budget(k) for k in KEYS},
+        "keys": sorted(manager.keys()),
+        "query_id": manager.current_query_id(),
+        "workload": [(r["query_id"], r["folder"], {c: i.to_dict() for c, i in r["ranges"].items()})
+                     for r in manager.workload()],
+        "snapshot_files": manager.snapshot()["files"],
+    })
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_backends_match(tmp_path, seed):
+    json_stats = StatsManager(JsonStatsBackend(str(tmp_path / "stats.json")))
+    sqlite_stats = StatsManager(SqliteStatsBackend(str(tmp_path / "stats.db"), import_json=None))
+    _workload(json_stats, seed)
+    _workload(sqlite_stats, seed)
+    assert _state(sqlite_stats) == _state(json_stats)
+    assert all(b >= 0 for b in _state(sqlite_stats)["budgets"].values())
+    # and once reopened
+    reopened_json = StatsManager(JsonStatsBackend(str(tmp_path / "stats.json")))
+    reopened_sqlite = StatsManager(SqliteStatsBackend(str(tmp_path / "stats.db"), import_json=None))
+    assert _state(reopened_sqlite) == _state(reopened_json)
+    assert _state(reopened_json) == _state(json_stats)
+
+
+def test_budget_only_keys_match(tmp_path):
+    json_stats = StatsManager(JsonStatsBackend(str(tmp_path / "stats.json")))
+    sqlite_stats = StatsManager(SqliteStatsBackend(str(tmp_path / "stats.db"), import_json=None))
+    for manager in (json_stats, sqlite_stats):
+        manager.add_budget(KEYS[0], 2.5)
+        manager.add_budget(KEYS[1], -1.0)
+    assert _state(sqlite_stats) == _state(json_stats)
+
+
+def test_stats_json_is_imported_once(tmp_path):
+    path = str(tmp_path / "stats.json")
+    old = StatsManager(JsonStatsBackend(path))
+    _workload(old, 4)
+    expected = _state(old)
+    db = str(tmp_path / "stats.db")
+    imported = StatsManager(SqliteStatsBackend(db, import_json=path))
+    assert _state(imported) == expected
+    # later changes to stats.json are not imported again
+    _workload(old, 5)
+    imported.add_budget(KEYS[0], 100.0)
+    reopened = StatsManager(SqliteStatsBackend(db, import_json=path))
+    assert _state(reopened) == _state(imported)
+    assert reopened.get_budget(KEYS[0]) == pytest.approx(expected["budgets"][KEYS[0]] + 100.0)
+
+
+def test_unreadable_json_starts_over(tmp_path, caplog):
+    path = tmp_path / "stats.json"
+    path.write_text("{not json")
+    with caplog.at_level(logging.WARNING, logger="quackdb.stats"):
+        manager = StatsManager(JsonStatsBackend(str(path)))
+    assert "Could not load stats file" in caplog.text
+    assert manager.current_query_id() == 0
+    manager.add_budget(KEYS[0], 1.0)
+    manager.save()
+    assert json.loads(path.read_text())["budgets"] == {KEYS[0]: 1.0}
@@ -0,0 +1,13 @@
+import json
+
+from quackdb import storage
+
+
+def test_headers_of_other_layouts_are_ignored():
+    key = "old_layout_x"
+    for header in ({"version": storage.SMA_FORMAT_VERSION - 1, "row_groups": []},
+                   {"version": storage.SMA_FORMAT_VERSION, "min": 0, "max": 1}):
+        with open(storage.sma_path(key), "w") as f:
+            json.dump(header, f)
+        assert storage.read_header(key) is None
+    storage.drop_index(key)
@@ -0,0 +1,73 @@
+"""Streamed results against DuckDB, and the stats they record once read."""
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import duckdb
+import quackdb
+from quackdb import core
+from conftest import result_rows
+
+QUERIES = [
+    "SELECT * FROM '{path}' WHERE x > 1000",
+    "SELECT x, y FROM '{path}' WHERE x < 20 OR x > 1000",
+    "SELECT y FROM '{path}' WHERE y BETWEEN 3 AND 4 AND x < 50",
+    "SELECT * FROM '{path}' WHERE x > 1000000000",
+    "SELECT count(*), max(x), sum(y) FROM '{path}' WHERE x > 90",
+]
+
+
+@pytest.fixture
+def data(tmp_path):
+    path = str(tmp_path / "data.parquet")
+    rng = np.random.default_rng(5)
+    x = rng.integers(0, 100, 5000)
+    x[::500] = 10 ** 6
+    y = pa.array(rng.integers(0, 10, 5000), mask=rng.random(5000) < 0.1)
+    pq.write_table(pa.table({"x": x, "y": y}), path, row_group_size=500)
+    return path
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(core, "STREAM_BATCH_ROWS", 128)
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+@pytest.mark.parametrize("query", QUERIES)
+def test_stream_matches_duckdb(data, small_batches, query, indexed):
+    if indexed:
+        core.build_sma(data, "x")
+    query = query.format(path=data)
+    reader = quackdb.sql(query, stream=True)
+    assert isinstance(reader, pa.RecordBatchReader)
+    expected = duckdb.sql(query)
+    assert reader.schema == expected.fetch_arrow_table().schema
+    batches = list(reader)
+    assert all(b.num_rows <= 128 for b in batches)
+    assert result_rows(duckdb.from_arrow(pa.Table.from_batches(batches, reader.schema))) == result_rows(expected)
+
+
+def test_stats_are_recorded_once_the_reader_is_exhausted(data, small_batches):
+    key = core.index_key(data, "x")
+    scans = (core.stats_manager.get_file_stats(key) or {}).get("scan_count", 0)
+    reader, trace = quackdb.sql(f"SELECT * FROM '{data}' WHERE x < 50", stream=True, explain=True)
+    reader.read_next_batch()
+    assert not trace.finished
+    assert core.stats_manager.get_file_stats(key)["scan_count"] == scans
+    rest = reader.read_all()
+    assert trace.finished
+    assert trace.rows == 128 + rest.num_rows
+    assert core.stats_manager.get_file_stats(key)["scan_count"] == scans + 1
+    assert core.stats_manager.get_file_stats(key)["total_scan_time"] > 0
+
+
+def test_abandoned_reader_records_nothing(data, small_batches):
+    key = core.index_key(data, "x")
+    reader, trace = quackdb.sql(f"SELECT * FROM '{data}' WHERE x < 50", stream=True, explain=True)
+    reader.read_next_batch()
+    del reader
+    assert not trace.finished
+    assert core.stats_manager.get_file_stats(key)["scan_count"] == 0
+    assert core.stats_manager.get_budget(key) == 0
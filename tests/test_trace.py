@@ -0,0 +1,14 @@
+import logging
+
+from quackdb.trace import QueryTrace
+
+
+def test_failing_hook_is_logged(caplog):
+    def hook(trace):
+        raise ValueError("broken exporter")
+
+    trace = QueryTrace("SELECT 1", callback=hook)
+    with caplog.at_level(logging.ERROR, logger="quackdb.trace"):
+        trace.finish()
+    assert trace.finished
+    assert "broken exporter" in caplog.text
@@ -0,0 +1,129 @@
+import datetime
+
+import pytest
+
+from quackdb.utils import (
+    And, InList, Interval, IsNull, Like, Not, Or,
+    implies, is_exact, parse_aggregates, parse_sql, parse_where,
+)
+
+
+def test_parse_sql_files_projection_and_predicate():
+    files, proj, pred = parse_sql(
+        "SELECT a, \"b\" FROM read_parquet(['x.parquet', 'y.parquet']) WHERE a > 5 AND b = 'it''s'"
+    )
+    assert files == ['x.parquet', 'y.parquet']
+    assert proj == ['a', 'b']
+    assert pred.to_sql() == "(\"a\" > 5 AND \"b\" = 'it''s')"
+
+
+@pytest.mark.parametrize("sql, files", [
+    ("SELECT * FROM 'data/*.parquet'", ['data/*.parquet']),
+    ("SELECT * FROM read_parquet('data/**/*.parquet')", ['data/**/*.parquet']),
+    ("SELECT * FROM read_parquet(['a.parquet'])", ['a.parquet']),
+])
+def test_parse_sql_sources(sql, files):
+    parsed_files, proj, pred = parse_sql(sql)
+    assert parsed_files == files
+    assert proj is None
+    assert isinstance(pred, And) and not pred.children
+
+
+def test_parse_sql_rejects():
+    assert parse_sql("SELECT 1") is None
+    # something other than WHERE follows the FROM clause
+    assert parse_sql("SELECT * FROM 'a.parquet' LIMIT 5")[2] is None
+    # a WHERE clause the parser does not understand
+    assert parse_sql("SELECT * FROM 'a.parquet' WHERE a + 1 > 5")[2] is None
+
+
+def test_parse_where_nodes():
+    pred = parse_where("5 < a OR NOT (b IS NULL) OR c NOT IN (1, 2) OR d LIKE 'ab%' OR e BETWEEN -1 AND 2.5")
+    assert isinstance(pred, Or)
+    first, second, third, fourth, fifth = pred.children
+    assert (first.column, first.op, first.value) == ('a', '>', 5)
+    assert isinstance(second, Not) and isinstance(second.child, IsNull)
+    assert isinstance(third, InList) and third.negated and third.values == [1, 2]
+    assert isinstance(fourth, Like) and fourth.prefix() == 'ab'
+    assert [(c.op, c.value) for c in fifth.children] == [('>=', -1), ('<=', 2.5)]
+
+
+def test_parse_where_typed_literals():
+    pred = parse_where("d >= DATE '2024-01-02' AND t < TIMESTAMP '2024-01-02 03:04:05'")
+    assert pred.children[0].value == datetime.date(2024, 1, 2)
+    assert pred.children[1].value == datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+
+@pytest.mark.parametrize("text", ["a >", "a = 1 AND", "a LIKE 'x' ESCAPE '!'", "a NOT = 1", "(a = 1"])
+def test_parse_where_errors(text):
+    with pytest.raises(ValueError):
+        parse_where(text)
+
+
+def test_ranges_of_and_or():
+    ranges = parse_where("a > 1 AND a <= 10 AND b IN (3, 1)").ranges()
+    assert ranges['a'] == Interval(1, 10, low_inclusive=False)
+    assert ranges['b'] == Interval(1, 3, points=frozenset([1, 3]))
+    # a column constrained by only one side of an OR gives no range
+    assert parse_where("a > 1 OR b < 2").ranges() == {}
+    assert parse_where("a > 1 OR a < -2").ranges() == {'a': Interval(None, None, True, True)}
+
+
+def test_like_ranges():
+    assert parse_where("s LIKE 'abc'").ranges()['s'] == Interval('abc', 'abc', points=frozenset(['abc']))
+    assert parse_where("s LIKE 'ab%'").ranges()['s'] == Interval('ab', 'ac', high_inclusive=False)
+    assert parse_where("s LIKE '%b'").ranges() == {}
+    assert parse_where("s NOT LIKE 'ab%'").ranges() == {}
+
+
+def test_interval_overlaps_and_covers():
+    interval = Interval(5, 10, low_inclusive=False)
+    assert not interval.overlaps(0, 5)
+    assert interval.overlaps(0, 6)
+    assert interval.covers(6, 10)
+    assert not interval.covers(5, 10)
+    assert not Interval(excluded=frozenset([3])).overlaps(3, 3)
+    assert not Interval(excluded=frozenset([3])).covers(1, 4)
+    # incomparable values overlap, and are never covered
+    assert Interval(5, 10).overlaps('a', 'b')
+    assert not Interval(5, 10).covers('a', 'b')
+
+
+@pytest.mark.parametrize("text, exact", [
+    ("a > 1", True),
+    ("a > 1 AND b IN (1, 2)", True),
+    ("a = NULL", False),
+    ("a > 1 OR b > 2", False),
+    ("NOT a > 1", False),
+    ("a IS NULL", False),
+    ("s LIKE 'ab%'", False),
+    ("a IN (1, NULL)", False),
+])
+def test_is_exact(text, exact):
+    assert is_exact(parse_where(text)) is exact
+
+
+@pytest.mark.parametrize("narrow, wide, expected", [
+    ("a > 5", "a > 1", True),
+    ("a > 1", "a > 5", False),
+    ("a > 5 AND b = 2", "a > 1", True),
+    ("a = 3", "a IN (1, 3)", True),
+    ("a IN (1, 3)", "a = 3", False),
+    ("a > 5", "a > 1 AND b = 2", False),
+    ("a > 5 OR a < 0", "a > 1", False),
+    ("s LIKE 'ab%'", "s LIKE 'ab%'", True),
+    ("a > 5", "s LIKE 'ab%'", False),
+    ("a != 2 AND a > 5", "a != 2", True),
+])
+def test_implies(narrow, wide, expected):
+    assert implies(parse_where(narrow), parse_where(wide)) is expected
+
+
+def test_parse_aggregates():
+    aggs = parse_aggregates("SELECT count(*), MIN(a) AS lo, sum(\"b c\") FROM 'x.parquet'")
+    assert [(a.func, a.column, a.name) for a in aggs] == [
+        ('count', None, 'count_star()'), ('min', 'a', 'lo'), ('sum', 'b c', 'sum(b c)'),
+    ]
+    assert parse_aggregates("SELECT a, count(*) FROM 'x.parquet'") is None
+    assert parse_aggregates("SELECT avg(a) FROM 'x.parquet'") is None
+    assert parse_aggregates("SELECT sum(*) FROM 'x.parquet'") is None